@@ -0,0 +1,41 @@
+"""Kiosk startup time for client.py.
+
+Launches `python client.py --startup-time` repeatedly; the client prints the
+time from process start until the attendance screen is drawn and idle, then
+exits. Reports the median and the spread.
+
+    python benchmarks/bench_client_startup.py [--runs 5]
+
+Needs a display (run it on the kiosk machine). The target is under one
+second from launch to a screen that accepts punches.
+"""
+import argparse
+import os
+import re
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    arg_parser.add_argument('--runs', type=int, default=5)
+    args = arg_parser.parse_args()
+
+    timings = []
+    for _ in range(args.runs):
+        result = subprocess.run([sys.executable, 'client.py', '--startup-time'],
+                                cwd=ROOT, capture_output=True, text=True, timeout=60)
+        match = re.search(r'startup: (\d+) ms', result.stdout)
+        if not match:
+            sys.exit(f"client did not report its startup time:\n{result.stderr}")
+        timings.append(int(match.group(1)))
+
+    print(f"client startup: median {statistics.median(timings)} ms "
+          f"(min {min(timings)} ms, max {max(timings)} ms, {args.runs} runs)")
+
+
+if __name__ == '__main__':
+    main()
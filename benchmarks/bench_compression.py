@@ -0,0 +1,80 @@
+"""Bytes on the wire for the large JSON endpoints.
+
+Builds a synthetic database in a scratch directory, then requests
+get_attendance, crm_get_leads and get_audit_log through Flask's test client
+in the row-dict and columnar formats, once per content encoding the server
+can produce, and prints the body sizes and the time spent compressing.
+
+    python benchmarks/bench_compression.py [--staff 60] [--days 90] [--leads 2000]
+"""
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+ENDPOINTS = (('/api/get_attendance', 'data'), ('/api/crm_get_leads', 'leads'), ('/api/get_audit_log', 'data'))
+
+
+def populate(staff_count, days, lead_count):
+    rng = random.Random(42)
+    conn = sqlite3.connect('attendance.db')
+    cursor = conn.cursor()
+    cursor.executemany('INSERT INTO staff (staff_code, name, hourly_rate) VALUES (?, ?, ?)',
+                       [(f"S{i:03d}", f"Staff member {i}", rng.choice((12.5, 15.0, 18.75))) for i in range(staff_count)])
+    start = datetime.now() - timedelta(days=days)
+    rows = []
+    for day in range(days):
+        for i in range(staff_count):
+            clock_in = start + timedelta(days=day, hours=8, minutes=rng.randint(0, 59))
+            clock_out = clock_in + timedelta(hours=rng.uniform(4, 9))
+            rows.append((f"S{i:03d}", clock_in.isoformat(sep=' '), clock_out.isoformat(sep=' '),
+                         rng.choice((None, 'handover done', '{"Cash counted?": "yes"}')), 'work'))
+    cursor.executemany('INSERT INTO attendance (staff_code, clock_in, clock_out, notes, session_type) VALUES (?, ?, ?, ?, ?)',
+                       rows)
+    cursor.executemany('INSERT INTO crm_leads (name, phone, status, assigned_to, notes) VALUES (?, ?, ?, ?, ?)',
+                       [(f"Lead {i}", f"05{rng.randint(10000000, 99999999)}", rng.choice(('New', 'Contacted', 'Won')),
+                         f"S{rng.randrange(staff_count):03d}", 'called, asked for a quote') for i in range(lead_count)])
+    cursor.executemany('INSERT INTO audit_log (admin_password, action_details) VALUES (?, ?)',
+                       [('system', f"{datetime.now()}: Updated staff S{i % staff_count:03d}") for i in range(len(rows) // 4)])
+    conn.commit()
+    conn.close()
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    arg_parser.add_argument('--staff', type=int, default=60)
+    arg_parser.add_argument('--days', type=int, default=90)
+    arg_parser.add_argument('--leads', type=int, default=2000)
+    args = arg_parser.parse_args()
+
+    os.chdir(tempfile.mkdtemp(prefix='bench_compression_'))
+    import server
+    server.init_db()
+    populate(args.staff, args.days, args.leads)
+    client = server.app.test_client()
+    encodings = ['identity'] + [e for e in server.COMPRESS_PREFERENCE if e in server._get_compressors()]
+
+    print(f"{'endpoint':<20}{'format':<10}" + ''.join(f"{e:>10}" for e in encodings) + f"{'vs rows':>10}")
+    for path, key in ENDPOINTS:
+        baseline = None
+        for fmt in ('rows', 'columnar'):
+            sizes = []
+            for encoding in encodings:
+                response = client.post(path, json={'password': 'admin123', 'format': fmt},
+                                       headers={'Accept-Encoding': encoding})
+                assert response.status_code == 200
+                sizes.append(len(response.data))
+            baseline = baseline or sizes[0]
+            print(f"{path[5:]:<20}{fmt:<10}" + ''.join(f"{size / 1024:8.0f}Ki" for size in sizes)
+                  + f"{min(sizes) / baseline:9.0%}")
+    print("sizes in KiB; 'vs rows' = smallest body against uncompressed row dicts")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+"""Range-scan and aggregation speed, text timestamps versus epoch columns.
+
+Builds a synthetic attendance table in a scratch directory and runs the
+get_analytics style queries three ways: on the text columns as before, on
+the text columns with an index on clock_in, and on the generated integer
+clock_in_ts/clock_out_ts columns with their indexes.
+
+    python benchmarks/bench_epoch.py [--rows 400000] [--staff 300] [--repeat 5]
+"""
+import argparse
+import calendar
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+RANGE = (datetime(2025, 3, 1), datetime(2025, 4, 1))
+
+TEXT_QUERIES = {
+    'range scan': ('SELECT id FROM attendance WHERE clock_in >= ? AND clock_in < ?', RANGE),
+    'hours per staff': ('''SELECT staff_code, SUM(CASE WHEN session_type = 'work'
+                           THEN (julianday(clock_out) - julianday(clock_in)) * 24 ELSE 0 END)
+                           FROM attendance WHERE clock_in >= ? AND clock_in < ? GROUP BY staff_code''', RANGE),
+    'rows per day': ('SELECT DATE(clock_in), COUNT(*) FROM attendance WHERE clock_in >= ? AND clock_in < ? '
+                     'GROUP BY DATE(clock_in)', RANGE),
+}
+EPOCH_QUERIES = {
+    'range scan': 'SELECT id FROM attendance WHERE clock_in_ts >= ? AND clock_in_ts < ?',
+    'hours per staff': '''SELECT staff_code, SUM(CASE WHEN session_type = 'work'
+                          THEN (clock_out_ts - clock_in_ts) / 3600.0 ELSE 0 END)
+                          FROM attendance WHERE clock_in_ts >= ? AND clock_in_ts < ? GROUP BY staff_code''',
+    'rows per day': "SELECT date(clock_in_ts / 86400 * 86400, 'unixepoch'), COUNT(*) FROM attendance "
+                    "WHERE clock_in_ts >= ? AND clock_in_ts < ? GROUP BY clock_in_ts / 86400",
+}
+
+
+def populate(row_count, staff_count):
+    rng = random.Random(42)
+    conn = sqlite3.connect('attendance.db')
+    start = datetime(2024, 1, 1)
+    rows = []
+    for i in range(row_count):
+        clock_in = start + timedelta(minutes=rng.randint(0, 60 * 24 * 900))
+        rows.append((f"S{i % staff_count:03d}", str(clock_in), str(clock_in + timedelta(hours=rng.uniform(1, 9))),
+                     rng.choice(('work', 'work', 'work', 'break'))))
+    conn.executemany('INSERT INTO attendance (staff_code, clock_in, clock_out, session_type) VALUES (?, ?, ?, ?)', rows)
+    conn.commit()
+    conn.execute('ANALYZE')
+    conn.close()
+
+
+def timed(conn, sql, params, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        conn.execute(sql, params).fetchall()
+        best = min(best, time.perf_counter() - started)
+    return best * 1000
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    arg_parser.add_argument('--rows', type=int, default=400000)
+    arg_parser.add_argument('--staff', type=int, default=300)
+    arg_parser.add_argument('--repeat', type=int, default=5)
+    args = arg_parser.parse_args()
+
+    os.chdir(tempfile.mkdtemp(prefix='bench_epoch_'))
+    import server
+    server.init_db()
+    populate(args.rows, args.staff)
+    conn = sqlite3.connect('attendance.db')
+    epoch_range = tuple(calendar.timegm(value.timetuple()) for value in RANGE)
+
+    results = {name: [timed(conn, sql, params, args.repeat)] for name, (sql, params) in TEXT_QUERIES.items()}
+    conn.execute('CREATE INDEX bench_clock_in ON attendance (clock_in)')
+    conn.execute('ANALYZE')
+    for name, (sql, params) in TEXT_QUERIES.items():
+        results[name].append(timed(conn, sql, params, args.repeat))
+    conn.execute('DROP INDEX bench_clock_in')
+    for name, sql in EPOCH_QUERIES.items():
+        results[name].append(timed(conn, sql, epoch_range, args.repeat))
+    conn.close()
+
+    print(f"{args.rows} attendance rows, one month range")
+    print(f"{'query':<16} {'text':>10} {'text+index':>12} {'epoch':>10}")
+    for name, (text, text_indexed, epoch) in results.items():
+        print(f"{name:<16} {text:>8.1f}ms {text_indexed:>10.1f}ms {epoch:>8.1f}ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,71 @@
+"""Import-time benchmark for server.py.
+
+Runs `python -X importtime -c "import server"` in a fresh interpreter,
+prints the total import time and the slowest top-level imports, and fails
+if any of the GUI/plotting/export modules are loaded by a plain import.
+
+    python benchmarks/bench_importtime.py [--runs 5] [--top 15]
+
+The headless `python server.py serve` path must stay free of these modules;
+pandas is loaded on the first Excel export and the tray toolkits only when
+the tray app starts.
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Modules that must not be imported by `import server`
+FORBIDDEN = ('pandas', 'numpy', 'matplotlib', 'pystray', 'PIL', 'tkinter', 'crmtest', 'xlsxwriter')
+
+
+def measure():
+    """Return ({module: cumulative_us}, loaded forbidden modules) for one cold import.
+
+    Only top-level imports and the modules they import directly are kept.
+    """
+    code = ('import sys, server; '
+            f'print(",".join(m for m in {FORBIDDEN!r} if m in sys.modules))')
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', code],
+                            cwd=ROOT, capture_output=True, text=True, check=True)
+    cumulative = {}
+    for line in result.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative_us, name = line.split(':', 1)[1].split('|')
+        # Nesting is shown by two spaces per level
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        if depth <= 1:
+            cumulative[name.strip()] = int(cumulative_us)
+    loaded = [m for m in result.stdout.strip().split(',') if m]
+    return cumulative, loaded
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    arg_parser.add_argument('--runs', type=int, default=5)
+    arg_parser.add_argument('--top', type=int, default=15)
+    args = arg_parser.parse_args()
+
+    totals = []
+    for _ in range(args.runs):
+        cumulative, loaded = measure()
+        totals.append(cumulative.get('server', 0))
+
+    print(f"import server: median {statistics.median(totals) / 1000:.1f} ms over {args.runs} runs "
+          f"(min {min(totals) / 1000:.1f} ms)")
+    print("slowest imports (last run, cumulative):")
+    for name, us in sorted(((n, us) for n, us in cumulative.items() if n != 'server'), key=lambda item: -item[1])[:args.top]:
+        print(f"  {us / 1000:8.1f} ms  {name}")
+
+    if loaded:
+        sys.exit(f"FAIL: import server loaded {', '.join(loaded)}")
+    print("OK: no GUI/plotting/export modules loaded")
+
+
+if __name__ == '__main__':
+    main()
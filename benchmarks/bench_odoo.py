@@ -0,0 +1,199 @@
+"""CRM tab load against an Odoo with many leads: the old unbounded
+search_read and one create per lead versus odoo_client's paging, read_group
+stage counts and batched creates over one kept-alive connection.
+
+Runs a small in-process stand-in for Odoo's XML-RPC API (authenticate,
+search_read, search_count, read_group, create on crm.lead/crm.stage), so the
+times are transport and serialization cost, not Odoo's database.
+
+    python benchmarks/bench_odoo.py [--leads 100000] [--creates 500]
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+import xmlrpc.client
+from socketserver import ThreadingMixIn
+from xmlrpc.server import SimpleXMLRPCRequestHandler, SimpleXMLRPCServer
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+STAGES = [{'id': i, 'name': name, 'sequence': i} for i, name in enumerate(('New', 'Qualified', 'Won'), 1)]
+
+
+class FakeOdoo:
+    """Just enough of crm.lead and crm.stage for the calls the CRM tab and the
+    server's mirror make"""
+
+    def __init__(self, count):
+        self.clock = 0
+        self.leads = {i: {'id': i, 'name': f"Lead {i}", 'partner_name': f"Customer {i}",
+                          'email_from': f"c{i}@example.com", 'phone': f"010{i:08d}",
+                          'stage_id': [STAGES[i % 3]['id'], STAGES[i % 3]['name']], 'active': True,
+                          'description': "x" * 200, 'user_id': [2, "Sales"], 'write_date': self.now()}
+                      for i in range(1, count + 1)}
+        self.next_id = count + 1
+        self.connections = set()
+
+    def now(self):
+        # Many records share a write_date, as they do in Odoo after an import
+        self.clock += 1
+        return f"2026-01-01 {self.clock // 3600000:02d}:{self.clock // 60000 % 60:02d}:{self.clock // 1000 % 60:02d}"
+
+    def authenticate(self, db, login, password, env):
+        return 2
+
+    def _term(self, record, term):
+        field, op, value = term
+        actual = record.get(field, False)
+        if op == 'ilike':
+            return str(value).lower() in str(actual or '').lower()
+        if op == 'in':
+            return actual in value
+        if isinstance(actual, list):
+            actual = actual[0]
+        return {'=': actual == value, '>': actual > value, '<': actual < value,
+                '>=': actual >= value, '<=': actual <= value, '!=': actual != value}[op]
+
+    def _match(self, record, domain):
+        # Prefix notation, evaluated from the end; leftover terms are and-ed
+        stack = []
+        for term in reversed(domain):
+            if term == '|':
+                stack.append(stack.pop() | stack.pop())
+            elif term == '&':
+                stack.append(stack.pop() & stack.pop())
+            elif term == '!':
+                stack.append(not stack.pop())
+            else:
+                stack.append(self._term(record, term))
+        # Archived records are left out unless the domain asks about active
+        if not any(isinstance(term, list) and term[0] == 'active' for term in domain):
+            stack.append(record.get('active', True))
+        return all(stack)
+
+    def execute_kw(self, db, uid, password, model, method, args, kwargs=None):
+        kwargs = kwargs or {}
+        if method == 'create':
+            values = args[0] if isinstance(args[0], list) else [args[0]]
+            ids = []
+            for vals in values:
+                ids.append(self.next_id)
+                self.next_id += 1
+                self.leads[ids[-1]] = dict(vals, id=ids[-1], stage_id=False, active=True, write_date=self.now())
+            return ids if isinstance(args[0], list) else ids[0]
+        if method == 'write':
+            for lead_id in args[0]:
+                self.leads[lead_id].update(args[1], write_date=self.now())
+            return True
+        if method == 'unlink':
+            for lead_id in args[0]:
+                del self.leads[lead_id]
+            return True
+        records = STAGES if model == 'crm.stage' else self.leads.values()
+        matched = [r for r in records if self._match(r, args[0])]
+        if method == 'search_count':
+            return len(matched)
+        if method == 'read_group':
+            counts = {}
+            for r in matched:
+                key = tuple(r['stage_id']) if r['stage_id'] else False
+                counts[key] = counts.get(key, 0) + 1
+            return [{'stage_id': list(key) if key else False, 'stage_id_count': n} for key, n in counts.items()]
+        for part in reversed((kwargs.get('order') or 'id').split(',')):
+            field, _, direction = part.strip().partition(' ')
+            matched.sort(key=lambda r: r[field], reverse=direction == 'desc')
+        if method == 'search':
+            return [r['id'] for r in matched]
+        offset, limit = kwargs.get('offset', 0), kwargs.get('limit')
+        matched = matched[offset:offset + limit if limit else None]
+        fields = kwargs.get('fields')
+        return [{f: r.get(f, False) for f in fields} for r in matched] if fields else matched
+
+
+def serve(odoo):
+    class Handler(SimpleXMLRPCRequestHandler):
+        rpc_paths = ('/xmlrpc/2/common', '/xmlrpc/2/object')
+        protocol_version = 'HTTP/1.1'
+
+        def setup(self):
+            super().setup()
+            odoo.connections.add(self.client_address)
+
+        def log_message(self, *args):
+            pass
+
+    class Server(ThreadingMixIn, SimpleXMLRPCServer):
+        daemon_threads = True
+
+    server = Server(('127.0.0.1', 0), Handler, allow_none=True, logRequests=False)
+    server.register_instance(odoo)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def old_connector(url):
+    """What crmtest.OdooConnector did before: a new proxy per call site, no paging"""
+    common = xmlrpc.client.ServerProxy(f'{url}/xmlrpc/2/common')
+    uid = common.authenticate('db', 'admin', 'admin', {})
+    return uid, xmlrpc.client.ServerProxy(f'{url}/xmlrpc/2/object')
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    arg_parser.add_argument('--leads', type=int, default=100000)
+    arg_parser.add_argument('--creates', type=int, default=500)
+    args = arg_parser.parse_args()
+
+    from crmtest import OdooConnector
+    odoo = FakeOdoo(args.leads)
+    url = serve(odoo)
+    new_leads = [{'name': f"New {i}", 'email_from': f"n{i}@example.com", 'phone': f"011{i:08d}"}
+                 for i in range(args.creates)]
+
+    # Before: the whole table, every field, to fill the leads tab and count stages
+    started = time.perf_counter()
+    uid, models = old_connector(url)
+    leads = models.execute_kw('db', uid, 'admin', 'crm.lead', 'search_read', [[]],
+                              {'fields': OdooConnector.LEAD_FIELDS})
+    stage_counts = {}
+    for lead in leads:
+        stage_counts[lead['stage_id'][0]] = stage_counts.get(lead['stage_id'][0], 0) + 1
+    print(f"unbounded search_read:      {time.perf_counter() - started:6.2f}s for {len(leads)} leads")
+
+    started = time.perf_counter()
+    for lead in new_leads:
+        models.execute_kw('db', uid, 'admin', 'crm.lead', 'create', [lead])
+    print(f"create one per call:        {time.perf_counter() - started:6.2f}s for {len(new_leads)} leads")
+
+    connector = OdooConnector()
+    connector.set_credentials(url, 'db', 'admin', 'admin')
+    odoo.connections.clear()
+    started = time.perf_counter()
+    connector.connect()
+    total = connector.count_leads()
+    page = connector.get_leads()
+    counts = connector.get_stage_counts()
+    elapsed = time.perf_counter() - started
+    assert len(page) == connector.LEADS_PAGE_SIZE and page[0]['id'] == total, page[0]
+    assert sum(counts.values()) == total and counts[1] == stage_counts[1], counts
+    print(f"first page + read_group:    {elapsed:6.2f}s ({len(page)} of {total} leads, {len(counts)} stages)")
+
+    started = time.perf_counter()
+    ids = connector.create_leads(new_leads)
+    elapsed = time.perf_counter() - started
+    assert len(ids) == len(new_leads) and ids == sorted(ids)
+    print(f"create_leads (batched):     {elapsed:6.2f}s for {len(ids)} leads")
+
+    found = connector.get_leads(['|', '|', ('name', 'ilike', 'New 1'), ('partner_name', 'ilike', 'New 1'),
+                                 ('phone', 'ilike', 'New 1')])
+    assert found and all('New 1' in lead['name'] for lead in found), found
+    # authenticate and object calls each kept one connection open throughout
+    print(f"connections opened:         {len(odoo.connections)}")
+    assert len(odoo.connections) <= 2, odoo.connections
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,145 @@
+"""Odoo mirror: initial and incremental sync time, and the CRM tab's first
+page from the mirror versus from Odoo.
+
+Uses the stand-in Odoo from bench_odoo.py and a scratch attendance.db. After
+each sync the mirror is compared with the fake Odoo's active leads; exits
+non-zero if they differ.
+
+    python benchmarks/bench_odoo_mirror.py [--leads 100000] [--edits 1000]
+"""
+import argparse
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+failures = []
+
+
+def check(label, actual, expected):
+    if actual != expected:
+        failures.append(f"{label}: got {actual!r}, expected {expected!r}")
+
+
+def check_mirror(label, odoo, deleted=()):
+    conn = sqlite3.connect('attendance.db')
+    mirrored = {row[0]: row[1:] for row in conn.execute('SELECT id, name, stage_id FROM odoo_leads')}
+    conn.close()
+    expected = {lead['id']: (lead['name'], lead['stage_id'][0] if lead['stage_id'] else None)
+                for lead in odoo.leads.values() if lead['active']}
+    for lead_id in deleted:
+        mirrored.pop(lead_id, None)
+    if mirrored != expected:
+        missing = len(expected.keys() - mirrored.keys())
+        extra = len(mirrored.keys() - expected.keys())
+        stale = sum(1 for k in expected.keys() & mirrored.keys() if expected[k] != mirrored[k])
+        failures.append(f"{label}: {missing} missing, {extra} extra, {stale} stale leads in the mirror")
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    arg_parser.add_argument('--leads', type=int, default=100000)
+    arg_parser.add_argument('--edits', type=int, default=1000)
+    args = arg_parser.parse_args()
+
+    from bench_odoo import FakeOdoo, serve
+    import odoo_client
+
+    os.chdir(tempfile.mkdtemp(prefix='bench_odoo_mirror_'))
+    import server
+    server.init_db()
+    client = server.app.test_client()
+    odoo = FakeOdoo(args.leads)
+    url = serve(odoo)
+    conn = sqlite3.connect('attendance.db')
+    conn.execute("INSERT INTO crm_credentials (url, db, username, password) VALUES (?, 'db', 'admin', 'secret')", (url,))
+    conn.commit()
+    conn.close()
+    login = {'username': 'admin', 'password': 'secret'}
+
+    response = client.post('/api/odoo/leads', json=login)
+    check("leads before the first sync", response.json['synced_at'], None)
+
+    started = time.perf_counter()
+    metrics = server.sync_odoo_mirror()
+    print(f"initial sync:          {time.perf_counter() - started:6.2f}s for {metrics['leads_synced']} leads")
+    check_mirror("initial sync", odoo)
+
+    # Edits, archives, deletes and creates made in Odoo since
+    ids = sorted(odoo.leads)
+    odoo_api = odoo_client.OdooClient(url, 'db', 'admin', 'secret')
+    odoo_api.execute('crm.lead', 'write', [ids[:args.edits], {'stage_id': 3, 'name': 'Edited'}])
+    odoo_api.execute('crm.lead', 'write', [ids[-10:], {'active': False}])
+    deleted = ids[args.edits:args.edits + 10]
+    odoo_api.execute('crm.lead', 'unlink', [deleted])
+    odoo_api.create_many('crm.lead', [{'name': f"Fresh {i}"} for i in range(20)])
+    for lead_id in ids[:args.edits]:
+        odoo.leads[lead_id]['stage_id'] = [3, 'Won']
+
+    started = time.perf_counter()
+    metrics = server.sync_odoo_mirror()
+    print(f"incremental sync:      {time.perf_counter() - started:6.2f}s "
+          f"({metrics['leads_synced']} leads changed, {metrics['leads_dropped']} deleted)")
+    # Deleted leads are still mirrored until the reconcile
+    check_mirror("incremental sync", odoo, deleted)
+    check("incremental sync read only the changes", metrics['leads_synced'] < 2 * (args.edits + 30), True)
+
+    # Deleted leads go at the daily reconcile, forced here
+    conn = sqlite3.connect('attendance.db')
+    conn.execute("UPDATE odoo_sync_state SET reconciled_at = NULL")
+    conn.commit()
+    conn.close()
+    started = time.perf_counter()
+    metrics = server.sync_odoo_mirror()
+    print(f"sync with reconcile:   {time.perf_counter() - started:6.2f}s ({metrics['leads_dropped']} deleted)")
+    check_mirror("after reconcile", odoo)
+
+    started = time.perf_counter()
+    odoo_page = odoo_api.search_read('crm.lead', [], ['id', 'name', 'partner_name', 'email_from', 'phone', 'stage_id'],
+                                     limit=200, order='id desc')
+    odoo_total = odoo_api.search_count('crm.lead')
+    odoo_elapsed = time.perf_counter() - started
+    started = time.perf_counter()
+    response = client.post('/api/odoo/leads', json=dict(login, limit=200))
+    mirror_elapsed = time.perf_counter() - started
+    print(f"first page from Odoo:  {odoo_elapsed * 1000:6.1f} ms")
+    print(f"first page, mirror:    {mirror_elapsed * 1000:6.1f} ms")
+    check("mirror page", [lead['id'] for lead in response.json['leads']], [lead['id'] for lead in odoo_page])
+    check("mirror total", response.json['total'], odoo_total)
+    check("mirror page stage", response.json['leads'][0]['stage_id'], odoo_page[0]['stage_id'])
+    next_page = client.post('/api/odoo/leads', json=dict(login, limit=200, before_id=odoo_page[-1]['id'])).json
+    check("second page", [lead['id'] for lead in next_page['leads']],
+          [lead['id'] for lead in odoo_api.search_read('crm.lead', [], ['id'], offset=200, limit=200, order='id desc')])
+    check("search", client.post('/api/odoo/leads', json=dict(login, search='fresh 1')).json['total'], 11)
+
+    stages = client.post('/api/odoo/stages', json=login).json
+    counts = {g['stage_id'][0] if g['stage_id'] else None: g['stage_id_count']
+              for g in odoo_api.read_group('crm.lead', [], ['stage_id'], ['stage_id'])}
+    check("stage counts", {s['id']: s['leads'] for s in stages['stages']},
+          {stage_id: n for stage_id, n in counts.items() if stage_id})
+    check("no stage count", stages['no_stage'], counts.get(None, 0))
+
+    response = client.post('/api/odoo/create_leads', json=dict(login, leads=[{'name': 'Walk-in', 'phone': '0123'}]))
+    created = response.json['ids'][0]
+    check("write-through lead in Odoo", odoo.leads[created]['name'], 'Walk-in')
+    check("write-through lead in mirror",
+          client.post('/api/odoo/leads', json=dict(login, limit=1)).json['leads'][0]['id'], created)
+    check("wrong password", client.post('/api/odoo/leads', json=dict(login, password='x')).status_code, 401)
+    check("saved login without admin", client.post('/api/get_crm_credentials', json={}).status_code, 401)
+    check("saved login for admin", client.post('/api/get_crm_credentials', json={'admin_password': 'admin123'})
+          .json['credentials']['password'], 'secret')
+    odoo_api.close()
+
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    print('FAILED' if failures else 'Mirror matches Odoo')
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
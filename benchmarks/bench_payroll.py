@@ -0,0 +1,80 @@
+"""Payroll engine time for a month of attendance.
+
+Builds a synthetic database in a scratch directory (staff spread over a day
+shift, a night shift and no shift, one paid holiday, some approved leave)
+and times payroll.run over the month.
+
+    python benchmarks/bench_payroll.py [--staff 500] [--days 31] [--repeat 5]
+"""
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def populate(staff_count, start, days):
+    rng = random.Random(42)
+    conn = sqlite3.connect('attendance.db')
+    cursor = conn.cursor()
+    cursor.execute("INSERT INTO shifts (name, start_time, end_time) VALUES ('Day', '08:00', '16:00')")
+    day_shift = cursor.lastrowid
+    cursor.execute("INSERT INTO shifts (name, start_time, end_time) VALUES ('Night', '22:00', '06:00')")
+    night_shift = cursor.lastrowid
+    shifts = (day_shift, night_shift, None)
+    staff = [(f"S{i:03d}", f"Staff member {i}", rng.choice((12.5, 15.0, 18.75)), shifts[i % 3]) for i in range(staff_count)]
+    cursor.executemany('INSERT INTO staff (staff_code, name, hourly_rate, shift_id) VALUES (?, ?, ?, ?)', staff)
+
+    rows = []
+    for day in range(days):
+        for i, (staff_code, _, _, shift_id) in enumerate(staff):
+            hour = 22 if shift_id == night_shift else 8
+            clock_in = start + timedelta(days=day, hours=hour, minutes=rng.randint(-30, 30))
+            clock_out = clock_in + timedelta(hours=rng.uniform(6, 10))
+            rows.append((staff_code, clock_in.isoformat(), clock_out.isoformat(), 'work'))
+    cursor.executemany('INSERT INTO attendance (staff_code, clock_in, clock_out, session_type) VALUES (?, ?, ?, ?)', rows)
+    cursor.execute("INSERT INTO holidays (date, name, paid) VALUES (?, 'Holiday', 1)",
+                   ((start + timedelta(days=days // 2)).strftime('%Y-%m-%d'),))
+    cursor.executemany("INSERT INTO leave_requests (staff_code, start_date, end_date, status) VALUES (?, ?, ?, 'approved')",
+                       [(staff_code, (start + timedelta(days=5)).strftime('%Y-%m-%d'),
+                         (start + timedelta(days=9)).strftime('%Y-%m-%d')) for staff_code, _, _, _ in staff[::10]])
+    conn.commit()
+    conn.close()
+    return len(rows)
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    arg_parser.add_argument('--staff', type=int, default=500)
+    arg_parser.add_argument('--days', type=int, default=31)
+    arg_parser.add_argument('--repeat', type=int, default=5)
+    args = arg_parser.parse_args()
+
+    os.chdir(tempfile.mkdtemp(prefix='bench_payroll_'))
+    import server
+    import payroll
+    server.init_db()
+    start = datetime(2026, 3, 1)
+    end = start + timedelta(days=args.days)
+    rows = populate(args.staff, start, args.days)
+
+    conn = sqlite3.connect('attendance.db')
+    timings = []
+    for _ in range(args.repeat):
+        started = time.perf_counter()
+        _, daily, summary = payroll.run(conn, start, end)
+        timings.append(time.perf_counter() - started)
+    conn.close()
+    print(f"{rows} sessions, {args.staff} staff, {len(daily)} staff-days")
+    print(f"payroll.run: best {min(timings) * 1000:.0f} ms, first {timings[0] * 1000:.0f} ms")
+    print(f"total pay {summary['total_pay'].sum():,.2f}, overtime hours {summary['overtime_hours'].sum():,.1f}")
+
+
+if __name__ == '__main__':
+    main()
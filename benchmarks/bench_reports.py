@@ -0,0 +1,76 @@
+"""Report generation time, in-process versus on the report process pool.
+
+Builds a synthetic database in a scratch directory, then times the combined
+workbook and the per-staff zip with the pool disabled and enabled. The gain
+depends on the cores available; on a single core the pool only adds overhead.
+
+    python benchmarks/bench_reports.py [--staff 80] [--days 365] [--processes N]
+"""
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def populate(staff_count, days):
+    rng = random.Random(42)
+    conn = sqlite3.connect('attendance.db')
+    cursor = conn.cursor()
+    cursor.executemany('INSERT INTO staff (staff_code, name, hourly_rate) VALUES (?, ?, ?)',
+                       [(f"S{i:03d}", f"Staff member {i}", rng.choice((12.5, 15.0, 18.75))) for i in range(staff_count)])
+    start = datetime.now() - timedelta(days=days)
+    rows = []
+    for day in range(days):
+        for i in range(staff_count):
+            clock_in = start + timedelta(days=day, hours=8, minutes=rng.randint(0, 59))
+            clock_out = clock_in + timedelta(hours=rng.uniform(4, 9))
+            rows.append((f"S{i:03d}", clock_in.isoformat(), clock_out.isoformat(), None, 'work'))
+    cursor.executemany('INSERT INTO attendance (staff_code, clock_in, clock_out, notes, session_type) VALUES (?, ?, ?, ?, ?)',
+                       rows)
+    conn.commit()
+    conn.close()
+    return len(rows)
+
+
+def timed(function, *args):
+    started = time.perf_counter()
+    function(*args)
+    return time.perf_counter() - started
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    arg_parser.add_argument('--staff', type=int, default=80)
+    arg_parser.add_argument('--days', type=int, default=365)
+    arg_parser.add_argument('--processes', type=int, default=None)
+    args = arg_parser.parse_args()
+
+    os.chdir(tempfile.mkdtemp(prefix='bench_reports_'))
+    import server
+    import reports
+    server.init_db()
+    rows = populate(args.staff, args.days)
+    if args.processes:
+        reports.REPORT_PROCESSES = args.processes
+    print(f"{rows} attendance rows, {args.staff} staff, pool of {reports.REPORT_PROCESSES} processes")
+
+    params = {'start_date': (datetime.now() - timedelta(days=args.days + 1)).strftime('%Y-%m-%d')}
+    # Start the pool first so its spawn cost is not charged to the first report
+    reports.get_pool().submit(int).result()
+    for label, threshold in (('in-process', float('inf')), ('process pool', 0)):
+        reports.REPORT_PARALLEL_MIN_ROWS = threshold
+        workbook = timed(server.build_excel_report, params)
+        per_staff = timed(server.build_staff_workbooks, params)
+        print(f"{label:<14} workbook {workbook:6.2f}s   per-staff zip {per_staff:6.2f}s")
+    reports.shutdown()
+
+
+if __name__ == '__main__':
+    main()
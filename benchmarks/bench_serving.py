@@ -0,0 +1,96 @@
+"""Throughput comparison: Flask development server vs. waitress.
+
+Starts `server.py serve` (with --dev for the development server) in a
+scratch directory, then fires POST requests from a pool of client threads
+and reports requests/second and latency percentiles for each mode.
+
+    python benchmarks/bench_serving.py [--requests 2000] [--clients 16] [--threads 8]
+
+Run it on the machine that hosts the server; numbers from a laptop say
+little about the office box. Both modes use the same freshly initialised
+database, so the only variable is the WSGI server.
+"""
+import argparse
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PORT = 5000
+URL = f"http://127.0.0.1:{PORT}"
+
+# (endpoint, payload) pairs exercised round-robin: one read that touches the
+# database and one that does not
+WORKLOAD = [
+    ('/api/get_staff', {'password': 'admin123'}),
+    ('/api/server_metrics', {'password': 'admin123'}),
+]
+
+
+def wait_until_up(timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            requests.post(URL + WORKLOAD[0][0], json=WORKLOAD[0][1], timeout=1)
+            return
+        except requests.RequestException:
+            time.sleep(0.2)
+    raise RuntimeError("server did not start")
+
+
+def run_mode(label, extra_args, n_requests, clients, threads):
+    workdir = tempfile.mkdtemp(prefix='bench_serving_')
+    env = dict(os.environ, PYTHONPATH=ROOT)
+    cmd = [sys.executable, os.path.join(ROOT, 'server.py'), 'serve', '--threads', str(threads)] + extra_args
+    proc = subprocess.Popen(cmd, cwd=workdir, env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        wait_until_up()
+        session_local = {}
+
+        def one(i):
+            # One keep-alive session per client thread
+            import threading
+            session = session_local.setdefault(threading.get_ident(), requests.Session())
+            path, payload = WORKLOAD[i % len(WORKLOAD)]
+            started = time.perf_counter()
+            response = session.post(URL + path, json=payload, timeout=30)
+            response.raise_for_status()
+            return time.perf_counter() - started
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=clients) as pool:
+            latencies = sorted(pool.map(one, range(n_requests)))
+        elapsed = time.perf_counter() - started
+    finally:
+        proc.terminate()
+        proc.wait(timeout=30)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    print(f"{label:>12}: {n_requests / elapsed:8.1f} req/s  "
+          f"p50 {statistics.median(latencies) * 1000:6.1f} ms  "
+          f"p95 {latencies[int(len(latencies) * 0.95) - 1] * 1000:6.1f} ms  "
+          f"p99 {latencies[int(len(latencies) * 0.99) - 1] * 1000:6.1f} ms")
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    arg_parser.add_argument('--requests', type=int, default=2000)
+    arg_parser.add_argument('--clients', type=int, default=16)
+    arg_parser.add_argument('--threads', type=int, default=8, help='waitress worker threads')
+    args = arg_parser.parse_args()
+
+    print(f"{args.requests} requests from {args.clients} client threads")
+    run_mode('dev server', ['--dev'], args.requests, args.clients, args.threads)
+    run_mode('waitress', [], args.requests, args.clients, args.threads)
+
+
+if __name__ == '__main__':
+    main()
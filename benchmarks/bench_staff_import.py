@@ -0,0 +1,58 @@
+"""Staff onboarding speed: one add_staff request per employee versus one
+bulk_upsert_staff request for all of them.
+
+Runs against a scratch database through Flask's test client. The bulk import
+is timed twice, once adding everyone and once updating them all again.
+
+    python benchmarks/bench_staff_import.py [--staff 10000] [--single 500]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    arg_parser.add_argument('--staff', type=int, default=10000)
+    arg_parser.add_argument('--single', type=int, default=500, help="staff added one request at a time")
+    args = arg_parser.parse_args()
+
+    os.chdir(tempfile.mkdtemp(prefix='bench_staff_import_'))
+    import server
+    server.init_db()
+    client = server.app.test_client()
+    client.post('/api/add_shift', json={'password': 'admin123', 'name': 'Morning',
+                                        'start_time': '08:00', 'end_time': '16:00'})
+
+    started = time.perf_counter()
+    for i in range(args.single):
+        response = client.post('/api/add_staff', json={'password': 'admin123', 'staff_code': f"ONE{i:05d}",
+                                                       'name': f"Single {i}", 'hourly_rate': 15,
+                                                       'shift_name': 'Morning'})
+        assert response.json['success'], response.json
+    single = (time.perf_counter() - started) / args.single
+    server.audit_writer.flush()
+    print(f"add_staff:         {single * 1000:.2f} ms per employee "
+          f"(~{single * args.staff:.1f}s for {args.staff})")
+
+    rows = [{'staff_code': f"S{i:05d}", 'name': f"Staff member {i}", 'hourly_rate': str(12 + i % 10),
+             'shift_name': 'morning' if i % 2 else ''} for i in range(args.staff)]
+    rows.append({'staff_code': 'BAD', 'name': 'Bad shift', 'shift_name': 'Nights'})
+    for label in ('insert', 'update'):
+        started = time.perf_counter()
+        response = client.post('/api/bulk_upsert_staff', json={'password': 'admin123', 'staff': rows})
+        elapsed = time.perf_counter() - started
+        assert response.json['success'] and len(response.json['errors']) == 1, response.json
+        print(f"bulk_upsert_staff: {elapsed:.2f}s to {label} {args.staff} ({response.json['message']})")
+        for row in rows:
+            row['hourly_rate'] = str(float(row.get('hourly_rate') or 0) + 1)
+    server.audit_writer.flush()
+
+
+if __name__ == '__main__':
+    main()
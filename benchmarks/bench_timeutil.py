@@ -0,0 +1,123 @@
+"""Request date parsing speed, and DST boundary checks for timeutil.
+
+Times timeutil.parse_date against dateutil.parser.parse on the date strings
+the client sends, then checks day lengths, stored offsets, SQLite's epochs
+and payroll hours around the spring and autumn clock changes in a few site
+timezones. Exits non-zero if a check fails.
+
+    python benchmarks/bench_timeutil.py [--count 100000] [--repeat 5]
+"""
+import argparse
+import os
+import sqlite3
+import sys
+import time
+import timeit
+from datetime import date, datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+SAMPLES = ['2026-03-29', '2026-10-25 01:30:00', '2026-10-25T01:30:00.250000', '2026-03-29 09:00:00+02:00']
+
+# (zone, spring-forward day, fall-back day); the southern zone changes the other way round
+DST_ZONES = (('Europe/Berlin', date(2026, 3, 29), date(2026, 10, 25)),
+             ('America/New_York', date(2026, 3, 8), date(2026, 11, 1)),
+             ('Australia/Sydney', date(2026, 10, 4), date(2026, 4, 5)))
+
+failures = []
+
+
+def check(label, actual, expected):
+    if actual != expected:
+        failures.append(f"{label}: got {actual!r}, expected {expected!r}")
+
+
+def bench_parsing(count, repeat):
+    from dateutil import parser
+    import timeutil
+
+    values = SAMPLES * (count // len(SAMPLES))
+    for name, function in (('timeutil.parse_date', timeutil.parse_date), ('dateutil.parser.parse', parser.parse)):
+        best = min(timeit.repeat(lambda: [function(value) for value in values], number=1, repeat=repeat))
+        print(f"{name:<24}{best / len(values) * 1e6:8.2f} us per date")
+
+
+def check_zone(zone, spring, autumn):
+    import timeutil
+    import payroll
+    import pandas as pd
+
+    timeutil.configure(zone)
+    day = 24 * 3600
+    check(f"{zone} spring day length", timeutil.to_epoch(str(date.fromordinal(spring.toordinal() + 1)))
+          - timeutil.to_epoch(str(spring)), day - 3600)
+    check(f"{zone} autumn day length", timeutil.to_epoch(str(date.fromordinal(autumn.toordinal() + 1)))
+          - timeutil.to_epoch(str(autumn)), day + 3600)
+    (_, first), (_, second) = timeutil.day_starts(spring, spring)
+    check(f"{zone} day_starts", second - first, day - 3600)
+
+    # An overnight session across each change, clocked with the wall clock
+    conn = sqlite3.connect(':memory:')
+    for label, night, expected in (('spring', spring, 7.0), ('autumn', autumn, 9.0)):
+        clock_in = timeutil.to_storage(datetime.combine(date.fromordinal(night.toordinal() - 1), datetime.min.time())
+                                       .replace(hour=22))
+        clock_out = timeutil.to_storage(datetime.combine(night, datetime.min.time()).replace(hour=6))
+        stamps = conn.execute("SELECT CAST(strftime('%s', ?) AS INTEGER), CAST(strftime('%s', ?) AS INTEGER)",
+                              (clock_in, clock_out)).fetchone()
+        check(f"{zone} {label} SQLite epochs", stamps, (timeutil.to_epoch(clock_in), timeutil.to_epoch(clock_out)))
+        check(f"{zone} {label} hours", (stamps[1] - stamps[0]) / 3600, expected)
+        check(f"{zone} {label} presentation", timeutil.format_local(stamps[1])[11:], '06:00:00')
+
+        sessions = pd.DataFrame({'id': [1], 'staff_code': ['S1'], 'clock_in_ts': [stamps[0]],
+                                 'clock_out_ts': [stamps[1]], 'session_type': ['work']})
+        staff = pd.DataFrame({'staff_code': ['S1'], 'name': ['S1'], 'hourly_rate': [10.0],
+                              'start_time': ['22:00'], 'end_time': ['06:00']})
+        no_days_off = pd.DataFrame({'date': [], 'paid': []})
+        no_leave = pd.DataFrame({'staff_code': [], 'start_date': [], 'end_date': []})
+        session_pay, _ = payroll.compute(sessions, staff, no_days_off, no_leave,
+                                         clock_in[:10], str(date.fromordinal(night.toordinal() + 1)))
+        check(f"{zone} {label} payroll regular hours", session_pay['regular_hours'].round(6).tolist(), [expected])
+        check(f"{zone} {label} payroll day", str(session_pay['date'][0].date()), clock_in[:10])
+    conn.close()
+
+    # A wall-clock time that happens twice is its first occurrence
+    repeated = datetime.combine(autumn, datetime.min.time()).replace(hour=2 if zone != 'America/New_York' else 1,
+                                                                      minute=30)
+    check(f"{zone} repeated hour", timeutil.format_local(timeutil.to_epoch(repeated)), f"{repeated:%Y-%m-%d %H:%M:%S}")
+
+
+def check_parsing():
+    import timeutil
+
+    timeutil.configure('UTC')
+    check("date only", timeutil.parse_date('2026-03-29'), datetime(2026, 3, 29))
+    check("Z suffix", timeutil.to_epoch('2026-03-29T00:00:00Z'), timeutil.to_epoch('2026-03-29'))
+    check("fraction rounds up", timeutil.to_epoch('2026-03-29 00:00:00.5'), timeutil.to_epoch('2026-03-29') + 1)
+    for value in ('29/03/2026', 'March 29 2026', '2026-3-29', ''):
+        try:
+            timeutil.parse_date(value)
+        except ValueError:
+            continue
+        failures.append(f"parse_date accepted {value!r}")
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    arg_parser.add_argument('--count', type=int, default=100000)
+    arg_parser.add_argument('--repeat', type=int, default=5)
+    args = arg_parser.parse_args()
+
+    started = time.perf_counter()
+    bench_parsing(args.count, args.repeat)
+    check_parsing()
+    for zone, spring, autumn in DST_ZONES:
+        check_zone(zone, spring, autumn)
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    print(f"{'FAILED' if failures else 'All DST checks passed'} ({time.perf_counter() - started:.1f}s)")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,4 +1,9 @@
 # client.py
+import time
+# Taken before the imports below so the startup measurement covers them
+_PROCESS_STARTED = time.perf_counter()
+
+import sys
 import tkinter as tk
 from tkinter import ttk, messagebox, simpledialog, filedialog
 import requests
@@ -7,18 +12,54 @@ import os
 import io  # Added this import
 from datetime import datetime, timedelta
 import base64
-import webbrowser
 import socket
 import threading
-import time
-from tkcalendar import DateEntry
-import pandas as pd
-import arabic_reshaper  
-from bidi.algorithm import get_display
 import re
 import textwrap
-from PIL import Image, ImageDraw, ImageFont
-from PIL import ImageTk
+
+# tkcalendar, pandas, PIL, arabic_reshaper and bidi are imported where they
+# are used so the kiosk screen comes up without loading them
+
+
+# ---------- Columnar responses ----------
+# Row lists can be requested with "format": "columnar": column names once, then
+# one list of values per row. decode_columnar() turns them back into dicts.
+
+def decode_columnar(payload):
+    for key, value in payload.items():
+        if isinstance(value, dict) and set(value) == {'columns', 'rows'}:
+            columns = value['columns']
+            payload[key] = [dict(zip(columns, row)) for row in value['rows']]
+    return payload
+
+
+# ---------- Conditional requests ----------
+# Responses from read endpoints that send an ETag, keyed by URL + request body.
+_http_cache = {}
+_http_cache_lock = threading.Lock()
+
+def _cache_key(url, payload):
+    return url + '\n' + json.dumps(payload, sort_keys=True)
+
+def post_cached(url, json=None, timeout=5):
+    """requests.post() for read endpoints that support ETags.
+
+    Sends If-None-Match with the tag of the last response for the same request.
+    On 304 Not Modified the cached response is returned, so callers can use
+    it exactly like a fresh one.
+    """
+    key = _cache_key(url, json)
+    with _http_cache_lock:
+        cached = _http_cache.get(key)
+    headers = {'If-None-Match': cached.headers['ETag']} if cached is not None else {}
+    response = requests.post(url, json=json, timeout=timeout, headers=headers)
+    if response.status_code == 304 and cached is not None:
+        return cached
+    if response.status_code == 200 and 'ETag' in response.headers:
+        response.content  # read the body now so it can be replayed later
+        with _http_cache_lock:
+            _http_cache[key] = response
+    return response
 
 
 
@@ -103,6 +144,8 @@ class QuestionsDialog(tk.Toplevel):
         for q, e in self.entries.items():
             self.result[q] = e.get().strip()
 
+        from PIL import ImageTk
+
         img = self._create_preview_image()
         self.photo = ImageTk.PhotoImage(img)
         self.preview_label.config(image=self.photo)
@@ -120,6 +163,10 @@ class QuestionsDialog(tk.Toplevel):
             messagebox.showerror("Error", f"Copy failed:\n{e}")
 
     def _create_preview_image(self):
+        from PIL import Image, ImageDraw, ImageFont
+        import arabic_reshaper
+        from bidi.algorithm import get_display
+
         # layout calculation
         y = 40
         for q, a in self.result.items():
@@ -170,19 +217,6 @@ class QuestionsDialog(tk.Toplevel):
 
         return img
 
-    # In the QuestionsDialog __init__ method, add these elements after the bottom names section:
-
-    # ----- preview button -----
-    submit_btn = ttk.Button(self, text="Generate Preview", command=self._generate_preview)
-    submit_btn.pack(pady=10)
-
-    self.preview_label = ttk.Label(self)
-    self.preview_label.pack(pady=5)
-
-    # Also add this button in the __init__ method:
-    copy_btn = ttk.Button(self, text="Copy Image", command=self._copy_image_to_clipboard)
-    copy_btn.pack(pady=5)
-
 class LeaveRequestDialog(tk.Toplevel):
     def __init__(self, parent, staff_code):
         super().__init__(parent)
@@ -247,6 +281,7 @@ class LeaveRequestDialog(tk.Toplevel):
     def pick_start_date(self):
         top = tk.Toplevel(self)
         top.title("Select Start Date")
+        from tkcalendar import DateEntry
         cal = DateEntry(top, width=12, background='darkblue',
                         foreground='white', borderwidth=2)
         cal.pack(padx=10, pady=10)
@@ -260,6 +295,7 @@ class LeaveRequestDialog(tk.Toplevel):
     def pick_end_date(self):
         top = tk.Toplevel(self)
         top.title("Select End Date")
+        from tkcalendar import DateEntry
         cal = DateEntry(top, width=12, background='darkblue',
                         foreground='white', borderwidth=2)
         cal.pack(padx=10, pady=10)
@@ -340,6 +376,17 @@ class AttendanceClient:
         
         # Start server discovery in a separate thread
         threading.Thread(target=self.discover_server, daemon=True).start()
+
+        # Startup-time hook: seconds from process start until the kiosk screen
+        # is drawn and idle. `python client.py --startup-time` prints it and exits.
+        self.startup_seconds = None
+        self.root.after_idle(self.on_startup_complete)
+
+    def on_startup_complete(self):
+        self.startup_seconds = time.perf_counter() - _PROCESS_STARTED
+        if '--startup-time' in sys.argv:
+            print(f"startup: {self.startup_seconds * 1000:.0f} ms")
+            self.root.destroy()
     
     def manual_connect(self):
         """Manually connect to a server IP"""
@@ -457,7 +504,8 @@ class AttendanceClient:
             from crmtest import CrmFrame
             self.crm_section = ttk.LabelFrame(self.attendance_tab, text="CRM", padding=10)
             self.crm_section.pack(fill="both", expand=True, padx=10, pady=10)
-            self.crm_frame = CrmFrame(self.crm_section, server_url=self.server_url)
+            self.crm_frame = CrmFrame(self.crm_section, server_url=self.server_url,
+                                      admin_password=self._crm_admin_password)
             self.crm_frame.pack(fill="both", expand=True)
             refresh_frame = ttk.Frame(self.crm_section)
             refresh_frame.pack(fill=tk.X, pady=5)
@@ -467,9 +515,14 @@ class AttendanceClient:
         if hasattr(self, 'crm_frame'):
             self.crm_frame.destroy()
         from crmtest import CrmFrame
-        self.crm_frame = CrmFrame(self.crm_section, server_url=self.server_url)
+        self.crm_frame = CrmFrame(self.crm_section, server_url=self.server_url,
+                                  admin_password=self._crm_admin_password)
         self.crm_frame.pack(fill="both", expand=True)
 
+    def _crm_admin_password(self):
+        """Admin password for the CRM frame to save or load its Odoo login on the server, if logged in"""
+        return self.password_entry.get().strip() if self.admin_logged_in else None
+
     def setup_attendance_tab(self):
         # Title
         title_label = ttk.Label(self.attendance_tab, text="الحضور و الانصراف⏰", font=("Arial", 16, "bold"))
@@ -556,63 +609,57 @@ class AttendanceClient:
         self.admin_notebook.add(self.audit_log_tab, text="Audit")
         self.admin_notebook.add(self.detailed_report_tab, text="payroll & attendance ")
         self.admin_notebook.add(self.notes_export_tab, text="Notes Export")
-        # ------------------------------------------------------------------
-        # Inside AttendanceClient.setup_admin_tab()  (add after the other tabs)
-        # ------------------------------------------------------------------
-        # --- CRM Admin Tab (single, clean version) ---
         self.crm_admin_tab = ttk.Frame(self.admin_notebook)
         self.admin_notebook.add(self.crm_admin_tab, text="CRM Admin")
-        self.admin_notebook.tab(self.crm_admin_tab, state="disabled")  # hidden until login
-        self.setup_crm_admin_tab()
-
-        # Tab-change listener – refresh CRM when the tab becomes visible
-        def on_admin_tab_changed(event):
-            try:
-                selected = self.admin_notebook.select()
-                if not selected:
-                    return
-                tab_text = self.admin_notebook.tab(selected, "text")
-                if tab_text == "CRM Admin":
-                    self.root.after(100, self.crm_refresh_leads)  # Delay to avoid race
-            except tk.TclError:
-                pass  # Ignore if notebook is not ready
-
-        self.admin_notebook.bind("<<NotebookTabChanged>>", on_admin_tab_changed)
-        # Inside setup_admin_tab()
-        self.crm_admin_tab = ttk.Frame(self.admin_notebook)
-        self.admin_notebook.add(self.crm_admin_tab, text="CRM Admin")
-        self.admin_notebook.tab(self.crm_admin_tab, state="disabled")  # hidden until login
-        self.setup_crm_admin_tab()
 
+        # Sub-tabs are built the first time they are selected after login,
+        # then loaded with that tab's refresh function
+        self.admin_logged_in = False
+        self.events_connected = False
+        # Rows followed through /api/sync (see sync_replica); empty until the first sync
+        self.replica = {}
+        self.replica_seq = 0
+        # Tables the event stream asked to reload (op 'R'), reloaded together
+        self._pending_reloads = set()
+        self._admin_tab_setup = {
+            str(self.attendance_data_tab): (self.setup_attendance_data_tab, None),
+            str(self.staff_management_tab): (self.setup_staff_management_tab, self.refresh_staff_data),
+            str(self.shift_management_tab): (self.setup_shift_management_tab, self.refresh_shift_data),
+            str(self.holiday_management_tab): (self.setup_holiday_management_tab, self.refresh_holiday_data),
+            str(self.leave_management_tab): (self.setup_leave_management_tab, self.refresh_leave_data),
+            str(self.dashboard_tab): (self.setup_dashboard_tab, None),
+            str(self.settings_tab): (self.setup_settings_tab, None),
+            str(self.audit_log_tab): (self.setup_audit_log_tab, self.refresh_audit_log),
+            str(self.detailed_report_tab): (self.setup_detailed_report_tab, self.refresh_staff_data),
+            str(self.notes_export_tab): (self.setup_notes_export_tab, self.refresh_staff_data),
+            str(self.crm_admin_tab): (self.setup_crm_admin_tab, None),
+        }
+        self._built_admin_tabs = set()
+        self.admin_notebook.bind("<<NotebookTabChanged>>", self.on_admin_tab_changed)
 
         # Initially disable admin sub-tabs
-        for i in range(10):
-            self.admin_notebook.tab(i, state="disabled")
-        
-        # Setup attendance data tab
-        self.setup_attendance_data_tab()
-        
-        # Setup staff management tab
-        self.setup_staff_management_tab()
-        
-        # Setup shift management tab
-        self.setup_shift_management_tab()
-        
-        # Setup holiday management tab
-        self.setup_holiday_management_tab()
-        
-        # Setup leave management tab
-        self.setup_leave_management_tab()
-        
-        # Setup dashboard tab
-        self.setup_dashboard_tab()
-        
-        # Setup settings tab
-        self.setup_settings_tab()
-        self.setup_audit_log_tab()
-        self.setup_detailed_report_tab()
-        self.setup_notes_export_tab()
-    
+        for tab_id in self.admin_notebook.tabs():
+            self.admin_notebook.tab(tab_id, state="disabled")
+
+    def on_admin_tab_changed(self, event=None):
+        """Build the selected admin sub-tab on first use"""
+        if not self.admin_logged_in:
+            return
+        try:
+            selected = self.admin_notebook.select()
+            if not selected:
+                return
+            if selected not in self._built_admin_tabs:
+                self._built_admin_tabs.add(selected)
+                setup, refresh = self._admin_tab_setup[selected]
+                setup()
+                if refresh:
+                    refresh()
+            # Without the live event stream the CRM tab is reloaded whenever it becomes visible
+            if selected == str(self.crm_admin_tab) and not self.events_connected:
+                self.root.after(100, self.crm_refresh_leads)  # Delay to avoid race
+        except tk.TclError:
+            pass  # Ignore if notebook is not ready
 
     class CrmLeadDialog(tk.Toplevel):
         def __init__(self, parent, title, server_url, admin_pw, lead_data=None):
@@ -690,14 +737,14 @@ class AttendanceClient:
 
     def _get_targets(self):
         try:
-            r = requests.post(f"{self.server_url}/api/crm_get_targets",
+            r = post_cached(f"{self.server_url}/api/crm_get_targets",
                               json={"password": self.admin_pw}, timeout=5)
             return r.json().get('targets', [])
         except: return []
 
     def _get_staff(self):
         try:
-            r = requests.post(f"{self.server_url}/api/get_staff",
+            r = post_cached(f"{self.server_url}/api/get_staff",
                               json={"password": self.admin_pw}, timeout=5)
             data = r.json().get('data', [])
             return [f"{s['staff_code']} - {s['name']}" for s in data]
@@ -734,7 +781,7 @@ class AttendanceClient:
         """Live CRM Admin – auto-syncs with DB"""
         container = ttk.Frame(self.crm_admin_tab, padding=10)
         container.pack(fill=tk.BOTH, expand=True)
-        container.grid_rowconfigure(0, weight=1)
+        container.grid_rowconfigure(2, weight=1)
         container.grid_columnconfigure(0, weight=1)
 
         # Toolbar
@@ -746,49 +793,64 @@ class AttendanceClient:
         ttk.Button(toolbar, text="Edit Lead",  command=self.crm_edit_lead).grid(row=0, column=1, padx=2)
         ttk.Button(toolbar, text="Delete Lead",command=self.crm_delete_lead).grid(row=0, column=2, padx=2)
         ttk.Button(toolbar, text="Change Target", command=self.crm_change_target).grid(row=0, column=3, padx=2)
-        ttk.Button(toolbar, text="Refresh",    command=self.crm_refresh_leads).grid(row=0, column=4, padx=2, sticky='e')
+        ttk.Button(toolbar, text="Set Status", command=self.crm_set_status).grid(row=0, column=4, padx=2)
+        ttk.Button(toolbar, text="Reassign",   command=self.crm_reassign).grid(row=0, column=5, padx=2)
+        ttk.Button(toolbar, text="Import Leads...", command=self.crm_import_leads).grid(row=0, column=6, padx=2)
+        ttk.Button(toolbar, text="Refresh",    command=self.crm_refresh_leads).grid(row=0, column=7, padx=2, sticky='e')
+
+        # Filters, applied on the server
+        filters = ttk.Frame(container)
+        filters.grid(row=1, column=0, sticky='ew', pady=2)
+        self.crm_filter_vars = {key: tk.StringVar() for key in
+                                ('status', 'target', 'assigned_to', 'phone_prefix', 'created_from', 'created_to')}
+        self.crm_sort_var = tk.StringVar(value='created_at')
+        self.crm_order_var = tk.StringVar(value='desc')
+        column = 0
+        for label, key, width in (("Status", 'status', 10), ("Target", 'target', 10), ("Assigned", 'assigned_to', 8),
+                                  ("Phone starts", 'phone_prefix', 10), ("Created from", 'created_from', 10),
+                                  ("to", 'created_to', 10)):
+            ttk.Label(filters, text=label).grid(row=0, column=column, padx=(6, 2))
+            if key == 'status':
+                widget = ttk.Combobox(filters, textvariable=self.crm_filter_vars[key], width=width,
+                                      values=[''] + self.CRM_LEAD_STATUSES, state='readonly')
+            else:
+                widget = ttk.Entry(filters, textvariable=self.crm_filter_vars[key], width=width)
+                widget.bind('<Return>', lambda e: self.crm_refresh_leads())
+            widget.grid(row=0, column=column + 1)
+            column += 2
+        ttk.Label(filters, text="Sort").grid(row=0, column=column, padx=(6, 2))
+        ttk.Combobox(filters, textvariable=self.crm_sort_var, width=10, state='readonly',
+                     values=['created_at', 'name', 'id']).grid(row=0, column=column + 1)
+        ttk.Combobox(filters, textvariable=self.crm_order_var, width=5, state='readonly',
+                     values=['desc', 'asc']).grid(row=0, column=column + 2, padx=2)
+        ttk.Button(filters, text="Apply", command=self.crm_refresh_leads).grid(row=0, column=column + 3, padx=4)
 
         # Treeview
         tree_frame = ttk.Frame(container)
-        tree_frame.grid(row=1, column=0, sticky='nsew', pady=4)
+        tree_frame.grid(row=2, column=0, sticky='nsew', pady=4)
         tree_frame.grid_rowconfigure(0, weight=1)
         tree_frame.grid_columnconfigure(0, weight=1)
 
         cols = ('ID', 'Name', 'Phone', 'Status', 'Target', 'Assigned', 'Notes', 'Created')
-        self.crm_tree = ttk.Treeview(tree_frame, columns=cols, show='headings', selectmode='browse')
+        # Several leads can be selected for the batch actions (Ctrl/Shift-click)
+        self.crm_tree = ttk.Treeview(tree_frame, columns=cols, show='headings', selectmode='extended')
         for c, w in zip(cols, (50, 150, 110, 80, 100, 100, 200, 130)):
             self.crm_tree.heading(c, text=c)
             self.crm_tree.column(c, width=w, anchor='w')
 
-        vbar = ttk.Scrollbar(tree_frame, orient=tk.VERTICAL,   command=self.crm_tree.yview)
+        self.crm_vbar = ttk.Scrollbar(tree_frame, orient=tk.VERTICAL,   command=self.crm_tree.yview)
         hbar = ttk.Scrollbar(tree_frame, orient=tk.HORIZONTAL, command=self.crm_tree.xview)
-        self.crm_tree.configure(yscrollcommand=vbar.set, xscrollcommand=hbar.set)
+        # Further pages load as the list is scrolled to the bottom
+        self.crm_tree.configure(yscrollcommand=self._crm_on_scroll, xscrollcommand=hbar.set)
 
         self.crm_tree.grid(row=0, column=0, sticky='nsew')
-        vbar.grid(row=0, column=1, sticky='ns')
+        self.crm_vbar.grid(row=0, column=1, sticky='ns')
         hbar.grid(row=1, column=0, sticky='ew')
 
         # Status
         self.crm_status = ttk.Label(container, text="Loading...", foreground="blue")
-        self.crm_status.grid(row=2, column=0, sticky='w', pady=4)
+        self.crm_status.grid(row=3, column=0, sticky='w', pady=4)
 
-        # === SAFE TAB CHANGE HANDLER ===
-        def on_tab_change(event):
-            try:
-                selected = self.admin_notebook.select()
-                if not selected:
-                    return
-                tab_text = self.admin_notebook.tab(selected, "text")
-                if tab_text == "CRM Admin":
-                    self.root.after(100, self.crm_refresh_leads)  # Delay to avoid race
-            except tk.TclError:
-                pass  # Ignore if notebook not ready
-
-        self.admin_notebook.bind("<<NotebookTabChanged>>", on_tab_change)
-
-        # Initial load after login
-        self.root.after(1000, self.crm_refresh_leads)
-        
     def setup_attendance_data_tab(self):
         """Fully functional Attendance Data tab – live DB sync, edit, search, export"""
         container = ttk.Frame(self.attendance_data_tab, padding=10)
@@ -860,6 +922,8 @@ class AttendanceClient:
         top.title("Select Date")
         top.geometry("300x250")
         
+        from tkcalendar import DateEntry
+        
         cal = DateEntry(top, width=12, background='darkblue', foreground='darkgreen', borderwidth=2)
         cal.pack(padx=20, pady=20)
 
@@ -889,9 +953,9 @@ class AttendanceClient:
 
         try:
             response = requests.post(f"{self.server_url}/api/get_attendance",
-                                    json={"password": pw.get().strip()}, timeout=10)
+                                    json={"password": pw.get().strip(), "format": "columnar"}, timeout=10)
             response.raise_for_status()  # Raises an error for bad responses (4xx or 5xx)
-            resp_data = response.json()
+            resp_data = decode_columnar(response.json())
 
             if not resp_data.get('success'):
                 raise ValueError(resp_data.get('message', 'Server returned success=False'))
@@ -924,9 +988,8 @@ class AttendanceClient:
 
         filtered = []
         for rec in self.attendance_records:
-            # --- FIX: Extract date from the 'clock_in' timestamp ---
-            clock_in_dt = datetime.fromisoformat(rec.get('clock_in'))
-            record_date = clock_in_dt.strftime('%Y-%m-%d')
+            # Timestamps are ISO text, so the date is the first 10 characters
+            record_date = rec.get('clock_in', '')[:10]
 
             if search and search not in rec.get('staff_code','').lower() and search not in rec.get('name','').lower():
                 continue
@@ -940,19 +1003,17 @@ class AttendanceClient:
 
         # --- FIX: Populate tree with correctly formatted data ---
         for rec in filtered:
-            clock_in_dt = datetime.fromisoformat(rec.get('clock_in'))
-            record_date = clock_in_dt.strftime('%Y-%m-%d')
-            clock_in_time = clock_in_dt.strftime('%H:%M:%S')
+            record_date = rec.get('clock_in', '')[:10]
+            clock_in_time = rec.get('clock_in', '')[11:19]
 
             clock_out_time = ''
             hours = 0.0
-            if rec.get('clock_out'):
-                clock_out_dt = datetime.fromisoformat(rec.get('clock_out'))
-                clock_out_time = clock_out_dt.strftime('%H:%M:%S')
-                # --- FIX: Calculate hours if clock_out exists ---
-                hours = round((clock_out_dt - clock_in_dt).total_seconds() / 3600, 2)
+            if rec.get('clock_out') and rec.get('clock_out') != 'Active':
+                clock_out_time = rec.get('clock_out')[11:19]
+                # The server computes hours from the integer timestamps
+                hours = rec.get('hours', 0.0)
 
-            notes = (rec.get('notes') or '')[:50] + ('...' if len(rec.get('notes',''))>50 else '')
+            notes = (rec.get('notes') or '')[:50] + ('...' if len(rec.get('notes') or '')>50 else '')
             
             self.att_tree.insert('', 'end', values=(
                 rec.get('id'),
@@ -995,7 +1056,7 @@ class AttendanceClient:
                 r = requests.post(f"{self.server_url}/api/edit_attendance", json=payload, timeout=8)
                 resp = r.json()
                 if resp.get('success'):
-                    self.load_attendance_data()
+                    self._refresh_unless_live(self.load_attendance_data)
                 else:
                     messagebox.showerror("Error", resp.get('message'))
             except Exception as e:
@@ -1014,8 +1075,7 @@ class AttendanceClient:
         data_to_export = []
         for rec in self.attendance_records:
             # Apply same filters
-            clock_in_dt = datetime.fromisoformat(rec.get('clock_in'))
-            record_date = clock_in_dt.strftime('%Y-%m-%d')
+            record_date = rec.get('clock_in', '')[:10]
 
             if search and search not in rec.get('staff_code','').lower() and search not in rec.get('name','').lower():
                 continue
@@ -1028,9 +1088,9 @@ class AttendanceClient:
                 'Staff Code': rec.get('staff_code'),
                 'Name': rec.get('name'),
                 'Date': record_date,
-                'Clock In': clock_in_dt.strftime('%H:%M:%S'),
-                'Clock Out': datetime.fromisoformat(rec.get('clock_out')).strftime('%H:%M:%S') if rec.get('clock_out') else 'N/A',
-                'Hours Worked': round((datetime.fromisoformat(rec.get('clock_out')) - clock_in_dt).total_seconds() / 3600, 2) if rec.get('clock_out') else 0,
+                'Clock In': rec.get('clock_in', '')[11:19],
+                'Clock Out': rec.get('clock_out')[11:19] if rec.get('clock_out') and rec.get('clock_out') != 'Active' else 'N/A',
+                'Hours Worked': rec.get('hours', 0),
                 'Notes': rec.get('notes', '')
             })
 
@@ -1053,6 +1113,7 @@ class AttendanceClient:
 
         try:
             # Create a Pandas DataFrame
+            import pandas as pd
             df = pd.DataFrame(data_to_export)
 
             # Use ExcelWriter to create the file
@@ -1108,6 +1169,9 @@ class AttendanceClient:
         delete_button = ttk.Button(button_frame, text="Delete Staff", command=self.delete_staff)
         delete_button.pack(side=tk.LEFT, padx=5)
         
+        import_button = ttk.Button(button_frame, text="Import Staff...", command=self.import_staff)
+        import_button.pack(side=tk.LEFT, padx=5)
+        
         refresh_button = ttk.Button(button_frame, text="Refresh", command=self.refresh_staff_data)
         refresh_button.pack(side=tk.LEFT, padx=5)
         
@@ -1380,6 +1444,7 @@ class AttendanceClient:
         ttk.Button(button_frame, text="Generate Report", command=self.generate_detailed_report).pack(side=tk.LEFT, padx=5)
         ttk.Button(button_frame, text="Export User Report", command=self.export_single_user_report).pack(side=tk.LEFT, padx=5)
         ttk.Button(button_frame, text="Export All Staff", command=self.export_all_staff_report).pack(side=tk.LEFT, padx=5)
+        ttk.Button(button_frame, text="Export Per-Staff Workbooks", command=self.export_staff_workbooks).pack(side=tk.LEFT, padx=5)
 
         # Report display frame
         report_frame = ttk.LabelFrame(self.detailed_report_tab, text="Report Data", padding="10")
@@ -1544,6 +1609,7 @@ class AttendanceClient:
     def pick_start_date(self):
         top = tk.Toplevel(self.root)
         top.title("Select Start Date")
+        from tkcalendar import DateEntry
         cal = DateEntry(top, width=12, background='darkblue',
                         foreground='white', borderwidth=2)
         cal.pack(padx=10, pady=10)
@@ -1557,6 +1623,7 @@ class AttendanceClient:
     def pick_end_date(self):
         top = tk.Toplevel(self.root)
         top.title("Select End Date")
+        from tkcalendar import DateEntry
         cal = DateEntry(top, width=12, background='darkblue',
                         foreground='white', borderwidth=2)
         cal.pack(padx=10, pady=10)
@@ -1570,6 +1637,7 @@ class AttendanceClient:
     def pick_dashboard_start_date(self):
         top = tk.Toplevel(self.root)
         top.title("Select Start Date")
+        from tkcalendar import DateEntry
         cal = DateEntry(top, width=12, background='darkblue',
                         foreground='white', borderwidth=2)
         cal.pack(padx=10, pady=10)
@@ -1583,6 +1651,7 @@ class AttendanceClient:
     def pick_dashboard_end_date(self):
         top = tk.Toplevel(self.root)
         top.title("Select End Date")
+        from tkcalendar import DateEntry
         cal = DateEntry(top, width=12, background='darkblue',
                         foreground='white', borderwidth=2)
         cal.pack(padx=10, pady=10)
@@ -1596,6 +1665,7 @@ class AttendanceClient:
     def pick_report_start_date(self):
         top = tk.Toplevel(self.root)
         top.title("Select Start Date")
+        from tkcalendar import DateEntry
         cal = DateEntry(top, width=12, background='darkblue',
                         foreground='white', borderwidth=2)
         cal.pack(padx=10, pady=10)
@@ -1609,6 +1679,7 @@ class AttendanceClient:
     def pick_report_end_date(self):
         top = tk.Toplevel(self.root)
         top.title("Select End Date")
+        from tkcalendar import DateEntry
         cal = DateEntry(top, width=12, background='darkblue',
                         foreground='white', borderwidth=2)
         cal.pack(padx=10, pady=10)
@@ -1622,6 +1693,7 @@ class AttendanceClient:
     def pick_notes_start_date(self):
         top = tk.Toplevel(self.root)
         top.title("Select Start Date")
+        from tkcalendar import DateEntry
         cal = DateEntry(top, width=12, background='darkblue',
                         foreground='white', borderwidth=2)
         cal.pack(padx=10, pady=10)
@@ -1635,6 +1707,7 @@ class AttendanceClient:
     def pick_notes_end_date(self):
         top = tk.Toplevel(self.root)
         top.title("Select End Date")
+        from tkcalendar import DateEntry
         cal = DateEntry(top, width=12, background='darkblue',
                         foreground='white', borderwidth=2)
         cal.pack(padx=10, pady=10)
@@ -1852,13 +1925,12 @@ class AttendanceClient:
                         self.admin_notebook.tab(tab_id, state="normal")
                     # --- END OF FIX ---
 
-                    # Load initial data for the tabs
-                    self.refresh_staff_data()
-                    self.refresh_shift_data()
-                    self.refresh_holiday_data()
-                    self.refresh_leave_data()
-                    self.refresh_audit_log()
-                    # Add other refresh calls as needed
+                    # Build and load the visible tab; the others load when first selected
+                    self.admin_logged_in = True
+                    self.on_admin_tab_changed()
+
+                    # Keep the open tabs current from the server's change stream
+                    self.start_event_stream(password)
 
                 else:
                     self.admin_status.config(text="Invalid password", foreground="red")
@@ -1873,6 +1945,199 @@ class AttendanceClient:
             messagebox.showerror("Error", f"An error occurred during login: {e}")
 
 
+    # ---------- Local replica (/api/sync) ----------
+
+    # CRM leads are not replicated: the CRM Admin tab pages through them
+    SYNC_TABLES = ('staff', 'shifts', 'holidays', 'leave_requests')
+
+    def sync_replica(self, password):
+        """Fetch the rows changed since the last sync into self.replica.
+
+        The first call (and any call after the server has pruned past our
+        position) returns a full snapshot; after that only deltas travel.
+        Returns the set of tables that changed.
+        """
+        r = requests.post(f"{self.server_url}/api/sync",
+                          json={"password": password, "since": self.replica_seq,
+                                "tables": list(self.SYNC_TABLES)}, timeout=10)
+        r.raise_for_status()
+        data = r.json()
+        if not data.get('success'):
+            raise ValueError(data.get('message', 'Sync failed'))
+
+        changed = set()
+        if data['mode'] == 'snapshot':
+            self.replica = {table: {} for table in self.SYNC_TABLES}
+            changed.update(self.SYNC_TABLES)
+        for table, delta in data['changes'].items():
+            rows = self.replica.setdefault(table, {})
+            for row in delta['upserts']:
+                rows[row['id']] = row
+            for row_id in delta['deletes']:
+                rows.pop(row_id, None)
+            if delta['upserts'] or delta['deletes']:
+                changed.add(table)
+        self.replica_seq = data['seq']
+        return changed
+
+    # ---------- Live updates (/api/events) ----------
+
+    def _staff_values(self, record):
+        return (
+            record.get('id'),
+            record.get('staff_code'),
+            record.get('name'),
+            record.get('hourly_rate'),
+            record.get('shift_name')
+        )
+
+    def _shift_values(self, record):
+        return (
+            record.get('id'),
+            record.get('name'),
+            record.get('start_time'),
+            record.get('end_time')
+        )
+
+    def _holiday_values(self, record):
+        return (
+            record.get('id'),
+            record.get('date'),
+            record.get('name'),
+            "Yes" if record.get('paid') else "No"
+        )
+
+    def _leave_values(self, record):
+        return (
+            record.get('id'),
+            record.get('staff_code'),
+            record.get('name'),
+            record.get('start_date'),
+            record.get('end_date'),
+            record.get('reason'),
+            record.get('status')
+        )
+
+    def _crm_lead_values(self, lead):
+        return (
+            lead.get('id'),
+            lead.get('name'),
+            lead.get('phone'),
+            lead.get('status'),
+            lead.get('target'),
+            lead.get('assigned_to'),
+            (lead.get('notes') or '')[:50] + ('...' if len(lead.get('notes') or '')>50 else ''),
+            (lead.get('created_at') or '')[:19].replace('T',' ')
+        )
+
+    def start_event_stream(self, password):
+        if getattr(self, '_event_thread', None) and self._event_thread.is_alive():
+            return
+        self._event_thread = threading.Thread(target=self._event_stream, args=(password,), daemon=True)
+        self._event_thread.start()
+
+    def _event_stream(self, password):
+        """Background thread: read the SSE stream and hand each change to the Tk thread"""
+        retry = 5
+        while self.admin_logged_in:
+            try:
+                with requests.post(f"{self.server_url}/api/events", json={"password": password},
+                                   stream=True, timeout=(5, 60)) as response:
+                    if response.status_code != 200:
+                        raise requests.exceptions.RequestException(f"status {response.status_code}")
+                    self.root.after(0, self._on_event_stream_connected)
+                    data_lines = []
+                    for line in response.iter_lines(decode_unicode=True):
+                        if line.startswith('retry:'):
+                            retry = int(line[6:]) / 1000
+                        elif line.startswith('data:'):
+                            data_lines.append(line[5:].strip())
+                        elif not line and data_lines:
+                            event = json.loads('\n'.join(data_lines))
+                            data_lines = []
+                            self.root.after(0, self.apply_change, event)
+            except (requests.exceptions.RequestException, ValueError):
+                pass
+            self.events_connected = False
+            time.sleep(retry)
+
+    def _on_event_stream_connected(self):
+        """(Re)connected: reload the built tabs once, then rely on deltas"""
+        reconnect = getattr(self, '_event_stream_seen', False)
+        self._event_stream_seen = True
+        self.events_connected = True
+        if not reconnect:
+            return
+        refreshes = {self._admin_tab_setup[tab_id][1] for tab_id in self._built_admin_tabs}
+        if str(self.attendance_data_tab) in self._built_admin_tabs:
+            refreshes.add(self.load_attendance_data)
+        if str(self.crm_admin_tab) in self._built_admin_tabs:
+            refreshes.add(self.crm_refresh_leads)
+        for refresh in refreshes - {None}:
+            refresh()
+
+    def _refresh_unless_live(self, refresh):
+        """Reload after a write of our own, unless the event stream is connected:
+        then the change arrives as an event and a reload would only repeat it"""
+        if not self.events_connected:
+            refresh()
+
+    def _apply_tree_change(self, tree, event, values):
+        iid = str(event['id'])
+        if event['op'] == 'D':
+            if tree.exists(iid):
+                tree.delete(iid)
+        elif tree.exists(iid):
+            tree.item(iid, values=values)
+        else:
+            # Read endpoints list the newest rows first
+            tree.insert('', 0, iid=iid, values=values)
+
+    def _reload_invalidated(self):
+        """Reload the tables whose staff or shift names changed on the server"""
+        tables, self._pending_reloads = self._pending_reloads, set()
+        # Replicated tables come back as deltas: /api/sync resends the joined rows
+        if tables & {'staff', 'leave_requests'} and self.replica:
+            self.refresh_staff_data()
+            if hasattr(self, 'leave_tree'):
+                self.refresh_leave_data()
+        if 'attendance' in tables and hasattr(self, 'attendance_records'):
+            self.load_attendance_data()
+        if 'crm_leads' in tables and hasattr(self, 'crm_tree'):
+            self.crm_refresh_leads()
+
+    def apply_change(self, event):
+        """Apply one change event from the server to the replica and the tabs that are built"""
+        table, row = event['table'], event['row']
+        if event['op'] == 'R':
+            if not self._pending_reloads:
+                self.root.after(200, self._reload_invalidated)
+            self._pending_reloads.add(table)
+            return
+        if table in self.replica:
+            if row:
+                self.replica[table][event['id']] = row
+            else:
+                self.replica[table].pop(event['id'], None)
+        if table == 'staff' and hasattr(self, 'staff_tree'):
+            self._apply_tree_change(self.staff_tree, event, row and self._staff_values(row))
+        elif table == 'shifts' and hasattr(self, 'shift_tree'):
+            self._apply_tree_change(self.shift_tree, event, row and self._shift_values(row))
+        elif table == 'holidays' and hasattr(self, 'holiday_tree'):
+            self._apply_tree_change(self.holiday_tree, event, row and self._holiday_values(row))
+        elif table == 'leave_requests' and hasattr(self, 'leave_tree'):
+            self._apply_tree_change(self.leave_tree, event, row and self._leave_values(row))
+        elif table == 'crm_leads' and hasattr(self, 'crm_tree'):
+            if row and not self._crm_lead_matches(row):
+                # No longer matches the filters: drop it like a delete
+                event = dict(event, op='D')
+            self._apply_tree_change(self.crm_tree, event, row and self._crm_lead_values(row))
+        elif table == 'attendance' and hasattr(self, 'attendance_records'):
+            self.attendance_records = [rec for rec in self.attendance_records if rec.get('id') != event['id']]
+            if row:
+                self.attendance_records.insert(0, row)
+            self.filter_attendance()
+
     def _admin_pw(self):
         pw = self.password_entry.get().strip()
         if not pw:
@@ -1880,49 +2145,102 @@ class AttendanceClient:
             return None
         return pw
 
+    # Leads requested per page as the CRM Admin tree is scrolled
+    CRM_PAGE_SIZE = 200
+
+    def _crm_filters(self):
+        """crm_get_leads filter and sort parameters from the CRM Admin filter bar"""
+        params = {key: var.get().strip() for key, var in self.crm_filter_vars.items() if var.get().strip()}
+        params['sort'] = self.crm_sort_var.get()
+        params['order'] = self.crm_order_var.get()
+        return params
+
+    def _crm_lead_matches(self, lead):
+        """Whether a lead from a live event belongs in the filtered tree"""
+        params = self._crm_filters()
+        for key in ('status', 'target', 'assigned_to'):
+            if key in params and lead.get(key) != params[key]:
+                return False
+        if 'phone_prefix' in params and not (lead.get('phone') or '').startswith(params['phone_prefix']):
+            return False
+        # Date filters are checked by the server on the next refresh
+        return True
+
     def crm_refresh_leads(self):
-        """Pull ALL leads from SQLite DB via server and fill the tree."""
-        pw = self.password_entry.get().strip()
-        if not pw:
-            messagebox.showerror("Error", "Admin password required")
+        """Reload the CRM leads from the first page with the current filters."""
+        if not self.password_entry.get().strip():
+            self.crm_status.config(text="Admin password required", foreground="red")
+            return
+        for item in self.crm_tree.get_children():
+            self.crm_tree.delete(item)
+        self.crm_next_cursor = None
+        self.crm_total = None
+        self._crm_load_page(first=True)
+
+    def _crm_load_page(self, first=False):
+        """Fetch the next page of leads in the background and append it to the tree"""
+        self._crm_page_requested = False
+        if first:
+            # A refresh supersedes any page still in flight; its result is dropped
+            self._crm_generation = getattr(self, '_crm_generation', 0) + 1
+        elif getattr(self, '_crm_loading', False) or not self.crm_next_cursor:
             return
+        self._crm_loading = True
+        generation = self._crm_generation
+        payload = {"password": self.password_entry.get().strip(), "limit": self.CRM_PAGE_SIZE,
+                   "cursor": None if first else self.crm_next_cursor, **self._crm_filters()}
 
-        try:
-            r = requests.post(f"{self.server_url}/api/crm_get_leads",
-                            json={"password": pw}, timeout=8)
-            r.raise_for_status()
-            data = r.json()
-            if not data.get('success'):
-                raise ValueError(data.get('message', 'Unknown error'))
+        def fetch():
+            try:
+                r = requests.post(f"{self.server_url}/api/crm_get_leads", json=payload, timeout=10)
+                resp = r.json()
+                if not resp.get('success'):
+                    raise ValueError(resp.get('message', 'Request failed'))
+            except Exception as e:
+                self.root.after(0, self._crm_page_failed, generation, e)
+                return
+            self.root.after(0, self._crm_apply_page, generation, resp)
 
-            # clear
-            for i in self.crm_tree.get_children():
-                self.crm_tree.delete(i)
-
-            # fill
-            for lead in data.get('leads', []):
-                self.crm_tree.insert('', 'end', values=(
-                    lead.get('id'),
-                    lead.get('name'),
-                    lead.get('phone'),
-                    lead.get('status'),
-                    lead.get('target'),
-                    lead.get('assigned_to'),
-                    (lead.get('notes') or '')[:50] + ('...' if len(lead.get('notes',''))>50 else ''),
-                    lead.get('created_at','')[:19].replace('T',' ')
-                ))
+        threading.Thread(target=fetch, daemon=True).start()
 
-            self.crm_status.config(text=f"{len(data.get('leads',[]))} leads – up to date")
-        except Exception as e:
-            messagebox.showerror("CRM Error", f"Refresh failed: {e}")
-            self.crm_status.config(text="Refresh failed", foreground="red")
+    def _crm_page_failed(self, generation, error):
+        if generation != self._crm_generation:
+            return
+        self._crm_loading = False
+        self.crm_status.config(text=f"Refresh failed: {error}", foreground="red")
+
+    def _crm_apply_page(self, generation, resp):
+        if generation != self._crm_generation:
+            return
+        self._crm_loading = False
+        for lead in resp.get('leads', []):
+            iid = str(lead.get('id'))
+            if not self.crm_tree.exists(iid):
+                self.crm_tree.insert('', 'end', iid=iid, values=self._crm_lead_values(lead))
+        self.crm_next_cursor = resp.get('next_cursor')
+        if resp.get('total') is not None:
+            self.crm_total = resp['total']
+        shown = len(self.crm_tree.get_children())
+        self.crm_status.config(text=f"{shown} of {self.crm_total} leads" if self.crm_total is not None
+                               else f"{shown} leads", foreground="blue")
+
+    def _crm_on_scroll(self, first, last):
+        """Tree yscrollcommand: move the scrollbar and fetch more leads near the bottom"""
+        self.crm_vbar.set(first, last)
+        if (float(last) >= 0.95 and getattr(self, 'crm_next_cursor', None)
+                and not getattr(self, '_crm_page_requested', False)
+                and not getattr(self, '_crm_loading', False)):
+            # After the current scroll event, not inside Tk's callback; one
+            # gesture fires many scroll events but queues a single load
+            self._crm_page_requested = True
+            self.root.after_idle(self._crm_load_page)
 
     def crm_add_lead(self):
         dlg = CrmLeadDialog(self.root, title="Add Lead", server_url=self.server_url,
                             admin_pw=self._admin_pw())
         self.root.wait_window(dlg)
         if dlg.result:
-            self.crm_refresh_leads()
+            self._refresh_unless_live(self.crm_refresh_leads)
 
     def crm_edit_lead(self):
         sel = self.crm_tree.selection()
@@ -1947,44 +2265,53 @@ class AttendanceClient:
                             admin_pw=pw, lead_data=lead)
         self.root.wait_window(dlg)
         if dlg.result:
-            self.crm_refresh_leads()
+            self._refresh_unless_live(self.crm_refresh_leads)
 
-    def crm_delete_lead(self):
-        sel = self.crm_tree.selection()
-        if not sel:
-            messagebox.showwarning("Select", "Please select a lead")
-            return
-        lead_id = self.crm_tree.item(sel[0])['values'][0]
-
-        if not messagebox.askyesno("Delete", "Delete this lead permanently?"):
-            return
+    def _crm_selected_ids(self):
+        """Ids of the selected leads; warns and returns [] if none are selected"""
+        ids = [self.crm_tree.item(item)['values'][0] for item in self.crm_tree.selection()]
+        if not ids:
+            messagebox.showwarning("Select", "Please select one or more leads")
+        return ids
 
+    def _crm_bulk_request(self, endpoint, payload, failure):
+        """POST a batch request for the selected leads and report the result"""
         pw = self._admin_pw()
-        if not pw: return
+        if not pw: return False
         try:
-            r = requests.post(f"{self.server_url}/api/crm_delete_lead",
-                            json={"password": pw, "lead_id": lead_id}, timeout=5)
+            r = requests.post(f"{self.server_url}{endpoint}", json={"password": pw, **payload}, timeout=30)
             resp = r.json()
-            if resp.get('success'):
-                self.crm_status.config(text="Lead deleted")
-                self.crm_refresh_leads()
-            else:
+            if not resp.get('success'):
                 raise ValueError(resp.get('message'))
         except Exception as e:
-            messagebox.showerror("Error", f"Delete failed: {e}")
+            messagebox.showerror("Error", f"{failure}: {e}")
+            return False
+        self.crm_status.config(text=resp.get('message', "Done"))
+        self._refresh_unless_live(self.crm_refresh_leads)
+        return True
+
+    def crm_delete_lead(self):
+        lead_ids = self._crm_selected_ids()
+        if not lead_ids:
+            return
+
+        prompt = "Delete this lead permanently?" if len(lead_ids) == 1 else \
+            f"Delete these {len(lead_ids)} leads permanently?"
+        if not messagebox.askyesno("Delete", prompt):
+            return
+        self._crm_bulk_request("/api/crm_delete_leads", {"lead_ids": lead_ids}, "Delete failed")
 
     def crm_change_target(self):
         sel = self.crm_tree.selection()
-        if not sel:
-            messagebox.showwarning("Select", "Please select a lead")
+        lead_ids = self._crm_selected_ids()
+        if not lead_ids:
             return
-        lead_id = self.crm_tree.item(sel[0])['values'][0]
 
         # fetch current target list
         pw = self._admin_pw()
         if not pw: return
         try:
-            r = requests.post(f"{self.server_url}/api/crm_get_targets",
+            r = post_cached(f"{self.server_url}/api/crm_get_targets",
                             json={"password": pw}, timeout=5)
             targets = r.json().get('targets', [])
         except:
@@ -1992,21 +2319,83 @@ class AttendanceClient:
 
         target = simpledialog.askstring(
             "Change Target",
-            "New target (choose from list or type):",
+            "New target (choose from list or type):" if len(lead_ids) == 1 else
+            f"New target for {len(lead_ids)} leads (choose from list or type):",
             initialvalue=self.crm_tree.item(sel[0])['values'][4])
         if target is None: return
         if target not in targets:
             if not messagebox.askyesno("New Target", f"'{target}' is not in the master list. Add it?"):
                 return
 
+        self._crm_bulk_request("/api/crm_bulk_update", {"lead_ids": lead_ids, "changes": {"target": target}},
+                               "Target update failed")
+
+    def crm_set_status(self):
+        lead_ids = self._crm_selected_ids()
+        if not lead_ids:
+            return
+        status = simpledialog.askstring(
+            "Set Status", f"New status for {len(lead_ids)} lead(s) ({', '.join(self.CRM_LEAD_STATUSES)}):",
+            initialvalue=self.crm_tree.item(self.crm_tree.selection()[0])['values'][3])
+        if status is None: return
+        matches = [s for s in self.CRM_LEAD_STATUSES if s.lower() == status.strip().lower()]
+        if not matches:
+            messagebox.showerror("Error", f"Status must be one of: {', '.join(self.CRM_LEAD_STATUSES)}")
+            return
+        self._crm_bulk_request("/api/crm_bulk_update", {"lead_ids": lead_ids, "changes": {"status": matches[0]}},
+                               "Status update failed")
+
+    def crm_reassign(self):
+        lead_ids = self._crm_selected_ids()
+        if not lead_ids:
+            return
+        staff_code = simpledialog.askstring(
+            "Reassign", f"Staff code to assign {len(lead_ids)} lead(s) to (leave empty to unassign):")
+        if staff_code is None: return
+        staff_code = staff_code.strip()
+        known = {row.get('staff_code') for row in self.replica.get('staff', {}).values()}
+        if staff_code and known and staff_code not in known:
+            messagebox.showerror("Error", f"Unknown staff code '{staff_code}'")
+            return
+        self._crm_bulk_request("/api/crm_bulk_update",
+                               {"lead_ids": lead_ids, "changes": {"assigned_to": staff_code}},
+                               "Reassign failed")
+
+    def crm_import_leads(self):
+        pw = self._admin_pw()
+        if not pw: return
+        file_path = filedialog.askopenfilename(
+            title="Import Leads",
+            filetypes=[("Lead sheets", "*.csv *.xlsx *.xls"), ("All files", "*.*")]
+        )
+        if not file_path:
+            return
+        try:
+            leads = self.read_import_file(file_path, self.LEAD_IMPORT_COLUMNS)
+        except Exception as e:
+            messagebox.showerror("Error", f"Could not read {os.path.basename(file_path)}:\n{e}")
+            return
+        if not leads:
+            messagebox.showinfo("Import Leads", "The file has no lead rows")
+            return
+
         try:
-            r = requests.post(f"{self.server_url}/api/crm_update_target",
-                            json={"password": pw, "lead_id": lead_id, "target": target}, timeout=5)
-            if r.json().get('success'):
-                self.crm_status.config(text=f"Target → {target}")
-                self.crm_refresh_leads()
+            r = requests.post(f"{self.server_url}/api/crm_add_leads",
+                              json={"password": pw, "leads": leads}, timeout=120)
+            resp = r.json()
+            if not resp.get('success'):
+                raise ValueError(resp.get('message'))
         except Exception as e:
-            messagebox.showerror("Error", f"Target update failed: {e}")
+            messagebox.showerror("Error", f"Import failed: {e}")
+            return
+        errors = resp.get('errors', [])
+        message = resp.get('message', "Leads imported")
+        if errors:
+            # Row 1 of the sheet is the header
+            message += "\n\n" + "\n".join(f"Row {error['row'] + 2}: {error['message']}" for error in errors[:20])
+        messagebox.showinfo("Import Leads", message)
+        self.crm_status.config(text=resp.get('message', "Leads imported"))
+        self._refresh_unless_live(self.crm_refresh_leads)
     
     
 
@@ -2022,9 +2411,10 @@ class AttendanceClient:
 
         try:
             r = requests.post(f"{self.server_url}/api/get_attendance",
-                            json={"password": pw, "start_date": start, "end_date": end}, timeout=10)
+                            json={"password": pw, "start_date": start, "end_date": end, "format": "columnar"},
+                            timeout=10)
             r.raise_for_status()
-            data = r.json()
+            data = decode_columnar(r.json())
             if not data.get('success'):
                 raise ValueError(data.get('message', 'Unknown error'))
 
@@ -2061,166 +2451,62 @@ class AttendanceClient:
             messagebox.showerror("Refresh Error", f"Failed to load data:\n{e}")
             self.attendance_status.config(text="Refresh failed", foreground="red")
 
-    def refresh_staff_data(self):
+    def _sync_for_refresh(self):
+        """Update the local replica before a tab refresh; False (after telling the user) on failure"""
         if not self.connected:
             messagebox.showerror("Error", "Not connected to server")
-            return
+            return False
         
         password = self.password_entry.get()
         if not password:
             messagebox.showerror("Error", "Please enter admin password")
-            return
+            return False
         
         try:
-            response = requests.post(
-                f"{self.server_url}/api/get_staff",  # Fixed: Changed from get_staff_data to get_staff
-                json={"password": password},
-                timeout=5
-            )
-            if response.status_code == 200:
-                data = response.json()
-                if data.get('success'):
-                    # Clear existing data
-                    for item in self.staff_tree.get_children():
-                        self.staff_tree.delete(item)
-                    
-                    # Add new data
-                    for record in data.get('data', []):
-                        self.staff_tree.insert('', 'end', values=(
-                            record.get('id'),
-                            record.get('staff_code'),
-                            record.get('name'),
-                            record.get('hourly_rate'),
-                            record.get('shift_name')
-                        ))
-                    
-                    # Update staff dropdowns in detailed report and notes export tabs
-                    staff_list = [(record.get('staff_code'), record.get('name')) for record in data.get('data', [])]
-                    self.staff_dropdown['values'] = [f"{code} - {name}" for code, name in staff_list]
-                    self.notes_staff_dropdown['values'] = [f"{code} - {name}" for code, name in staff_list]
-                else:
-                    messagebox.showerror("Error", data.get('message', "Failed to get staff data"))
-            else:
-                messagebox.showerror("Error", f"Server returned status code: {response.status_code}")
+            self.sync_replica(password)
+            return True
         except requests.exceptions.RequestException as e:
             messagebox.showerror("Error", f"Failed to connect to server: {str(e)}")
+        except ValueError as e:
+            messagebox.showerror("Error", str(e))
+        return False
 
-    def refresh_shift_data(self):
-        if not self.connected:
-            messagebox.showerror("Error", "Not connected to server")
+    def _fill_tree(self, tree, records, values):
+        for item in tree.get_children():
+            tree.delete(item)
+        for record in records:
+            tree.insert('', 'end', iid=str(record.get('id')), values=values(record))
+
+    def refresh_staff_data(self):
+        if not self._sync_for_refresh():
             return
+        staff = sorted(self.replica['staff'].values(), key=lambda record: record['id'])
+        if hasattr(self, 'staff_tree'):
+            self._fill_tree(self.staff_tree, staff, self._staff_values)
         
-        password = self.password_entry.get()
-        if not password:
-            messagebox.showerror("Error", "Please enter admin password")
+        # Update staff dropdowns in detailed report and notes export tabs (if built yet)
+        staff_list = [(record.get('staff_code'), record.get('name')) for record in staff]
+        for dropdown in ('staff_dropdown', 'notes_staff_dropdown'):
+            if hasattr(self, dropdown):
+                getattr(self, dropdown)['values'] = [f"{code} - {name}" for code, name in staff_list]
+
+    def refresh_shift_data(self):
+        if not self._sync_for_refresh():
             return
-        
-        try:
-            response = requests.post(
-                f"{self.server_url}/api/get_shifts",
-                json={"password": password},
-                timeout=5
-            )
-            if response.status_code == 200:
-                data = response.json()
-                if data.get('success'):
-                    # Clear existing data
-                    for item in self.shift_tree.get_children():
-                        self.shift_tree.delete(item)
-                    
-                    # Add new data
-                    for record in data.get('data', []):
-                        self.shift_tree.insert('', 'end', values=(
-                            record.get('id'),
-                            record.get('name'),
-                            record.get('start_time'),
-                            record.get('end_time')
-                        ))
-                else:
-                    messagebox.showerror("Error", data.get('message', "Failed to get shift data"))
-            else:
-                messagebox.showerror("Error", f"Server returned status code: {response.status_code}")
-        except requests.exceptions.RequestException as e:
-            messagebox.showerror("Error", f"Failed to connect to server: {str(e)}")
+        shifts = sorted(self.replica['shifts'].values(), key=lambda record: record['id'])
+        self._fill_tree(self.shift_tree, shifts, self._shift_values)
 
     def refresh_holiday_data(self):
-        if not self.connected:
-            messagebox.showerror("Error", "Not connected to server")
+        if not self._sync_for_refresh():
             return
-        
-        password = self.password_entry.get()
-        if not password:
-            messagebox.showerror("Error", "Please enter admin password")
-            return
-        
-        try:
-            response = requests.post(
-                f"{self.server_url}/api/get_holidays",
-                json={"password": password},
-                timeout=5
-            )
-            if response.status_code == 200:
-                data = response.json()
-                if data.get('success'):
-                    # Clear existing data
-                    for item in self.holiday_tree.get_children():
-                        self.holiday_tree.delete(item)
-                    
-                    # Add new data
-                    for record in data.get('data', []):
-                        self.holiday_tree.insert('', 'end', values=(
-                            record.get('id'),
-                            record.get('date'),
-                            record.get('name'),
-                            "Yes" if record.get('paid') else "No"
-                        ))
-                else:
-                    messagebox.showerror("Error", data.get('message', "Failed to get holiday data"))
-            else:
-                messagebox.showerror("Error", f"Server returned status code: {response.status_code}")
-        except requests.exceptions.RequestException as e:
-            messagebox.showerror("Error", f"Failed to connect to server: {str(e)}")
+        holidays = sorted(self.replica['holidays'].values(), key=lambda record: record['date'] or '')
+        self._fill_tree(self.holiday_tree, holidays, self._holiday_values)
 
     def refresh_leave_data(self):
-        if not self.connected:
-            messagebox.showerror("Error", "Not connected to server")
-            return
-        
-        password = self.password_entry.get()
-        if not password:
-            messagebox.showerror("Error", "Please enter admin password")
+        if not self._sync_for_refresh():
             return
-        
-        try:
-            response = requests.post(
-                f"{self.server_url}/api/get_leave_requests",
-                json={"password": password},
-                timeout=5
-            )
-            if response.status_code == 200:
-                data = response.json()
-                if data.get('success'):
-                    # Clear existing data
-                    for item in self.leave_tree.get_children():
-                        self.leave_tree.delete(item)
-                    
-                    # Add new data
-                    for record in data.get('data', []):
-                        self.leave_tree.insert('', 'end', values=(
-                            record.get('id'),
-                            record.get('staff_code'),
-                            record.get('name'),
-                            record.get('start_date'),
-                            record.get('end_date'),
-                            record.get('reason'),
-                            record.get('status')
-                        ))
-                else:
-                    messagebox.showerror("Error", data.get('message', "Failed to get leave data"))
-            else:
-                messagebox.showerror("Error", f"Server returned status code: {response.status_code}")
-        except requests.exceptions.RequestException as e:
-            messagebox.showerror("Error", f"Failed to connect to server: {str(e)}")
+        leave = sorted(self.replica['leave_requests'].values(), key=lambda record: record['id'], reverse=True)
+        self._fill_tree(self.leave_tree, leave, self._leave_values)
 
     def approve_leave_request(self):
         selected_item = self.leave_tree.selection()
@@ -2250,7 +2536,7 @@ class AttendanceClient:
                 data = response.json()
                 if data.get('success'):
                     messagebox.showinfo("Success", data.get('message', "Leave request approved"))
-                    self.refresh_leave_data()
+                    self._refresh_unless_live(self.refresh_leave_data)
                 else:
                     messagebox.showerror("Error", data.get('message', "Failed to approve leave request"))
             else:
@@ -2286,7 +2572,7 @@ class AttendanceClient:
                 data = response.json()
                 if data.get('success'):
                     messagebox.showinfo("Success", data.get('message', "Leave request rejected"))
-                    self.refresh_leave_data()
+                    self._refresh_unless_live(self.refresh_leave_data)
                 else:
                     messagebox.showerror("Error", data.get('message', "Failed to reject leave request"))
             else:
@@ -2319,7 +2605,7 @@ class AttendanceClient:
                 data = response.json()
                 if data.get('success'):
                     messagebox.showinfo("Success", data.get('message', "Staff added successfully"))
-                    self.refresh_staff_data()
+                    self._refresh_unless_live(self.refresh_staff_data)
                 else:
                     messagebox.showerror("Error", data.get('message', "Failed to add staff"))
             else:
@@ -2361,7 +2647,7 @@ class AttendanceClient:
                 data = response.json()
                 if data.get('success'):
                     messagebox.showinfo("Success", data.get('message', "Staff updated successfully"))
-                    self.refresh_staff_data()
+                    self._refresh_unless_live(self.refresh_staff_data)
                 else:
                     messagebox.showerror("Error", data.get('message', "Failed to update staff"))
             else:
@@ -2400,7 +2686,7 @@ class AttendanceClient:
                 data = response.json()
                 if data.get('success'):
                     messagebox.showinfo("Success", data.get('message', "Staff deleted successfully"))
-                    self.refresh_staff_data()
+                    self._refresh_unless_live(self.refresh_staff_data)
                 else:
                     messagebox.showerror("Error", data.get('message', "Failed to delete staff"))
             else:
@@ -2408,6 +2694,84 @@ class AttendanceClient:
         except requests.exceptions.RequestException as e:
             messagebox.showerror("Error", f"Failed to connect to server: {str(e)}")
 
+    # Spreadsheet headers accepted by import_staff and crm_import_leads, after
+    # lower-casing and replacing spaces with underscores
+    STAFF_IMPORT_COLUMNS = {'staff_code': 'staff_code', 'code': 'staff_code', 'name': 'name',
+                            'hourly_rate': 'hourly_rate', 'rate': 'hourly_rate',
+                            'shift': 'shift_name', 'shift_name': 'shift_name'}
+    LEAD_IMPORT_COLUMNS = {'name': 'name', 'phone': 'phone', 'status': 'status', 'target': 'target',
+                           'assigned_to': 'assigned_to', 'assigned': 'assigned_to', 'notes': 'notes'}
+    CRM_LEAD_STATUSES = ["New", "Contacted", "Qualified", "Lost", "Won"]
+
+    def read_import_file(self, file_path, columns):
+        """Rows of a CSV or Excel sheet as dicts, keyed by the `columns` mapping"""
+        if file_path.lower().endswith(('.xlsx', '.xls')):
+            import pandas as pd
+            frame = pd.read_excel(file_path, dtype=str).fillna('')
+            records = frame.to_dict('records')
+        else:
+            import csv
+            with open(file_path, newline='', encoding='utf-8-sig') as f:
+                records = list(csv.DictReader(f))
+        rows = []
+        for record in records:
+            row = {}
+            for header, value in record.items():
+                key = columns.get(str(header or '').strip().lower().replace(' ', '_'))
+                if key:
+                    row[key] = str(value or '').strip()
+            rows.append(row)
+        return rows
+
+    def import_staff(self):
+        password = self.password_entry.get()
+        if not password:
+            messagebox.showerror("Error", "Please enter admin password")
+            return
+
+        file_path = filedialog.askopenfilename(
+            title="Import Staff",
+            filetypes=[("Staff sheets", "*.csv *.xlsx *.xls"), ("All files", "*.*")]
+        )
+        if not file_path:
+            return
+
+        try:
+            rows = self.read_import_file(file_path, self.STAFF_IMPORT_COLUMNS)
+        except Exception as e:
+            messagebox.showerror("Error", f"Could not read {os.path.basename(file_path)}:\n{e}")
+            return
+        if not rows:
+            messagebox.showinfo("Import Staff", "The file has no staff rows")
+            return
+
+        try:
+            response = requests.post(
+                f"{self.server_url}/api/bulk_upsert_staff",
+                json={"password": password, "staff": rows},
+                timeout=120
+            )
+            if response.status_code == 200:
+                data = response.json()
+                if data.get('success'):
+                    message = data.get('message', "Staff imported")
+                    errors = data.get('errors', [])
+                    if errors:
+                        # Row 1 of the sheet is the header
+                        lines = [f"Row {error['row'] + 2}: {error['message']}" for error in errors[:20]]
+                        if len(errors) > 20:
+                            lines.append(f"... and {len(errors) - 20} more")
+                        messagebox.showwarning("Import Staff", message + "\n\n" + "\n".join(lines))
+                    else:
+                        messagebox.showinfo("Import Staff", message)
+                    self._refresh_unless_live(self.refresh_staff_data)
+                else:
+                    messagebox.showerror("Error", data.get('message', "Failed to import staff"))
+            else:
+                messagebox.showerror("Error", f"Server returned status code: {response.status_code}")
+        except requests.exceptions.RequestException as e:
+            messagebox.showerror("Error", f"Failed to connect to server: {str(e)}")
+
     def add_shift(self):
         dialog = ShiftDialog(self.root)
         self.root.wait_window(dialog)
@@ -2646,11 +3010,11 @@ class AttendanceClient:
         try:
             response = requests.post(
                 f"{self.server_url}/api/get_audit_log",
-                json={"password": password},
+                json={"password": password, "format": "columnar"},
                 timeout=5
             )
             if response.status_code == 200:
-                data = response.json()
+                data = decode_columnar(response.json())
                 if data.get('success'):
                     # Clear existing data
                     for item in self.audit_tree.get_children():
@@ -2703,7 +3067,7 @@ class AttendanceClient:
                 data = response.json()
                 if data.get('success'):
                     messagebox.showinfo("Success", data.get('message', "Attendance record updated successfully"))
-                    self.refresh_attendance_data()
+                    self._refresh_unless_live(self.refresh_attendance_data)
                 else:
                     messagebox.showerror("Error", data.get('message', "Failed to update attendance record"))
             else:
@@ -2739,7 +3103,7 @@ class AttendanceClient:
                 data = response.json()
                 if data.get('success'):
                     messagebox.showinfo("Success", data.get('message', "Open session closed successfully"))
-                    self.refresh_attendance_data()
+                    self._refresh_unless_live(self.refresh_attendance_data)
                 else:
                     messagebox.showerror("Error", data.get('message', "Failed to close open session"))
             else:
@@ -2747,6 +3111,90 @@ class AttendanceClient:
         except requests.exceptions.RequestException as e:
             messagebox.showerror("Error", f"Failed to connect to server: {str(e)}")
 
+    REPORT_POLL_MS = 500
+
+    def run_report_job(self, params, filename_prefix=""):
+        """Generate a report on the server's job queue, showing progress
+        without blocking the window, then offer to save it"""
+        password = params.get('password')
+        try:
+            response = requests.post(f"{self.server_url}/api/report_jobs", json=params, timeout=5)
+            data = response.json()
+        except (requests.exceptions.RequestException, ValueError) as e:
+            messagebox.showerror("Error", f"Failed to connect to server: {str(e)}")
+            return
+        if not data.get('success'):
+            messagebox.showerror("Error", data.get('message', "Failed to generate Excel file"))
+            return
+        job_id = data['job']['id']
+
+        top = tk.Toplevel(self.root)
+        top.title("Generating Report")
+        top.geometry("350x120")
+        top.transient(self.root)
+        message_label = ttk.Label(top, text=data['job']['message'])
+        message_label.pack(pady=(15, 5))
+        progress_bar = ttk.Progressbar(top, length=300, mode='determinate', maximum=1.0)
+        progress_bar.pack(pady=5)
+        # Closing the window stops polling; the server discards the job later
+        cancelled = []
+        top.protocol("WM_DELETE_WINDOW", lambda: (cancelled.append(True), top.destroy()))
+
+        def finish(job):
+            top.destroy()
+            if job['status'] == 'failed':
+                messagebox.showerror("Error", f"Failed to generate Excel file: {job.get('error')}")
+                return
+            try:
+                response = requests.post(f"{self.server_url}/api/report_jobs/{job_id}/download",
+                                         json={"password": password}, timeout=30)
+                data = response.json()
+            except (requests.exceptions.RequestException, ValueError) as e:
+                messagebox.showerror("Error", f"Failed to download report: {str(e)}")
+                return
+            if not data.get('success'):
+                messagebox.showerror("Error", data.get('message', "Failed to download report"))
+                return
+
+            excel_data = base64.b64decode(data.get('excel_data'))
+            filename = data.get('filename', 'attendance_report.xlsx')
+            extension = os.path.splitext(filename)[1] or ".xlsx"
+            file_type = ("Zip archives", "*.zip") if extension == ".zip" else ("Excel files", "*.xlsx")
+            file_path = filedialog.asksaveasfilename(
+                defaultextension=extension,
+                filetypes=[file_type, ("All files", "*.*")],
+                initialfile=f"{filename_prefix}{filename}"
+            )
+            if file_path:
+                with open(file_path, 'wb') as f:
+                    f.write(excel_data)
+                messagebox.showinfo("Success", f"Report saved to {file_path}")
+
+        def poll():
+            if cancelled:
+                return
+            try:
+                response = requests.post(f"{self.server_url}/api/report_jobs/{job_id}",
+                                         json={"password": password}, timeout=5)
+                data = response.json()
+            except (requests.exceptions.RequestException, ValueError) as e:
+                top.destroy()
+                messagebox.showerror("Error", f"Lost contact with server: {str(e)}")
+                return
+            if not data.get('success'):
+                top.destroy()
+                messagebox.showerror("Error", data.get('message', "Report job not found"))
+                return
+            job = data['job']
+            if job['status'] in ('done', 'failed'):
+                finish(job)
+                return
+            message_label.config(text=job['message'])
+            progress_bar['value'] = job['progress']
+            self.root.after(self.REPORT_POLL_MS, poll)
+
+        self.root.after(self.REPORT_POLL_MS, poll)
+
     def export_to_excel(self, selected_only=False):
         password = self.password_entry.get()
         if not password:
@@ -2763,41 +3211,12 @@ class AttendanceClient:
             for item in selected_items:
                 selected_ids.append(self.attendance_tree.item(item)['values'][0])
         
-        try:
-            response = requests.post(
-                f"{self.server_url}/api/generate_excel",
-                json={
-                    "password": password,
-                    "start_date": self.start_date_var.get(),
-                    "end_date": self.end_date_var.get(),
-                    "selected_ids": selected_ids
-                },
-                timeout=30  # Increased timeout for large data
-            )
-            if response.status_code == 200:
-                data = response.json()
-                if data.get('success'):
-                    # Decode base64 data
-                    excel_data = base64.b64decode(data.get('excel_data'))
-                    filename = data.get('filename', 'attendance_report.xlsx')
-                    
-                    # Save to file
-                    file_path = filedialog.asksaveasfilename(
-                        defaultextension=".xlsx",
-                        filetypes=[("Excel files", "*.xlsx"), ("All files", "*.*")],
-                        initialfile=filename
-                    )
-                    
-                    if file_path:
-                        with open(file_path, 'wb') as f:
-                            f.write(excel_data)
-                        messagebox.showinfo("Success", f"Excel file saved to {file_path}")
-                else:
-                    messagebox.showerror("Error", data.get('message', "Failed to generate Excel file"))
-            else:
-                messagebox.showerror("Error", f"Server returned status code: {response.status_code}")
-        except requests.exceptions.RequestException as e:
-            messagebox.showerror("Error", f"Failed to connect to server: {str(e)}")
+        self.run_report_job({
+            "password": password,
+            "start_date": self.start_date_var.get(),
+            "end_date": self.end_date_var.get(),
+            "selected_ids": selected_ids
+        })
 
     def on_staff_selected(self, event):
         selection = self.staff_list_var.get()
@@ -2852,12 +3271,13 @@ class AttendanceClient:
                 json={
                     "password": password,
                     "start_date": self.report_start_date_var.get(),
-                    "end_date": self.report_end_date_var.get()
+                    "end_date": self.report_end_date_var.get(),
+                    "format": "columnar"
                 },
                 timeout=5
             )
             if response.status_code == 200:
-                data = response.json()
+                data = decode_columnar(response.json())
                 if data.get('success'):
                     # Clear existing data
                     for item in self.detail_report_tree.get_children():
@@ -2885,9 +3305,17 @@ class AttendanceClient:
                             f"${earnings:.2f}"
                         ))
                     
-                    # Update summary
-                    summary_text = f"Total Hours: {total_hours:.2f}\n"
-                    summary_text += f"Total Earnings: ${total_earnings:.2f}"
+                    # Update summary; the server's payroll totals include overtime,
+                    # holiday rates, paid holidays and leave
+                    payroll = data.get('summary', {}).get(staff_code)
+                    if payroll:
+                        summary_text = (f"Regular: {payroll['regular_hours']:.2f}h  Overtime: {payroll['overtime_hours']:.2f}h  "
+                                        f"Holiday: {payroll['holiday_hours']:.2f}h  "
+                                        f"Paid days off: {payroll['paid_holiday_hours'] + payroll['leave_hours']:.2f}h\n")
+                        summary_text += f"Total Pay: ${payroll['total_earnings']:.2f}"
+                    else:
+                        summary_text = f"Total Hours: {total_hours:.2f}\n"
+                        summary_text += f"Total Earnings: ${total_earnings:.2f}"
                     self.detail_summary_label.config(text=summary_text)
                 else:
                     messagebox.showerror("Error", data.get('message', "Failed to get attendance data"))
@@ -2907,41 +3335,12 @@ class AttendanceClient:
             messagebox.showerror("Error", "Please enter admin password")
             return
         
-        try:
-            response = requests.post(
-                f"{self.server_url}/api/generate_excel",
-                json={
-                    "password": password,
-                    "start_date": self.report_start_date_var.get(),
-                    "end_date": self.report_end_date_var.get(),
-                    "staff_code": staff_code  # This would need to be implemented in the server
-                },
-                timeout=30
-            )
-            if response.status_code == 200:
-                data = response.json()
-                if data.get('success'):
-                    # Decode base64 data
-                    excel_data = base64.b64decode(data.get('excel_data'))
-                    filename = data.get('filename', 'attendance_report.xlsx')
-                    
-                    # Save to file
-                    file_path = filedialog.asksaveasfilename(
-                        defaultextension=".xlsx",
-                        filetypes=[("Excel files", "*.xlsx"), ("All files", "*.*")],
-                        initialfile=f"{staff_code}_{filename}"
-                    )
-                    
-                    if file_path:
-                        with open(file_path, 'wb') as f:
-                            f.write(excel_data)
-                        messagebox.showinfo("Success", f"Excel file saved to {file_path}")
-                else:
-                    messagebox.showerror("Error", data.get('message', "Failed to generate Excel file"))
-            else:
-                messagebox.showerror("Error", f"Server returned status code: {response.status_code}")
-        except requests.exceptions.RequestException as e:
-            messagebox.showerror("Error", f"Failed to connect to server: {str(e)}")
+        self.run_report_job({
+            "password": password,
+            "start_date": self.report_start_date_var.get(),
+            "end_date": self.report_end_date_var.get(),
+            "staff_code": staff_code
+        }, filename_prefix=f"{staff_code}_")
 
     def export_all_staff_report(self):
         password = self.password_entry.get()
@@ -2949,40 +3348,25 @@ class AttendanceClient:
             messagebox.showerror("Error", "Please enter admin password")
             return
         
-        try:
-            response = requests.post(
-                f"{self.server_url}/api/generate_excel",
-                json={
-                    "password": password,
-                    "start_date": self.report_start_date_var.get(),
-                    "end_date": self.report_end_date_var.get()
-                },
-                timeout=30
-            )
-            if response.status_code == 200:
-                data = response.json()
-                if data.get('success'):
-                    # Decode base64 data
-                    excel_data = base64.b64decode(data.get('excel_data'))
-                    filename = data.get('filename', 'attendance_report.xlsx')
-                    
-                    # Save to file
-                    file_path = filedialog.asksaveasfilename(
-                        defaultextension=".xlsx",
-                        filetypes=[("Excel files", "*.xlsx"), ("All files", "*.*")],
-                        initialfile=f"all_staff_{filename}"
-                    )
-                    
-                    if file_path:
-                        with open(file_path, 'wb') as f:
-                            f.write(excel_data)
-                        messagebox.showinfo("Success", f"Excel file saved to {file_path}")
-                else:
-                    messagebox.showerror("Error", data.get('message', "Failed to generate Excel file"))
-            else:
-                messagebox.showerror("Error", f"Server returned status code: {response.status_code}")
-        except requests.exceptions.RequestException as e:
-            messagebox.showerror("Error", f"Failed to connect to server: {str(e)}")
+        self.run_report_job({
+            "password": password,
+            "start_date": self.report_start_date_var.get(),
+            "end_date": self.report_end_date_var.get()
+        }, filename_prefix="all_staff_")
+
+    def export_staff_workbooks(self):
+        """One workbook per employee, built in parallel on the server and saved as a zip"""
+        password = self.password_entry.get()
+        if not password:
+            messagebox.showerror("Error", "Please enter admin password")
+            return
+
+        self.run_report_job({
+            "password": password,
+            "kind": "staff_workbooks",
+            "start_date": self.report_start_date_var.get(),
+            "end_date": self.report_end_date_var.get()
+        })
 
     def generate_notes_report(self):
         """Generate notes report with better error handling"""
@@ -3012,12 +3396,13 @@ class AttendanceClient:
                 json={
                     "password": password,
                     "start_date": self.notes_start_date_var.get(),
-                    "end_date": self.notes_end_date_var.get()
+                    "end_date": self.notes_end_date_var.get(),
+                    "format": "columnar"
                 },
                 timeout=5
             )
             if response.status_code == 200:
-                data = response.json()
+                data = decode_columnar(response.json())
                 if data.get('success'):
                     # Clear existing data
                     for item in self.notes_tree.get_children():
@@ -3086,12 +3471,13 @@ class AttendanceClient:
                 json={
                     "password": password,
                     "start_date": self.notes_start_date_var.get(),
-                    "end_date": self.notes_end_date_var.get()
+                    "end_date": self.notes_end_date_var.get(),
+                    "format": "columnar"
                 },
                 timeout=5
             )
             if response.status_code == 200:
-                data = response.json()
+                data = decode_columnar(response.json())
                 if data.get('success'):
                     # Filter data for selected staff
                     filtered_data = [record for record in data.get('data', []) if record.get('staff_code') == staff_code]
@@ -3123,6 +3509,7 @@ class AttendanceClient:
                         return
                     
                     # Create DataFrame
+                    import pandas as pd
                     df = pd.DataFrame(notes_data)
                     
                     # Create Excel file in memory
@@ -3249,7 +3636,7 @@ class StaffDialog(tk.Toplevel):
             while not hasattr(parent, 'server_url'):
                 parent = parent.master
             
-            response = requests.post(
+            response = post_cached(
                 f"{parent.server_url}/api/get_shifts",
                 json={"password": parent.password_entry.get()},
                 timeout=5
@@ -3269,7 +3656,7 @@ class StaffDialog(tk.Toplevel):
             while not hasattr(parent, 'server_url'):
                 parent = parent.master
             
-            response = requests.post(
+            response = post_cached(
                 f"{parent.server_url}/api/get_staff",
                 json={"password": parent.password_entry.get()},
                 timeout=5
@@ -3376,14 +3763,14 @@ class CrmLeadDialog(tk.Toplevel):
 
     def _get_targets(self):
         try:
-            r = requests.post(f"{self.server_url}/api/crm_get_targets",
+            r = post_cached(f"{self.server_url}/api/crm_get_targets",
                               json={"password": self.admin_pw}, timeout=5)
             return r.json().get('targets', [])
         except: return []
 
     def _get_staff(self):
         try:
-            r = requests.post(f"{self.server_url}/api/get_staff",
+            r = post_cached(f"{self.server_url}/api/get_staff",
                               json={"password": self.admin_pw}, timeout=5)
             data = r.json().get('data', [])
             return [f"{s['staff_code']} - {s['name']}" for s in data]
@@ -1,18 +1,25 @@
 import tkinter as tk
 from tkinter import ttk, messagebox
-import xmlrpc.client
 import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
 import requests
+from odoo_client import OdooClient
 
 class OdooConnector:
     """Handles the connection and API calls to the Odoo server."""
+    # Only these lead fields are read; search_read without a field list sends every column
+    LEAD_FIELDS = ['id', 'name', 'partner_name', 'email_from', 'phone', 'stage_id']
+    LEADS_PAGE_SIZE = 200
+
     def __init__(self):
         self.url = None
         self.db = None
         self.username = None
         self.password = None
         self.uid = None
-        self.models = None
+        self.client = None
+        self._connect_lock = threading.Lock()
 
     def set_credentials(self, url, db, username, password):
         self.url = url
@@ -23,36 +30,216 @@ class OdooConnector:
     def connect(self):
         if not all([self.url, self.db, self.username, self.password]):
             raise ValueError("All credentials must be set.")
-        
-        common = xmlrpc.client.ServerProxy(f'{self.url}/xmlrpc/2/common')
-        self.uid = common.authenticate(self.db, self.username, self.password, {})
-        if not self.uid:
-            raise Exception("Authentication failed.")
-        self.models = xmlrpc.client.ServerProxy(f'{self.url}/xmlrpc/2/object')
+        if self.client:
+            self.client.close()
+        # One client keeps its authenticated connection open for every call after login
+        self.client = OdooClient(self.url, self.db, self.username, self.password)
+        self.uid = self.client.authenticate()
         return True
 
+    def ensure_connected(self):
+        """Connect unless already connected; frames sharing this connector sign in once"""
+        with self._connect_lock:
+            if self.client is None:
+                try:
+                    self.connect()
+                except Exception:
+                    self.client = None
+                    raise
+        return self
+
     def get_stages(self):
-        return self.models.execute_kw(self.db, self.uid, self.password,
-            'crm.stage', 'search_read', [[]], {'fields': ['id', 'name', 'sequence']})
+        return self.client.search_read('crm.stage', [], ['id', 'name', 'sequence'], limit=None, order='sequence, id')
+
+    def get_leads(self, domain=None, offset=0, limit=LEADS_PAGE_SIZE, order='id desc'):
+        """One page of leads matching the Odoo `domain`"""
+        return self.client.search_read('crm.lead', domain, self.LEAD_FIELDS, offset, limit, order)
+
+    def count_leads(self, domain=None):
+        return self.client.search_count('crm.lead', domain)
 
-    def get_leads(self):
-        return self.models.execute_kw(self.db, self.uid, self.password,
-            'crm.lead', 'search_read', [[]],
-            {'fields': ['id', 'name', 'partner_name', 'email_from', 'phone', 'stage_id']})
+    def get_stage_counts(self, domain=None):
+        """{stage_id: number of leads}, counted by Odoo with read_group; False is leads without a stage"""
+        groups = self.client.read_group('crm.lead', domain, ['stage_id'], ['stage_id'])
+        return {(g['stage_id'][0] if g['stage_id'] else False): g['stage_id_count'] for g in groups}
 
     def create_lead(self, lead_data):
-        return self.models.execute_kw(self.db, self.uid, self.password, 'crm.lead', 'create', [lead_data])
+        return self.create_leads([lead_data])[0]
+
+    def create_leads(self, leads):
+        """Create many leads in a few calls; returns their ids in order"""
+        return self.client.create_many('crm.lead', leads)
+
+# Process-wide, so a CrmFrame created again (the client's CRM Refresh) reuses
+# the signed-in connector: no saved-login fetch, no authenticate, no save
+_connectors = {}        # (url, db, username, password) -> OdooConnector
+_signed_in = {}         # server_url -> that connector, for the last login made through it
+_executors = {}         # server_url -> thread pool shared by every CrmFrame for that server
+_registry_lock = threading.Lock()
+
+# Threads per pool; each keeps its own connections to Odoo, so frames
+# created again reuse them instead of opening more
+CRM_WORKERS = 4
+
+def get_executor(server_url):
+    """Thread pool the CrmFrames for `server_url` run their calls on, created on first use"""
+    with _registry_lock:
+        executor = _executors.get(server_url)
+        if executor is None:
+            executor = _executors[server_url] = ThreadPoolExecutor(max_workers=CRM_WORKERS,
+                                                                   thread_name_prefix="crm")
+        return executor
+
+def get_connector(url, db, username, password):
+    """Connected OdooConnector for a login, shared by every CrmFrame in the process"""
+    key = (url, db, username, password)
+    with _registry_lock:
+        connector = _connectors.get(key)
+        if connector is None:
+            connector = _connectors[key] = OdooConnector()
+            connector.set_credentials(url, db, username, password)
+    try:
+        return connector.ensure_connected()
+    except Exception:
+        with _registry_lock:
+            if _connectors.get(key) is connector:
+                del _connectors[key]
+        raise
+
+def forget_login(server_url):
+    """Drop the remembered login for `server_url`; the next CrmFrame shows the login form.
+
+    Its Odoo connections are closed and the frames' thread pool is shut down
+    with it; the next call starts a new pool.
+    """
+    with _registry_lock:
+        connector = _signed_in.pop(server_url, None)
+        if connector is not None:
+            _connectors.pop((connector.url, connector.db, connector.username, connector.password), None)
+        executor = _executors.pop(server_url, None)
+    if executor is not None:
+        executor.shutdown(wait=False, cancel_futures=True)
+    if connector is not None and connector.client is not None:
+        connector.client.close()
 
 class CrmFrame(ttk.Frame):
-    """Embeddable CRM frame inside Attendance Client."""
-    def __init__(self, parent, server_url=None):
+    """Embeddable CRM frame inside Attendance Client.
+
+    Odoo and server calls run on a small thread pool, shared by the frames
+    for the same server (see get_executor), so the window never waits on the
+    network; their results are applied on the Tk thread with after().
+    Widgets are only touched on the Tk thread.
+    """
+
+    def __init__(self, parent, server_url=None, admin_password=None):
         super().__init__(parent)
         self.connector = OdooConnector()
         self.server_url = server_url
-        self.create_login_ui()
+        # Callable giving the server's admin password, needed to save the login there
+        self.admin_password = admin_password
+        # Set by load_leads: read from the server's Odoo mirror instead of Odoo
+        self.use_mirror = False
+        self.leads_at_end = True
+        # key -> (token, message, future) of the calls still running
+        self.pending = {}
+        self.bind("<Destroy>", self.on_destroy)
+
+        # Loading state: what is running, with a Cancel button
+        self.loading_bar = ttk.Frame(self)
+        self.loading_label = ttk.Label(self.loading_bar, text="")
+        self.loading_label.pack(side="left", padx=10)
+        self.loading_progress = ttk.Progressbar(self.loading_bar, mode="indeterminate", length=120)
+        self.loading_progress.pack(side="left", padx=5)
+        ttk.Button(self.loading_bar, text="Cancel", command=self.cancel_loading).pack(side="right", padx=10)
+
+        with _registry_lock:
+            signed_in = _signed_in.get(server_url)
+        if signed_in is not None:
+            self.connector = signed_in
+            self.create_main_ui()
+        else:
+            self.create_login_ui()
+
+    def run_async(self, key, work, on_done, message, on_error=None):
+        """Run `work()` on the pool and pass its result to `on_done` on the Tk thread.
+
+        Starting `key` again supersedes the earlier call, whose result is then
+        dropped, as are the results of cancelled calls. Errors go to
+        `on_error`, or a message box.
+        """
+        token = object()
+        previous = self.pending.get(key)
+        if previous:
+            previous[2].cancel()
+        future = get_executor(self.server_url).submit(work)
+        self.pending[key] = (token, message, future)
+        self.show_loading()
+
+        def finished(future):
+            try:
+                self.after(0, self.apply_result, key, token, future, on_done, on_error)
+            except (RuntimeError, tk.TclError):
+                pass  # frame or main loop already gone
+
+        future.add_done_callback(finished)
+
+    def apply_result(self, key, token, future, on_done, on_error):
+        if key not in self.pending or self.pending[key][0] is not token:
+            return
+        del self.pending[key]
+        self.show_loading()
+        if future.cancelled():
+            return
+        error = future.exception()
+        if error is not None:
+            if on_error:
+                on_error(error)
+            elif isinstance(error, PermissionError):
+                # Odoo refused the remembered login even after signing in again
+                forget_login(self.server_url)
+                messagebox.showerror("Error", f"{error} Please log in again.")
+                self.create_login_ui()
+            else:
+                messagebox.showerror("Error", str(error))
+            return
+        on_done(future.result())
+
+    def show_loading(self):
+        if self.pending:
+            self.loading_label.config(text=" ".join(message for _, message, _ in self.pending.values()))
+            if not self.loading_bar.winfo_ismapped():
+                content = [w for w in self.pack_slaves() if w is not self.loading_bar]
+                self.loading_bar.pack(side="bottom", fill="x", pady=5, **({"before": content[0]} if content else {}))
+                self.loading_progress.start(15)
+        else:
+            self.loading_progress.stop()
+            self.loading_bar.pack_forget()
+
+    def cancel_loading(self):
+        """Stop waiting: queued calls never start, running ones finish unseen"""
+        if 'login' in self.pending:
+            self.login_button.config(state="normal")
+        if 'leads' in self.pending and not self.leads_at_end:
+            self.more_button.config(state="normal")
+        for _, _, future in self.pending.values():
+            future.cancel()
+        self.pending.clear()
+        self.show_loading()
+
+    def on_destroy(self, event):
+        # The pool outlives the frame; only this frame's queued calls are dropped
+        if event.widget is self:
+            for _, _, future in self.pending.values():
+                future.cancel()
+            self.pending.clear()
+
+    def clear_content(self):
+        for w in self.winfo_children():
+            if w is not self.loading_bar:
+                w.destroy()
 
     def create_login_ui(self):
-        for w in self.winfo_children(): w.destroy()
+        self.clear_content()
         frame = ttk.Frame(self, padding="20")
         frame.pack(expand=True, fill="both")
 
@@ -61,43 +248,71 @@ class CrmFrame(ttk.Frame):
         ttk.Label(frame, text="Database:").grid(row=2, column=0, sticky="w"); self.db = ttk.Entry(frame, width=40); self.db.grid(row=2, column=1)
         ttk.Label(frame, text="Username:").grid(row=3, column=0, sticky="w"); self.user = ttk.Entry(frame, width=40); self.user.grid(row=3, column=1)
         ttk.Label(frame, text="Password:").grid(row=4, column=0, sticky="w"); self.passw = ttk.Entry(frame, width=40, show="*"); self.passw.grid(row=4, column=1)
-        ttk.Button(frame, text="Login", command=self.login).grid(row=5, column=0, columnspan=2, pady=15)
+        self.login_button = ttk.Button(frame, text="Login", command=self.login)
+        self.login_button.grid(row=5, column=0, columnspan=2, pady=15)
 
-        # Try auto-load saved credentials from server
-        if self.server_url:
-            try:
-                r = requests.get(f"{self.server_url}/api/get_crm_credentials", timeout=5)
-                data = r.json()
-                if data.get("success"):
-                    creds = data.get("credentials")
-                    self.url.insert(0, creds["url"])
-                    self.db.insert(0, creds["db"])
-                    self.user.insert(0, creds["username"])
-                    self.passw.insert(0, creds["password"])
-                    self.login()  # auto login
-            except:
-                pass
+        # Try auto-load saved credentials from server; quietly, the form stays usable.
+        # Only an admin may read them, so without the admin password there is nothing to load
+        admin_pw = self.admin_password() if self.admin_password else None
+        if self.server_url and admin_pw:
+            self.run_async('credentials', lambda: self.fetch_saved_credentials(admin_pw),
+                           self.fill_saved_credentials, "Loading saved login...", on_error=lambda e: None)
+
+    def fetch_saved_credentials(self, admin_pw):
+        r = requests.post(f"{self.server_url}/api/get_crm_credentials", timeout=5,
+                          json={"admin_password": admin_pw})
+        data = r.json()
+        return data.get("credentials") if data.get("success") else None
+
+    def fill_saved_credentials(self, creds):
+        # Typed in meanwhile: keep what the user entered
+        if not creds or self.url.get() or 'login' in self.pending:
+            return
+        self.url.insert(0, creds["url"])
+        self.db.insert(0, creds["db"])
+        self.user.insert(0, creds["username"])
+        self.passw.insert(0, creds["password"])
+        self.login()  # auto login
 
     def login(self):
         url, db, user, pw = self.url.get(), self.db.get(), self.user.get(), self.passw.get()
-        try:
-            self.connector.set_credentials(url, db, user, pw)
-            self.connector.connect()
-            messagebox.showinfo("Connected", "Connected to Odoo CRM.")
-            if self.server_url:
-                requests.post(f"{self.server_url}/api/save_crm_credentials",
-                              json={"url": url, "db": db, "username": user, "password": pw})
-            self.create_main_ui()
-        except Exception as e:
-            messagebox.showerror("Error", str(e))
+        if not all([url, db, user, pw]):
+            messagebox.showerror("Error", "All credentials must be set.")
+            return
+
+        # Only an admin can change the login the server saves and mirrors with
+        admin_pw = self.admin_password() if self.admin_password else None
+
+        def work():
+            connector = get_connector(url, db, user, pw)
+            if self.server_url and admin_pw:
+                requests.post(f"{self.server_url}/api/save_crm_credentials", timeout=10,
+                              json={"url": url, "db": db, "username": user, "password": pw,
+                                    "admin_password": admin_pw})
+            return connector
+
+        self.login_button.config(state="disabled")
+        self.run_async('login', work, self.on_login, "Connecting to Odoo...", on_error=self.on_login_error)
+
+    def on_login(self, connector):
+        self.connector = connector
+        with _registry_lock:
+            _signed_in[self.server_url] = connector
+        messagebox.showinfo("Connected", "Connected to Odoo CRM.")
+        self.create_main_ui()
+
+    def on_login_error(self, error):
+        self.login_button.config(state="normal")
+        messagebox.showerror("Error", str(error))
 
     def create_main_ui(self):
-        for w in self.winfo_children(): w.destroy()
+        self.clear_content()
         notebook = ttk.Notebook(self); notebook.pack(fill="both", expand=True)
 
         leads_tab = ttk.Frame(notebook); stages_tab = ttk.Frame(notebook)
         notebook.add(leads_tab, text="Leads / Orders"); notebook.add(stages_tab, text="Pipelines")
 
+        # Each tab starts its own fetch; leads and stages load in parallel
         self.create_leads_tab(leads_tab)
         self.create_stages_tab(stages_tab)
 
@@ -109,44 +324,137 @@ class CrmFrame(ttk.Frame):
         self.phone = ttk.Entry(top, width=50); ttk.Label(top, text="رقم الموبايل:").grid(row=2, column=0); self.phone.grid(row=2, column=1)
         ttk.Button(top, text="Create Lead", command=self.create_lead).grid(row=3, column=1, sticky="e", pady=5)
 
+        search = ttk.Frame(frame); search.pack(fill="x", padx=10)
+        ttk.Label(search, text="Search:").pack(side="left")
+        self.search_var = tk.StringVar()
+        search_entry = ttk.Entry(search, textvariable=self.search_var, width=40); search_entry.pack(side="left", padx=5)
+        search_entry.bind("<Return>", lambda e: self.load_leads())
+        ttk.Button(search, text="Search", command=self.load_leads).pack(side="left")
+
         self.tree = ttk.Treeview(frame, columns=("id", "name", "email", "phone", "stage"), show="headings")
         for c in ("id", "name", "email", "phone", "stage"): self.tree.heading(c, text=c.title())
         self.tree.pack(fill="both", expand=True, padx=10, pady=10)
-        ttk.Button(frame, text="Refresh", command=self.load_leads).pack(pady=5)
+        bottom = ttk.Frame(frame); bottom.pack(fill="x", padx=10, pady=5)
+        self.leads_status = ttk.Label(bottom, text=""); self.leads_status.pack(side="left")
+        ttk.Button(bottom, text="Refresh", command=self.load_leads).pack(side="right")
+        self.more_button = ttk.Button(bottom, text="Load More", command=self.load_more_leads, state="disabled")
+        self.more_button.pack(side="right", padx=5)
         self.load_leads()
 
     def create_stages_tab(self, frame):
-        self.stage_tree = ttk.Treeview(frame, columns=("id", "name", "sequence"), show="headings")
-        for c in ("id", "name", "sequence"): self.stage_tree.heading(c, text=c.title())
+        self.stage_tree = ttk.Treeview(frame, columns=("id", "name", "sequence", "leads"), show="headings")
+        for c in ("id", "name", "sequence", "leads"): self.stage_tree.heading(c, text=c.title())
         self.stage_tree.pack(fill="both", expand=True, padx=10, pady=10)
         ttk.Button(frame, text="Refresh", command=self.load_stages).pack(pady=5)
         self.load_stages()
 
-    def create_lead(self):
+    def mirror_request(self, endpoint, **payload):
+        """POST to the server's Odoo mirror as the signed-in Odoo user; None if the server cannot be reached"""
+        if not self.server_url:
+            return None
         try:
-            lead_id = self.connector.create_lead({
-                'name': self.name.get(),
-                'email_from': self.email.get(),
-                'phone': self.phone.get()
-            })
-            messagebox.showinfo("Success", f"Lead created (ID: {lead_id})")
-            self.load_leads()
-        except Exception as e:
-            messagebox.showerror("Error", str(e))
+            return requests.post(f"{self.server_url}/api/odoo/{endpoint}", timeout=10,
+                                 json={"username": self.connector.username, "password": self.connector.password,
+                                       **payload}).json()
+        except (requests.RequestException, ValueError):
+            return None
+
+    def mirror_data(self, endpoint, **payload):
+        data = self.mirror_request(endpoint, **payload)
+        if not data or not data.get("success"):
+            raise ConnectionError((data or {}).get("message") or "Could not reach the server")
+        return data
+
+    def create_lead(self):
+        values = {'name': self.name.get(), 'email_from': self.email.get(), 'phone': self.phone.get()}
+        if self.use_mirror:
+            # Written to Odoo by the server, and into the mirror in the same request
+            work = lambda: self.mirror_data('create_leads', leads=[values])['ids'][0]
+        else:
+            work = lambda: self.connector.create_lead(values)
+        self.run_async('create', work, self.on_lead_created, "Creating lead...")
+
+    def on_lead_created(self, lead_id):
+        messagebox.showinfo("Success", f"Lead created (ID: {lead_id})")
+        self.load_leads()
+
+    def lead_domain(self):
+        """Odoo domain for the search box: name, customer or phone contains the text"""
+        text = self.search_var.get().strip()
+        if not text:
+            return []
+        return ['|', '|', ('name', 'ilike', text), ('partner_name', 'ilike', text), ('phone', 'ilike', text)]
 
     def load_leads(self):
+        """Reload the first page of leads; later pages come from Load More.
+
+        Leads come from the server's mirror once it has synced, which answers
+        without a round trip to Odoo; until then, or without a server, from
+        Odoo directly.
+        """
         for i in self.tree.get_children(): self.tree.delete(i)
-        try:
-            for lead in self.connector.get_leads():
-                stage = lead['stage_id'][1] if lead['stage_id'] else "N/A"
-                self.tree.insert("", "end", values=(lead['id'], lead['name'], lead['email_from'], lead['phone'], stage))
-        except Exception as e:
-            messagebox.showerror("Error", str(e))
+        self.leads_search = self.search_var.get().strip()
+        self.leads_domain = self.lead_domain()
+        self.leads_offset = 0
+        self.leads_last_id = None
+        self.leads_at_end = True
+        self.more_button.config(state="disabled")
+        self.leads_status.config(text="")
+        search, domain = self.leads_search, self.leads_domain
+        self.run_async('leads', lambda: self.fetch_first_leads(search, domain), self.show_first_leads, "Loading leads...")
+
+    def fetch_first_leads(self, search, domain):
+        """(from mirror, total, first page); runs on the pool"""
+        data = self.mirror_request('leads', search=search, limit=self.connector.LEADS_PAGE_SIZE)
+        if data and data.get("success") and data.get("synced_at"):
+            return True, data['total'], data['leads']
+        return False, self.connector.count_leads(domain), self.connector.get_leads(domain)
+
+    def show_first_leads(self, result):
+        self.use_mirror, self.leads_total, leads = result
+        self.show_leads(leads)
+
+    def load_more_leads(self):
+        search, domain, offset, last_id = self.leads_search, self.leads_domain, self.leads_offset, self.leads_last_id
+        if self.use_mirror:
+            work = lambda: self.mirror_data('leads', search=search, before_id=last_id,
+                                            limit=self.connector.LEADS_PAGE_SIZE)['leads']
+        else:
+            work = lambda: self.connector.get_leads(domain, offset)
+        self.more_button.config(state="disabled")
+        self.run_async('leads', work, self.show_leads, "Loading more leads...")
+
+    def show_leads(self, leads):
+        """Append a page of leads (search_read records) to the tree"""
+        for lead in leads:
+            stage = lead['stage_id'][1] if lead['stage_id'] else "N/A"
+            self.tree.insert("", "end", values=(lead['id'], lead['name'], lead['email_from'], lead['phone'], stage))
+        self.leads_offset += len(leads)
+        if leads:
+            self.leads_last_id = leads[-1]['id']
+        # Leads created or deleted meanwhile shift the offsets; a short page means the end
+        self.leads_at_end = len(leads) < self.connector.LEADS_PAGE_SIZE or self.leads_offset >= self.leads_total
+        self.more_button.config(state="disabled" if self.leads_at_end else "normal")
+        self.leads_status.config(text=f"Showing {self.leads_offset} of {max(self.leads_total, self.leads_offset)} leads")
 
     def load_stages(self):
+        self.run_async('stages', self.fetch_stages, self.show_stages, "Loading pipelines...")
+
+    def fetch_stages(self):
+        """(stages with their lead counts, leads without a stage); runs on the pool"""
+        data = self.mirror_request('stages')
+        if data and data.get("success") and data.get("synced_at"):
+            return data['stages'], data['no_stage']
+        stages = self.connector.get_stages()
+        counts = self.connector.get_stage_counts()
+        for stage in stages:
+            stage['leads'] = counts.get(stage['id'], 0)
+        return stages, counts.get(False, 0)
+
+    def show_stages(self, result):
+        stages, no_stage = result
         for i in self.stage_tree.get_children(): self.stage_tree.delete(i)
-        try:
-            for stage in self.connector.get_stages():
-                self.stage_tree.insert("", "end", values=(stage['id'], stage['name'], stage['sequence']))
-        except Exception as e:
-            messagebox.showerror("Error", str(e))
+        for stage in stages:
+            self.stage_tree.insert("", "end", values=(stage['id'], stage['name'], stage['sequence'], stage['leads']))
+        if no_stage:
+            self.stage_tree.insert("", "end", values=("", "No Stage", "", no_stage))
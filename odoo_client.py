@@ -0,0 +1,170 @@
+"""Odoo XML-RPC client.
+
+One authenticated client per Odoo login, reusing a single keep-alive HTTP
+connection per endpoint instead of reconnecting for every call. Reads are
+paged (search_read with limit/offset and a field list), counts per stage
+come from read_group, and creates are sent in batches of many records per
+call.
+"""
+import http.client
+import threading
+import xmlrpc.client
+
+# Records per search_read page
+PAGE_SIZE = 500
+# Records per create call
+CREATE_BATCH_SIZE = 200
+# Seconds before a call to Odoo gives up
+TIMEOUT = 30
+# Fault codes Odoo answers with when the uid/password pair is refused
+ACCESS_DENIED_FAULTS = (3, 'AccessDenied')
+
+
+class _TimeoutMixin:
+    """Adds a socket timeout to the connection the transport keeps open.
+
+    xmlrpc.client transports already speak HTTP/1.1 and reuse their
+    connection between requests; this only sets how long a call may take.
+    """
+    timeout = TIMEOUT
+
+    def make_connection(self, host):
+        connection = super().make_connection(host)
+        connection.timeout = self.timeout
+        return connection
+
+
+class KeepAliveTransport(_TimeoutMixin, xmlrpc.client.Transport):
+    pass
+
+
+class KeepAliveSafeTransport(_TimeoutMixin, xmlrpc.client.SafeTransport):
+    pass
+
+
+class OdooClient:
+    """Authenticated access to one Odoo database.
+
+    A transport's connection carries one request at a time, so each thread
+    calling the client gets its own pair of kept-alive connections; calls
+    from different threads run in parallel. The connections of threads that
+    have exited are closed when another thread opens its own.
+    """
+
+    def __init__(self, url, db, username, password, timeout=TIMEOUT):
+        self.url = url.rstrip('/')
+        self.db = db
+        self.username = username
+        self.password = password
+        self.timeout = timeout
+        self.uid = None
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        # (thread, {'common': proxy, 'object': proxy}) for every thread with connections
+        self._proxies = []
+
+    def _proxy(self, endpoint):
+        transport_class = KeepAliveSafeTransport if self.url.startswith('https') else KeepAliveTransport
+        transport = transport_class()
+        transport.timeout = self.timeout
+        return xmlrpc.client.ServerProxy(f'{self.url}/xmlrpc/2/{endpoint}', transport=transport, allow_none=True)
+
+    def _call(self, endpoint, method, *args):
+        local = self._local
+        proxies = getattr(local, 'proxies', None)
+        if proxies is None:
+            proxies = local.proxies = {'common': self._proxy('common'), 'object': self._proxy('object')}
+            with self._lock:
+                exited = [pair for thread, pair in self._proxies if not thread.is_alive()]
+                self._proxies = [(thread, pair) for thread, pair in self._proxies if thread.is_alive()]
+                self._proxies.append((threading.current_thread(), proxies))
+            for pair in exited:
+                self._close_pair(pair)
+        proxy = proxies[endpoint]
+        try:
+            return getattr(proxy, method)(*args)
+        except (OSError, http.client.HTTPException):
+            # The transport already retries once on a kept-alive connection
+            # the server closed; after a timeout or any other failure drop
+            # the connection so the next call opens a new one
+            proxy('close')()
+            raise
+
+    def authenticate(self):
+        self.uid = self._call('common', 'authenticate', self.db, self.username, self.password, {})
+        if not self.uid:
+            raise PermissionError("Authentication failed.")
+        return self.uid
+
+    def execute(self, model, method, args, kwargs=None):
+        """execute_kw on `model`.
+
+        Authenticates first if needed, and once more if Odoo refuses the
+        login (a restarted database, a reset session); a login that fails
+        again raises PermissionError.
+        """
+        if self.uid is None:
+            self.authenticate()
+        try:
+            return self._call('object', 'execute_kw', self.db, self.uid, self.password,
+                              model, method, args, kwargs or {})
+        except xmlrpc.client.Fault as e:
+            if e.faultCode not in ACCESS_DENIED_FAULTS:
+                raise
+        self.authenticate()
+        return self._call('object', 'execute_kw', self.db, self.uid, self.password,
+                          model, method, args, kwargs or {})
+
+    def search_read(self, model, domain=None, fields=None, offset=0, limit=PAGE_SIZE, order=None):
+        """One page of records; only `fields` are read and sent"""
+        kwargs = {'offset': offset, 'limit': limit}
+        if fields:
+            kwargs['fields'] = list(fields)
+        if order:
+            kwargs['order'] = order
+        return self.execute(model, 'search_read', [domain or []], kwargs)
+
+    def iter_search_read(self, model, domain=None, fields=None, page_size=PAGE_SIZE, order='id'):
+        """Yield pages of records until the domain is exhausted"""
+        offset = 0
+        while True:
+            page = self.search_read(model, domain, fields, offset, page_size, order)
+            if page:
+                yield page
+            if len(page) < page_size:
+                return
+            offset += page_size
+
+    def search(self, model, domain=None, order=None):
+        """Ids of every record matching `domain`, without reading them"""
+        kwargs = {'order': order} if order else {}
+        return self.execute(model, 'search', [domain or []], kwargs)
+
+    def search_count(self, model, domain=None):
+        return self.execute(model, 'search_count', [domain or []])
+
+    def read_group(self, model, domain, fields, groupby, lazy=True):
+        """Aggregates per group, computed by Odoo instead of reading every record"""
+        return self.execute(model, 'read_group', [domain or [], list(fields), groupby], {'lazy': lazy})
+
+    def create_many(self, model, records, batch_size=CREATE_BATCH_SIZE):
+        """Create `records` (a list of value dicts) in batches; returns their ids in order"""
+        ids = []
+        for start in range(0, len(records), batch_size):
+            created = self.execute(model, 'create', [list(records[start:start + batch_size])])
+            ids.extend(created if isinstance(created, list) else [created])
+        return ids
+
+    @staticmethod
+    def _close_pair(pair):
+        for proxy in pair.values():
+            proxy('close')()
+
+    def close(self):
+        """Close every thread's connections; a later call opens new ones"""
+        with self._lock:
+            proxies, self._proxies = self._proxies, []
+            # Threads still holding the closed pair get a new one on their next call
+            self._local = threading.local()
+        for _, pair in proxies:
+            self._close_pair(pair)
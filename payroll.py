@@ -0,0 +1,233 @@
+"""Payroll engine.
+
+Splits worked hours into regular, overtime and holiday hours per staff member
+per day and adds paid holidays and approved leave, using whole-column
+operations so a month for hundreds of staff takes milliseconds.
+
+Rules:
+- Only closed 'work' sessions count; a session belongs to the site-local day
+  it started. Hours are elapsed time, so a night across a DST change is 7 or 9.
+- Hours inside the staff member's shift window are regular, the rest are
+  overtime. Staff without a shift get 'default_shift_hours' regular hours a day.
+- All hours worked on a date listed in holidays are holiday hours.
+- Each paid holiday, and each day of approved leave that is not a paid
+  holiday, is worth the length of the staff member's shift.
+
+How those hours are paid is site policy, read from admin settings (see
+DEFAULT_RULES). The defaults pay every worked hour at the base rate and days
+off not at all, as before, until an admin sets the rates.
+"""
+import numpy as np
+import pandas as pd
+
+import timeutil
+
+# Pay rules: admin_settings key -> value used while the setting is missing or invalid
+DEFAULT_RULES = {
+    'overtime_multiplier': 1.0,
+    'holiday_multiplier': 1.0,
+    # Regular hours a day for staff without a shift; also what a paid day off is worth
+    'default_shift_hours': 8.0,
+    # Multiplier for paid holiday and leave hours; 1 pays them at the base rate
+    'days_off_multiplier': 0.0,
+}
+
+HOUR_COLUMNS = ['regular_hours', 'overtime_hours', 'holiday_hours', 'paid_holiday_hours', 'leave_hours']
+ONE_DAY = pd.Timedelta(days=1)
+
+
+def _local(value):
+    """Naive site-local Timestamp for a datetime or ISO string (naive means site-local)"""
+    return pd.Timestamp(timeutil.from_epoch(timeutil.to_epoch(value))).tz_localize(None)
+
+
+def _to_local(ts):
+    """Naive site-local wall-clock times for a column of UTC seconds"""
+    return pd.to_datetime(ts, unit='s', utc=True).dt.tz_convert(timeutil.site_tz()).dt.tz_localize(None)
+
+
+def _to_utc(local):
+    """Naive UTC times for a column of naive site-local ones; a repeated hour
+    is its first occurrence and a skipped one starts when the clocks change"""
+    return (local.dt.tz_localize(timeutil.site_tz(), ambiguous=np.ones(len(local), dtype=bool),
+                                 nonexistent='shift_forward')
+            .dt.tz_convert('UTC').dt.tz_localize(None))
+
+
+def load_rules(conn):
+    """DEFAULT_RULES with the values an admin has set in admin_settings"""
+    rows = dict(conn.execute(f'''
+    SELECT setting_key, setting_value FROM admin_settings
+    WHERE setting_key IN ({','.join('?' for _ in DEFAULT_RULES)})
+    ''', list(DEFAULT_RULES)).fetchall())
+    rules = dict(DEFAULT_RULES)
+    for key in rows:
+        try:
+            rules[key] = float(rows[key])
+        except (TypeError, ValueError):
+            pass
+    return rules
+
+
+def load(conn, start, end, staff_codes=None, selected_ids=None, attendance_table='attendance'):
+    """Read the sessions, staff, holidays and approved leave for [start, end)"""
+    staff_filter, staff_params = '', []
+    if staff_codes is not None:
+        staff_filter = f" AND staff_code IN ({','.join('?' for _ in staff_codes)})"
+        staff_params = list(staff_codes)
+
+    session_filter, session_params = staff_filter, list(staff_params)
+    if selected_ids:
+        session_filter += f" AND id IN ({','.join('?' for _ in selected_ids)})"
+        session_params.extend(selected_ids)
+    sessions = pd.read_sql_query(f'''
+    SELECT id, staff_code, clock_in_ts, clock_out_ts, session_type FROM {attendance_table}
+    WHERE clock_in_ts >= ? AND clock_in_ts < ?{session_filter}
+    ''', conn, params=[timeutil.to_epoch(start), timeutil.to_epoch(end)] + session_params)
+
+    staff = pd.read_sql_query(f'''
+    SELECT s.staff_code, s.name, COALESCE(s.hourly_rate, 0) AS hourly_rate, sh.start_time, sh.end_time
+    FROM staff s
+    LEFT JOIN shifts sh ON s.shift_id = sh.id
+    WHERE 1 = 1{staff_filter.replace('staff_code', 's.staff_code')}
+    ''', conn, params=staff_params)
+    if selected_ids:
+        # Exporting chosen rows: pay only the people those rows belong to
+        staff = staff[staff['staff_code'].isin(sessions['staff_code'])]
+
+    holidays = pd.read_sql_query('SELECT date, paid FROM holidays', conn)
+    leave = pd.read_sql_query(f'''
+    SELECT staff_code, start_date, end_date FROM leave_requests
+    WHERE status = 'approved' AND start_date <= ? AND end_date >= ?{staff_filter}
+    ''', conn, params=[_local(end).strftime('%Y-%m-%d'), _local(start).strftime('%Y-%m-%d')] + staff_params)
+    return sessions, staff, holidays, leave
+
+
+def _shift_windows(staff, default_shift_hours):
+    """Add shift_start/shift_end offsets from midnight and shift_hours to `staff`"""
+    staff = staff.copy()
+    for column, source in (('shift_start', 'start_time'), ('shift_end', 'end_time')):
+        staff[column] = pd.to_timedelta(staff[source].astype('string').str.slice(0, 5) + ':00', errors='coerce')
+    # Overnight shifts end the next day
+    overnight = staff['shift_end'] <= staff['shift_start']
+    staff.loc[overnight, 'shift_end'] = staff.loc[overnight, 'shift_end'] + ONE_DAY
+    staff['shift_hours'] = ((staff['shift_end'] - staff['shift_start']).dt.total_seconds() / 3600).fillna(default_shift_hours)
+    return staff
+
+
+def _overlap_hours(start, end, window_start, window_end):
+    latest_start = start.where(start > window_start, window_start)
+    earliest_end = end.where(end < window_end, window_end)
+    return ((earliest_end - latest_start).dt.total_seconds() / 3600).clip(lower=0).fillna(0)
+
+
+def _days_off(staff, holidays, leave, start, end):
+    """Paid holiday and leave hours per (staff_code, date) inside [start, end)"""
+    frames = []
+    paid = pd.to_datetime(holidays.loc[holidays['paid'].fillna(1).astype(bool), 'date'], errors='coerce').dropna()
+    paid = paid[(paid >= start.normalize()) & (paid < end)].drop_duplicates()
+    if len(paid) and len(staff):
+        frame = staff[['staff_code', 'shift_hours']].merge(pd.DataFrame({'date': paid}), how='cross')
+        frame['paid_holiday_hours'] = frame.pop('shift_hours')
+        frames.append(frame)
+
+    if len(leave):
+        leave = leave.merge(staff[['staff_code', 'shift_hours']], on='staff_code')
+        first = pd.to_datetime(leave['start_date'], errors='coerce').dt.normalize()
+        last = pd.to_datetime(leave['end_date'], errors='coerce').dt.normalize()
+        valid = first.notna() & last.notna() & (last >= first)
+        leave, first, last = leave[valid], first[valid], last[valid]
+        # One row per day of leave
+        lengths = ((last - first) // ONE_DAY + 1).astype(int).to_numpy()
+        frame = leave.loc[leave.index.repeat(lengths), ['staff_code', 'shift_hours']].reset_index(drop=True)
+        offsets = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+        frame['date'] = np.repeat(first.to_numpy(), lengths) + pd.to_timedelta(offsets, unit='D')
+        frame = frame[(frame['date'] >= start.normalize()) & (frame['date'] < end) & ~frame['date'].isin(paid)]
+        frame = frame.drop_duplicates(['staff_code', 'date'])
+        frame['leave_hours'] = frame.pop('shift_hours')
+        frames.append(frame)
+
+    if not frames:
+        return pd.DataFrame(columns=['staff_code', 'date', 'paid_holiday_hours', 'leave_hours'])
+    return pd.concat(frames, ignore_index=True)
+
+
+def compute(sessions, staff, holidays, leave, start, end, rules=None):
+    """(per-session frame, per-staff-per-day frame) for [start, end).
+
+    The session frame has id, staff_code, date, hours, the worked hour
+    columns and pay; the daily frame has every HOUR_COLUMNS entry and pay.
+    `rules` defaults to DEFAULT_RULES.
+    """
+    rules = rules or DEFAULT_RULES
+    start, end = _local(start), _local(end)
+    staff = _shift_windows(staff, rules['default_shift_hours'])
+    holiday_dates = pd.to_datetime(holidays['date'], errors='coerce').dropna()
+
+    s = sessions.merge(staff[['staff_code', 'hourly_rate', 'shift_start', 'shift_end']], on='staff_code', how='left')
+    # Durations and overlaps in UTC, days and shift windows in site-local time
+    clock_in = pd.to_datetime(s['clock_in_ts'], unit='s')
+    clock_out = pd.to_datetime(s['clock_out_ts'], unit='s')
+    worked = (s['session_type'] == 'work') & clock_out.notna()
+    hours = ((clock_out - clock_in).dt.total_seconds() / 3600).where(worked, 0).clip(lower=0)
+    day = _to_local(s['clock_in_ts']).dt.normalize()
+
+    # Shift staff: time inside today's window, or yesterday's for overnight shifts
+    in_shift = sum(_overlap_hours(clock_in, clock_out, _to_utc(day - offset + s['shift_start']),
+                                  _to_utc(day - offset + s['shift_end']))
+                   for offset in (pd.Timedelta(0), ONE_DAY))
+    # Everyone else: the first default_shift_hours of the day, in clock-in order
+    by_time = pd.DataFrame({'staff_code': s['staff_code'], 'day': day, 'hours': hours,
+                            'clock_in': clock_in}).sort_values('clock_in', kind='stable')
+    earlier = (by_time.groupby(['staff_code', 'day'])['hours'].cumsum() - by_time['hours']).reindex(s.index)
+    flat = np.minimum((rules['default_shift_hours'] - earlier).clip(lower=0), hours)
+
+    on_holiday = day.isin(holiday_dates)
+    regular = np.minimum(in_shift, hours).where(s['shift_start'].notna(), flat).where(~on_holiday, 0)
+    holiday = hours.where(on_holiday, 0)
+    rate = s['hourly_rate'].fillna(0)
+
+    result = pd.DataFrame({
+        'id': s['id'],
+        'staff_code': s['staff_code'],
+        'date': day,
+        'hours': hours,
+        'regular_hours': regular,
+        'overtime_hours': hours - regular - holiday,
+        'holiday_hours': holiday,
+    })
+    result['pay'] = rate * (result['regular_hours'] + rules['overtime_multiplier'] * result['overtime_hours']
+                            + rules['holiday_multiplier'] * result['holiday_hours'])
+
+    worked_days = result.groupby(['staff_code', 'date'], as_index=False)[
+        ['regular_hours', 'overtime_hours', 'holiday_hours']].sum()
+    daily = pd.concat([worked_days, _days_off(staff, holidays, leave, start, end)], ignore_index=True)
+    daily = daily.groupby(['staff_code', 'date'], as_index=False).sum(min_count=1)
+    daily['date'] = pd.to_datetime(daily['date'])
+    for column in HOUR_COLUMNS:
+        if column not in daily:
+            daily[column] = 0.0
+        daily[column] = daily[column].astype(float).fillna(0)
+    daily = daily.merge(staff[['staff_code', 'hourly_rate']], on='staff_code', how='left')
+    daily['pay'] = daily['hourly_rate'].fillna(0) * (
+        daily['regular_hours'] + rules['overtime_multiplier'] * daily['overtime_hours']
+        + rules['holiday_multiplier'] * daily['holiday_hours']
+        + rules['days_off_multiplier'] * (daily['paid_holiday_hours'] + daily['leave_hours']))
+    daily = daily[daily[HOUR_COLUMNS].sum(axis=1) > 0].drop(columns='hourly_rate')
+    return result, daily.sort_values(['staff_code', 'date']).reset_index(drop=True)
+
+
+def summarize(daily, staff):
+    """Totals per staff member: name, hourly_rate, HOUR_COLUMNS, total_hours (worked) and total_pay"""
+    totals = daily.groupby('staff_code')[HOUR_COLUMNS + ['pay']].sum()
+    totals = staff.set_index('staff_code')[['name', 'hourly_rate']].join(totals, how='inner')
+    totals['total_hours'] = totals['regular_hours'] + totals['overtime_hours'] + totals['holiday_hours']
+    totals = totals.rename(columns={'pay': 'total_pay'})
+    return totals.reset_index().round(2)
+
+
+def run(conn, start, end, staff_codes=None, selected_ids=None, attendance_table='attendance'):
+    """Load and compute in one step; returns (sessions, daily, summary) frames"""
+    sessions, staff, holidays, leave = load(conn, start, end, staff_codes, selected_ids, attendance_table)
+    session_pay, daily = compute(sessions, staff, holidays, leave, start, end, load_rules(conn))
+    return session_pay, daily, summarize(daily, staff)
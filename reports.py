@@ -0,0 +1,234 @@
+"""Attendance report engine.
+
+Rows are computed per partition of the staff list, on a process pool when the
+range is large enough to pay for it, and merged into one workbook or written
+as one workbook per employee. Functions that run in the pool only take plain
+arguments (paths, ISO dates, staff codes) so they can be pickled; workers
+read the site timezone from the environment they are spawned with.
+"""
+import io
+import os
+import sqlite3
+import zipfile
+
+import timeutil
+
+# Worker processes for report partitions; they stay up between reports
+REPORT_PROCESSES = max(1, min(os.cpu_count() or 1, 8))
+# Below this many rows a report is built in the calling thread
+REPORT_PARALLEL_MIN_ROWS = 20000
+
+COLUMNS = ['ID', 'Staff Code', 'Name', 'Clock In', 'Clock Out', 'Notes', 'Hourly Rate', 'Session Type',
+           'Hours', 'Earnings']
+
+SUMMARY_COLUMNS = {'staff_code': 'Staff Code', 'name': 'Name', 'hourly_rate': 'Hourly Rate',
+                   'regular_hours': 'Regular Hours', 'overtime_hours': 'Overtime Hours',
+                   'holiday_hours': 'Holiday Hours', 'paid_holiday_hours': 'Paid Holiday Hours',
+                   'leave_hours': 'Leave Hours', 'total_hours': 'Hours Worked', 'total_pay': 'Pay'}
+PAYROLL_COLUMNS = {'date': 'Date', 'staff_code': 'Staff Code', 'name': 'Name',
+                   'regular_hours': 'Regular Hours', 'overtime_hours': 'Overtime Hours',
+                   'holiday_hours': 'Holiday Hours', 'paid_holiday_hours': 'Paid Holiday Hours',
+                   'leave_hours': 'Leave Hours', 'pay': 'Pay'}
+
+_pool = None
+
+def get_pool():
+    global _pool
+    if _pool is None:
+        import multiprocessing
+        from concurrent.futures import ProcessPoolExecutor
+        # spawn, not fork: the server process has request and worker threads
+        _pool = ProcessPoolExecutor(max_workers=REPORT_PROCESSES,
+                                    mp_context=multiprocessing.get_context('spawn'))
+    return _pool
+
+def shutdown():
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+def _connect(db_path, archive_paths):
+    """Connection where attendance_all covers the live table and the given archives"""
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+    selects = ['SELECT * FROM main.attendance']
+    for i, path in enumerate(archive_paths):
+        cursor.execute(f'ATTACH DATABASE ? AS archive_{i}', (path,))
+        cursor.execute(f"SELECT 1 FROM archive_{i}.sqlite_master WHERE type = 'table' AND name = 'attendance'")
+        if cursor.fetchone():
+            selects.append(f'SELECT * FROM archive_{i}.attendance')
+    cursor.execute('CREATE TEMP VIEW attendance_all AS ' + ' UNION ALL '.join(selects))
+    return conn
+
+def _where(start, end, staff_codes=None, selected_ids=None):
+    clause = 'a.clock_in_ts >= ? AND a.clock_in_ts < ?'
+    params = [timeutil.to_epoch(start), timeutil.to_epoch(end)]
+    if staff_codes is not None:
+        clause += f" AND a.staff_code IN ({','.join('?' for _ in staff_codes)})"
+        params.extend(staff_codes)
+    if selected_ids:
+        clause += f" AND a.id IN ({','.join('?' for _ in selected_ids)})"
+        params.extend(selected_ids)
+    return clause, params
+
+def staff_row_counts(db_path, archive_paths, start, end, staff_codes=None, selected_ids=None):
+    """{staff_code: rows in range}; used to size and balance partitions.
+
+    Unless specific rows are selected, staff without attendance are included
+    with a count of 0, since paid holidays and leave still go on their payroll.
+    """
+    conn = _connect(db_path, archive_paths)
+    cursor = conn.cursor()
+    counts = {}
+    if not selected_ids:
+        if staff_codes is None:
+            cursor.execute('SELECT staff_code FROM staff')
+        else:
+            cursor.execute(f"SELECT staff_code FROM staff WHERE staff_code IN ({','.join('?' for _ in staff_codes)})",
+                           staff_codes)
+        counts = {staff_code: 0 for staff_code, in cursor.fetchall()}
+    clause, params = _where(start, end, staff_codes, selected_ids)
+    cursor.execute(f'SELECT a.staff_code, COUNT(*) FROM attendance_all a WHERE {clause} GROUP BY a.staff_code',
+                   params)
+    counts.update(cursor.fetchall())
+    conn.close()
+    return counts
+
+def compute_partition(db_path, archive_paths, start, end, staff_codes, selected_ids=None):
+    """(rows, payroll daily frame, payroll summary frame) for `staff_codes`.
+
+    Rows follow COLUMNS; their hours and earnings come from the payroll
+    engine, so overtime and holiday rates are applied per session.
+    """
+    import payroll
+
+    conn = _connect(db_path, archive_paths)
+    clause, params = _where(start, end, staff_codes, selected_ids)
+    cursor = conn.cursor()
+    cursor.execute(f'''
+    SELECT a.id, a.staff_code, s.name, a.clock_in_ts, a.clock_out_ts, a.notes, s.hourly_rate, a.session_type
+    FROM attendance_all a
+    JOIN staff s ON a.staff_code = s.staff_code
+    WHERE {clause}
+    ''', params)
+    # Times are shown in the site timezone
+    records = [record[:3] + (timeutil.format_local(record[3]), timeutil.format_local(record[4])) + record[5:]
+               for record in cursor.fetchall()]
+    session_pay, daily, summary = payroll.run(conn, start, end, staff_codes, selected_ids,
+                                              attendance_table='attendance_all')
+    conn.close()
+
+    pay = dict(zip(session_pay['id'], zip(session_pay['hours'].round(2), session_pay['pay'].round(2))))
+    rows = [record + tuple(float(value) for value in pay.get(record[0], (0, 0))) for record in records]
+    return rows, daily, summary
+
+def write_workbook(rows, daily, summary):
+    """xlsx bytes with Attendance (newest first), per-staff Summary and daily Payroll sheets"""
+    import pandas as pd
+
+    df = pd.DataFrame(sorted(rows, key=lambda row: row[3], reverse=True), columns=COLUMNS)
+    summary = summary.sort_values('staff_code').rename(columns=SUMMARY_COLUMNS)[list(SUMMARY_COLUMNS.values())]
+    names = dict(zip(summary['Staff Code'], summary['Name']))
+    daily = daily.assign(name=daily['staff_code'].map(names), date=daily['date'].dt.strftime('%Y-%m-%d'))
+    daily = daily.rename(columns=PAYROLL_COLUMNS)[list(PAYROLL_COLUMNS.values())].round(2)
+
+    output = io.BytesIO()
+    with pd.ExcelWriter(output, engine='xlsxwriter') as writer:
+        workbook = writer.book
+        header_format = workbook.add_format({
+            'bold': True,
+            'text_wrap': True,
+            'valign': 'top',
+            'fg_color': '#D7E4BC',
+            'border': 1
+        })
+
+        for sheet_name, frame in (('Attendance', df), ('Summary', summary), ('Payroll', daily)):
+            frame.to_excel(writer, sheet_name=sheet_name, index=False)
+            worksheet = writer.sheets[sheet_name]
+            for col_num, value in enumerate(frame.columns.values):
+                worksheet.write(0, col_num, value, header_format)
+            # Fit columns to their longest value, within limits
+            for i, col in enumerate(frame.columns):
+                longest = frame[col].map(lambda value: len(str(value))).max() if len(frame) else 0
+                worksheet.set_column(i, i, min(max(longest, len(str(col))) + 2, 50))
+
+    return output.getvalue()
+
+def staff_workbook(db_path, archive_paths, start, end, staff_code):
+    """(staff_code, xlsx bytes) for one employee; runs in the pool for zip exports"""
+    return staff_code, write_workbook(*compute_partition(db_path, archive_paths, start, end, [staff_code]))
+
+def _partition(counts, parts):
+    """Split staff codes into `parts` groups with similar row totals"""
+    groups = [[0, []] for _ in range(parts)]
+    for staff_code, count in sorted(counts.items(), key=lambda item: item[1], reverse=True):
+        group = min(groups, key=lambda group: group[0])
+        group[0] += count
+        group[1].append(staff_code)
+    return [codes for _, codes in groups if codes]
+
+def _run(tasks, progress, low, high):
+    """Run (function, args) tasks, on the pool when there is more than one,
+    reporting progress from `low` to `high` as they finish"""
+    results = []
+    if len(tasks) <= 1:
+        for function, args in tasks:
+            results.append(function(*args))
+        progress(high, "Calculated")
+        return results
+
+    from concurrent.futures import as_completed
+    futures = [get_pool().submit(function, *args) for function, args in tasks]
+    for done, future in enumerate(as_completed(futures), 1):
+        results.append(future.result())
+        progress(low + (high - low) * done / len(futures), f"Processed {done} of {len(futures)} parts")
+    return results
+
+def build_workbook(db_path, archive_paths, start, end, staff_codes=None, selected_ids=None, progress=None):
+    """One workbook for the range; rows for large ranges are computed in parallel"""
+    report_progress = progress or (lambda fraction, message: None)
+    report_progress(0.1, "Counting records")
+    counts = staff_row_counts(db_path, archive_paths, start, end, staff_codes, selected_ids)
+    total = sum(counts.values())
+
+    parts = 1
+    if total >= REPORT_PARALLEL_MIN_ROWS:
+        parts = min(REPORT_PROCESSES * 2, len(counts))
+    # An empty staff list still yields a (blank) workbook
+    tasks = [(compute_partition, (db_path, archive_paths, start, end, codes, selected_ids))
+             for codes in _partition(counts, parts) or [[]]]
+    report_progress(0.2, f"Calculating pay for {total} records")
+    results = _run(tasks, report_progress, 0.2, 0.6)
+
+    import pandas as pd
+    report_progress(0.6, "Writing workbook")
+    return write_workbook([row for rows, _, _ in results for row in rows],
+                          pd.concat([daily for _, daily, _ in results], ignore_index=True),
+                          pd.concat([summary for _, _, summary in results], ignore_index=True))
+
+def build_staff_zip(db_path, archive_paths, start, end, staff_codes=None, progress=None):
+    """Zip of one workbook per employee with attendance in the range"""
+    report_progress = progress or (lambda fraction, message: None)
+    report_progress(0.1, "Counting records")
+    counts = {staff_code: count for staff_code, count
+              in staff_row_counts(db_path, archive_paths, start, end, staff_codes).items() if count}
+    if not counts:
+        raise ValueError("No attendance records in this range")
+
+    tasks = [(staff_workbook, (db_path, archive_paths, start, end, staff_code)) for staff_code in sorted(counts)]
+    if sum(counts.values()) < REPORT_PARALLEL_MIN_ROWS:
+        # Not worth starting the pool: build them here, one by one
+        workbooks = []
+        for done, (function, args) in enumerate(tasks, 1):
+            workbooks.append(function(*args))
+            report_progress(0.1 + 0.85 * done / len(tasks), f"Written {done} of {len(tasks)} workbooks")
+    else:
+        workbooks = _run(tasks, report_progress, 0.1, 0.95)
+
+    output = io.BytesIO()
+    with zipfile.ZipFile(output, 'w', zipfile.ZIP_DEFLATED) as archive:
+        for staff_code, content in sorted(workbooks):
+            archive.writestr(f"{staff_code}_attendance.xlsx", content)
+    return output.getvalue()
@@ -1,27 +1,29 @@
 # server.py - Server Only Version
-import requests
 import json
 import os
 import sys
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 import base64
-import webbrowser
-import socket
 import threading
 import time
-import pandas as pd
-import io
+import queue
+import atexit
+import gzip
+import shutil
 import hashlib
-import secrets
-from flask import Flask, request, jsonify
+import functools
+import collections
+import bisect
+import reports
+import timeutil
+import odoo_client
+from flask import Flask, request, jsonify, make_response
 from flask_cors import CORS
 import sqlite3
-import pystray
-from PIL import Image, ImageDraw
-import schedule
-import matplotlib.pyplot as plt
-from dateutil import parser
-import numpy as np
+
+# pandas, dateutil, schedule and the tray/GUI toolkits (pystray, PIL, tkinter,
+# crmtest) are imported where they are used, so `python server.py serve`
+# starts without loading them
 
 # ==================== SERVER CODE ====================
 
@@ -166,41 +168,1056 @@ def init_db():
     ('Sales'), ('Marketing'), ('Support'), ('Technical'), ('VIP')
     ''')
 
+    # crm_get_leads filters and keyset sorts; every index ends in id so a page
+    # continues exactly where the previous one stopped
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_crm_leads_created ON crm_leads (created_at, id)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_crm_leads_name ON crm_leads (name, id)')
+    for column in ('status', 'target', 'assigned_to'):
+        cursor.execute(f'CREATE INDEX IF NOT EXISTS idx_crm_leads_{column} ON crm_leads ({column}, created_at, id)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_crm_leads_phone ON crm_leads (phone)')
+
+    # Local mirror of the Odoo CRM, kept current by sync_odoo_mirror; ids are
+    # Odoo's. Not journaled: everything here can be pulled from Odoo again
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS odoo_stages (
+        id INTEGER PRIMARY KEY,
+        name TEXT,
+        sequence INTEGER,
+        write_date TEXT
+    )
+    ''')
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS odoo_leads (
+        id INTEGER PRIMARY KEY,
+        name TEXT,
+        partner_name TEXT,
+        email_from TEXT,
+        phone TEXT,
+        stage_id INTEGER,
+        write_date TEXT             -- Odoo's, UTC
+    )
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_odoo_leads_stage ON odoo_leads (stage_id, id)')
+    # Per Odoo model: where the next incremental sync starts
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS odoo_sync_state (
+        model TEXT PRIMARY KEY,
+        last_write_date TEXT,
+        synced_at TEXT,
+        reconciled_at TEXT
+    )
+    ''')
+
+    # Append-only log of row changes, written by triggers on every table.
+    # Incremental backups replay it on top of the last full backup.
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS change_journal (
+        seq INTEGER PRIMARY KEY AUTOINCREMENT,
+        table_name TEXT NOT NULL,
+        row_id INTEGER NOT NULL,
+        op TEXT NOT NULL,           -- 'I', 'U' or 'D'
+        row_data TEXT,              -- JSON of the row after the change
+        changed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    ''')
+    # Latest change per table, for ETags
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_change_journal_table_seq ON change_journal (table_name, seq)')
+
+    add_epoch_columns(cursor)
+    configure_site_timezone(cursor)
+    # Open sessions only: presence checks and the open-session sweeper stay
+    # cheap however long the attendance history grows
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_attendance_open ON attendance (staff_code, clock_in_ts) '
+                   'WHERE clock_out IS NULL')
+
+    # Full and incremental backups taken so far (not journaled)
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS backup_chain (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        kind TEXT NOT NULL,         -- 'full' or 'incremental'
+        filename TEXT NOT NULL,
+        from_seq INTEGER NOT NULL,
+        to_seq INTEGER NOT NULL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    ''')
+
+    # One-off rewrite of times stored without an offset; not journaled, the
+    # same rewrite runs again on a database restored from older backups
+    _drop_change_triggers(cursor)
+    localize_attendance_times(cursor)
+    _install_change_triggers(cursor)
+    # Entries journaled for these tables before they were left out
+    cursor.execute(f'DELETE FROM change_journal WHERE table_name IN ({", ".join("?" * len(UNJOURNALED_TABLES))})',
+                   UNJOURNALED_TABLES)
+    cursor.execute("PRAGMA table_info(backup_chain)")
+    if 'audit_to_id' not in [row[1] for row in cursor.fetchall()]:
+        cursor.execute('ALTER TABLE backup_chain ADD COLUMN audit_to_id INTEGER')
 
     conn.commit()
+
+    # Archives written before the epoch columns existed get them too, so
+    # attendance_all lines up across files
+    for year in list_archive_years():
+        cursor.execute('ATTACH DATABASE ? AS archive', (_archive_path(year),))
+        try:
+            add_epoch_columns(cursor, 'archive')
+            localize_attendance_times(cursor, 'archive')
+            conn.commit()
+        finally:
+            cursor.execute('DETACH DATABASE archive')
+
+    # Switch to incremental auto-vacuum so the archival job can hand freed
+    # pages back to the OS a little at a time (needs a one-off full VACUUM)
+    cursor.execute('PRAGMA auto_vacuum')
+    if cursor.fetchone()[0] != 2:
+        print("Converting database to incremental auto-vacuum (one-time)...")
+        cursor.execute('PRAGMA auto_vacuum = INCREMENTAL')
+        cursor.execute('VACUUM')
+
     conn.close()
 
+# Integer copies of the attendance timestamps. Writers keep setting the text
+# columns, with their UTC offset (see timeutil); SQLite derives UTC seconds,
+# and range filters, ordering and durations use these through the indexes
+# instead of comparing strings.
+EPOCH_COLUMNS = {'clock_in_ts': 'clock_in', 'clock_out_ts': 'clock_out'}
+
+def add_epoch_columns(cursor, schema='main'):
+    """Add the generated epoch columns and their indexes to an attendance table"""
+    cursor.execute(f'PRAGMA {schema}.table_xinfo(attendance)')
+    existing = {row[1] for row in cursor.fetchall()}
+    if not existing:
+        return
+    for column, source in EPOCH_COLUMNS.items():
+        if column not in existing:
+            # VIRTUAL: ALTER TABLE cannot add STORED columns, and the indexes
+            # below keep the computed values anyway
+            cursor.execute(f"ALTER TABLE {schema}.attendance ADD COLUMN {column} INTEGER "
+                           f"GENERATED ALWAYS AS (CAST(strftime('%s', {source}) AS INTEGER)) VIRTUAL")
+    cursor.execute(f'CREATE INDEX IF NOT EXISTS {schema}.idx_attendance_clock_in_ts ON attendance (clock_in_ts)')
+    # Covers the per-staff range scans and hour sums without touching the table
+    cursor.execute(f'CREATE INDEX IF NOT EXISTS {schema}.idx_attendance_staff_ts '
+                   f'ON attendance (staff_code, clock_in_ts, clock_out_ts, session_type)')
+
+def configure_site_timezone(cursor):
+    """Apply the 'site_timezone' admin setting (an IANA name such as
+    Africa/Cairo); without it ATTENDANCE_TIMEZONE or the system zone is used"""
+    cursor.execute("SELECT setting_value FROM admin_settings WHERE setting_key = 'site_timezone'")
+    row = cursor.fetchone()
+    try:
+        timeutil.configure(row[0] if row else None)
+    except (KeyError, ValueError) as e:
+        print(f"Unknown site timezone {row[0]!r} ({e}), using the system timezone")
+        timeutil.configure()
+
+# Text that already ends in a UTC offset or Z
+_HAS_OFFSET = "({0} GLOB '*[+-][0-9][0-9]:[0-9][0-9]' OR {0} GLOB '*Z')"
+
+def localize_attendance_times(cursor, schema='main'):
+    """Add the site's UTC offset to attendance times stored without one.
+
+    Older versions stored naive wall-clock time, which SQLite reads as UTC.
+    Returns the number of rows rewritten.
+    """
+    cursor.execute(f"SELECT 1 FROM {schema}.sqlite_master WHERE type = 'table' AND name = 'attendance'")
+    if not cursor.fetchone():
+        return 0
+    cursor.execute(f'''
+    SELECT id, clock_in, clock_out FROM {schema}.attendance
+    WHERE NOT {_HAS_OFFSET.format('clock_in')}
+       OR (clock_out IS NOT NULL AND NOT {_HAS_OFFSET.format('clock_out')})
+    ''')
+
+    def localized(value):
+        try:
+            return timeutil.to_storage(value) if value else value
+        except ValueError:
+            return value
+
+    updates = [(localized(clock_in), localized(clock_out), row_id) for row_id, clock_in, clock_out in cursor.fetchall()]
+    cursor.executemany(f'UPDATE {schema}.attendance SET clock_in = ?, clock_out = ? WHERE id = ?', updates)
+    if updates:
+        print(f"Added the site UTC offset to {len(updates)} {schema} attendance rows")
+    return len(updates)
+
+# ==================== CHANGE JOURNAL ====================
+
+# Tables whose row changes are recorded in change_journal by triggers
+JOURNALED_TABLES = ('staff', 'attendance', 'admin_settings', 'shifts', 'holidays',
+                    'leave_requests', 'crm_leads', 'crm_targets')
+# Not journaled: audit_log is append-only, so incremental backups copy its
+# rows past the last backed-up id instead of a second JSON copy of each
+# entry; crm_credentials holds the Odoo password and is only in full backups
+UNJOURNALED_TABLES = ('audit_log', 'crm_credentials')
+
+def _install_change_triggers(cursor):
+    """(Re)create the triggers that append every row change to change_journal.
+
+    The triggers are rebuilt on every start so they always list the current
+    columns of each table.
+    """
+    for table in UNJOURNALED_TABLES:
+        for event in ('insert', 'update', 'delete'):
+            cursor.execute(f'DROP TRIGGER IF EXISTS journal_{table}_{event}')
+    for table in JOURNALED_TABLES:
+        cols = _stored_columns(cursor, table)
+        new_row = 'json_object(' + ', '.join(f"'{c}', NEW.{c}" for c in cols) + ')'
+        for op, event in (('I', 'INSERT'), ('U', 'UPDATE'), ('D', 'DELETE')):
+            name = f"journal_{table}_{event.lower()}"
+            cursor.execute(f'DROP TRIGGER IF EXISTS {name}')
+            if op == 'D':
+                body = f"INSERT INTO change_journal (table_name, row_id, op) VALUES ('{table}', OLD.id, 'D');"
+            else:
+                body = (f"INSERT INTO change_journal (table_name, row_id, op, row_data) "
+                        f"VALUES ('{table}', NEW.id, '{op}', {new_row});")
+            cursor.execute(f'CREATE TRIGGER {name} AFTER {event} ON {table} BEGIN {body} END')
+
+def _drop_change_triggers(cursor):
+    for table in JOURNALED_TABLES + UNJOURNALED_TABLES:
+        for event in ('insert', 'update', 'delete'):
+            cursor.execute(f'DROP TRIGGER IF EXISTS journal_{table}_{event}')
+
+def current_change_seq(cursor):
+    cursor.execute("SELECT seq FROM sqlite_sequence WHERE name = 'change_journal'")
+    row = cursor.fetchone()
+    return row[0] if row else 0
+
+def current_audit_id(cursor):
+    """Highest audit_log id handed out, even if that entry has since been archived"""
+    cursor.execute("SELECT seq FROM sqlite_sequence WHERE name = 'audit_log'")
+    row = cursor.fetchone()
+    return row[0] if row else 0
+
+# ==================== AUDIT LOG WRITER ====================
+
+# When True, audit entries are written inside the caller's transaction so they
+# commit (or roll back) together with the mutation they describe.
+AUDIT_STRICT_DURABILITY = False
+
+class AuditLogWriter:
+    """Queues audit entries in memory and writes them in batches from a background thread.
+
+    A batch that fails is retried; if it keeps failing its entries are
+    written one by one, so only an entry that cannot be written at all is
+    lost. After close() entries are written directly instead of queued.
+    """
+
+    def __init__(self, db_path='attendance.db', batch_size=200, flush_interval=1.0, retries=3, retry_delay=0.5):
+        self.db_path = db_path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.retries = retries
+        self.retry_delay = retry_delay
+        self._queue = queue.Queue()
+        self._thread = None
+        self._start_lock = threading.Lock()
+        # Orders enqueue() against close(): nothing is queued once stopping is set
+        self._close_lock = threading.Lock()
+        self._stopping = False
+        self._stats_lock = threading.Lock()
+        self._stats = {
+            'enqueued': 0,
+            'written': 0,
+            'batches': 0,
+            'errors': 0,
+            'dropped': 0,
+            'last_flush_ms': 0.0,
+            'max_flush_ms': 0.0,
+            'total_flush_ms': 0.0
+        }
+
+    def _ensure_started(self):
+        if self._thread and self._thread.is_alive():
+            return
+        with self._start_lock:
+            if self._thread and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._run, name="audit-writer", daemon=True)
+            self._thread.start()
+
+    @staticmethod
+    def _entry(password, details):
+        hashed_password = hashlib.sha256(password.encode()).hexdigest() if password else 'system'
+        # Same format as CURRENT_TIMESTAMP, but captured when the action happened
+        timestamp = datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+        return (hashed_password, timestamp, f"{timeutil.now_storage()}: {details}")
+
+    def enqueue(self, password, details):
+        """Queue an entry for the next batched flush; written at once after close()"""
+        entry = self._entry(password, details)
+        with self._close_lock:
+            if not self._stopping:
+                self._queue.put(entry)
+                with self._stats_lock:
+                    self._stats['enqueued'] += 1
+                self._ensure_started()
+                return
+        self._write_batch([entry])
+
+    def write_in_transaction(self, conn, password, details):
+        """Write an entry using the caller's connection; the caller commits"""
+        conn.execute('INSERT INTO audit_log (admin_password, action_timestamp, action_details) VALUES (?, ?, ?)',
+                     self._entry(password, details))
+
+    def _drain(self, first):
+        batch = [first]
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _insert(self, rows):
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        try:
+            conn.executemany('INSERT INTO audit_log (admin_password, action_timestamp, action_details) VALUES (?, ?, ?)',
+                             rows)
+            conn.commit()
+        finally:
+            conn.close()
+
+    def _write_batch(self, batch):
+        started = time.perf_counter()
+        written = len(batch)
+        for attempt in range(self.retries):
+            try:
+                self._insert(batch)
+                break
+            except Exception as e:
+                with self._stats_lock:
+                    self._stats['errors'] += 1
+                print(f"Error writing audit log batch (attempt {attempt + 1}): {e}")
+                # No wait after the last attempt; the row-by-row fallback runs at once
+                if attempt + 1 < self.retries:
+                    time.sleep(self.retry_delay * (attempt + 1))
+        else:
+            # Row by row, so one entry that cannot be written does not take the rest with it
+            written = 0
+            for row in batch:
+                try:
+                    self._insert([row])
+                    written += 1
+                except Exception as e:
+                    with self._stats_lock:
+                        self._stats['dropped'] += 1
+                    print(f"Dropped audit log entry {row[2]!r}: {e}")
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        with self._stats_lock:
+            self._stats['written'] += written
+            self._stats['batches'] += 1
+            self._stats['last_flush_ms'] = round(elapsed_ms, 2)
+            self._stats['max_flush_ms'] = round(max(self._stats['max_flush_ms'], elapsed_ms), 2)
+            self._stats['total_flush_ms'] += elapsed_ms
+
+    def _run(self):
+        while True:
+            try:
+                first = self._queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                # Nothing is queued once stopping is set, so empty stays empty
+                if self._stopping and self._queue.empty():
+                    return
+                continue
+            batch = self._drain(first)
+            self._write_batch(batch)
+            for _ in batch:
+                self._queue.task_done()
+
+    def flush(self):
+        """Block until every queued entry has been written"""
+        if self._thread and self._thread.is_alive():
+            self._queue.join()
+            return
+        # No writer thread (e.g. during shutdown) - write synchronously
+        while True:
+            try:
+                first = self._queue.get_nowait()
+            except queue.Empty:
+                return
+            batch = self._drain(first)
+            self._write_batch(batch)
+            for _ in batch:
+                self._queue.task_done()
+
+    def close(self):
+        with self._close_lock:
+            self._stopping = True
+        self.flush()
+
+    def stats(self):
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats['queue_depth'] = self._queue.qsize()
+        stats['avg_flush_ms'] = round(stats.pop('total_flush_ms') / stats['batches'], 2) if stats['batches'] else 0.0
+        return stats
+
+audit_writer = AuditLogWriter()
+atexit.register(audit_writer.close)
+
 # Helper function to log admin actions
-def log_admin_action(password, details):
-    hashed_password = hashlib.sha256(password.encode()).hexdigest()
-    conn = sqlite3.connect('attendance.db')
+def log_admin_action(password, details, conn=None):
+    """Record an admin action.
+
+    Entries are queued for the background writer. If AUDIT_STRICT_DURABILITY is
+    enabled and the caller passes its open connection, the entry is written in
+    that transaction instead and becomes durable with the caller's commit.
+    """
+    if AUDIT_STRICT_DURABILITY:
+        if conn is not None:
+            audit_writer.write_in_transaction(conn, password, details)
+            return
+        own_conn = sqlite3.connect('attendance.db')
+        audit_writer.write_in_transaction(own_conn, password, details)
+        own_conn.commit()
+        own_conn.close()
+        return
+    audit_writer.enqueue(password, details)
+
+# ==================== LIVE EVENTS ====================
+
+# Each subscriber holds a server worker thread for as long as it is connected
+MAX_EVENT_SUBSCRIBERS = 4
+# The journal is also polled at this interval in case a write did not notify
+EVENT_POLL_INTERVAL = 2.0
+EVENT_KEEPALIVE_SECONDS = 15
+EVENT_QUEUE_SIZE = 1000
+
+# Row shapes for /api/events and /api/sync; they match what the read endpoints return.
+# table -> (SELECT without WHERE, id column, ORDER BY of the read endpoint, formatter)
+TABLE_ROW_QUERIES = {
+    'attendance': ('''
+    SELECT a.id, a.staff_code, s.name, a.clock_in, a.clock_out, a.notes, s.hourly_rate, a.session_type,
+           a.clock_in_ts, a.clock_out_ts
+    FROM attendance a
+    JOIN staff s ON a.staff_code = s.staff_code
+    ''', 'a.id', 'a.clock_in_ts DESC', lambda record: _format_attendance_record(record)),
+    'leave_requests': ('''
+    SELECT lr.id, lr.staff_code, s.name, lr.start_date, lr.end_date, lr.reason, lr.status, lr.approved_by, lr.approval_date
+    FROM leave_requests lr
+    JOIN staff s ON lr.staff_code = s.staff_code
+    ''', 'lr.id', 'lr.id DESC', lambda record: _format_leave_record(record)),
+    'staff': ('''
+    SELECT s.id, s.staff_code, s.name, s.hourly_rate, sh.name as shift_name
+    FROM staff s
+    LEFT JOIN shifts sh ON s.shift_id = sh.id
+    ''', 's.id', 's.id', lambda record: _format_staff_record(record)),
+    'shifts': ('SELECT * FROM shifts', 'id', 'id', lambda record: _format_shift_record(record)),
+    'holidays': ('SELECT * FROM holidays', 'id', 'date', lambda record: _format_holiday_record(record)),
+    'crm_leads': ('''
+    SELECT l.*, s.name as staff_name
+    FROM crm_leads l
+    LEFT JOIN staff s ON l.assigned_to = s.staff_code
+    ''', 'l.id', 'l.created_at DESC', dict),
+}
+
+# Tables whose rows carry joined columns of another table (a staff member's
+# or shift's name): an update or delete there makes their rows stale too
+DEPENDENT_TABLES = {
+    'staff': ('attendance', 'leave_requests', 'crm_leads'),
+    'shifts': ('staff',),
+}
+# (parent, dependent) -> ids of the dependent rows joined to the parent ids in {ids}
+DEPENDENT_ROW_IDS = {
+    ('staff', 'attendance'):
+        'SELECT a.id FROM attendance a JOIN staff s ON a.staff_code = s.staff_code WHERE s.id IN ({ids})',
+    ('staff', 'leave_requests'):
+        'SELECT lr.id FROM leave_requests lr JOIN staff s ON lr.staff_code = s.staff_code WHERE s.id IN ({ids})',
+    ('staff', 'crm_leads'):
+        'SELECT l.id FROM crm_leads l JOIN staff s ON l.assigned_to = s.staff_code WHERE s.id IN ({ids})',
+    ('shifts', 'staff'): 'SELECT id FROM staff WHERE shift_id IN ({ids})',
+}
+
+class EventBroker:
+    """Publishes committed row changes to /api/events subscribers.
+
+    A single thread tails change_journal; writes wake it through notify(), so
+    events go out as soon as the request that made them has committed.
+    """
+
+    def __init__(self, db_path='attendance.db'):
+        self.db_path = db_path
+        self._subscribers = set()
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._last_seq = None
+        self._stats = {'published': 0, 'dropped_subscribers': 0}
+
+    def subscribe(self):
+        """Return a queue that receives events, or None if the subscriber limit is reached"""
+        with self._lock:
+            if len(self._subscribers) >= MAX_EVENT_SUBSCRIBERS:
+                return None
+            subscriber = queue.Queue(maxsize=EVENT_QUEUE_SIZE)
+            self._subscribers.add(subscriber)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="event-broker", daemon=True)
+                self._thread.start()
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            self._subscribers.discard(subscriber)
+
+    def notify(self):
+        """Wake the broker after a commit"""
+        if self._subscribers:
+            self._wakeup.set()
+
+    def _collect(self, conn):
+        cursor = conn.cursor()
+        if self._last_seq is None:
+            self._last_seq = current_change_seq(cursor)
+        cursor.execute('''
+        SELECT seq, table_name, row_id, op FROM change_journal
+        WHERE seq > ? ORDER BY seq
+        ''', (self._last_seq,))
+        entries = cursor.fetchall()
+        if not entries:
+            return []
+        self._last_seq = entries[-1][0]
+
+        # Several changes to one row in a batch become a single event
+        latest = {}
+        for seq, table_name, row_id, op in entries:
+            if table_name in TABLE_ROW_QUERIES:
+                latest[(table_name, row_id)] = (seq, op)
+
+        events = []
+        for (table_name, row_id), (seq, op) in sorted(latest.items(), key=lambda item: item[1][0]):
+            row = None
+            if op != 'D':
+                query, id_column, _, formatter = TABLE_ROW_QUERIES[table_name]
+                cursor.execute(f'{query} WHERE {id_column} = ?', (row_id,))
+                record = cursor.fetchone()
+                if record is not None:
+                    row = formatter(record)
+            events.append({'seq': seq, 'table': table_name, 'id': row_id,
+                           'op': 'D' if row is None else op, 'row': row})
+
+        # One reload event per table whose joined columns changed
+        invalidated = {}
+        for (table_name, row_id), (seq, op) in latest.items():
+            if op != 'I':
+                for dependent in DEPENDENT_TABLES.get(table_name, ()):
+                    invalidated[dependent] = max(seq, invalidated.get(dependent, 0))
+        for dependent, seq in sorted(invalidated.items(), key=lambda item: item[1]):
+            events.append({'seq': seq, 'table': dependent, 'id': None, 'op': 'R', 'row': None})
+        return events
+
+    def _run(self):
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        try:
+            while True:
+                with self._lock:
+                    # Stop with the last subscriber; subscribe() starts a new thread
+                    if not self._subscribers:
+                        self._thread = None
+                        return
+                self._wakeup.wait(EVENT_POLL_INTERVAL)
+                self._wakeup.clear()
+                try:
+                    events = self._collect(conn)
+                except sqlite3.Error as e:
+                    print(f"Error reading change journal: {e}")
+                    continue
+                if events:
+                    self._publish(events)
+        finally:
+            conn.close()
+            self._last_seq = None
+
+    def _publish(self, events):
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for subscriber in subscribers:
+            for event in events:
+                try:
+                    subscriber.put_nowait(event)
+                except queue.Full:
+                    # Too slow to keep up; end its stream so it reconnects and reloads
+                    self.unsubscribe(subscriber)
+                    self._stats['dropped_subscribers'] += 1
+                    while True:
+                        try:
+                            subscriber.get_nowait()
+                        except queue.Empty:
+                            break
+                    subscriber.put_nowait(None)
+                    break
+        self._stats['published'] += len(events)
+
+    def stats(self):
+        stats = dict(self._stats)
+        stats['subscribers'] = len(self._subscribers)
+        return stats
+
+event_broker = EventBroker()
+
+@app.after_request
+def notify_event_broker(response):
+    # Every write endpoint commits before it returns
+    if request.method == 'POST' and response.status_code < 400:
+        event_broker.notify()
+    return response
+
+@app.route('/api/events', methods=['POST'])
+def events():
+    """Server-Sent Events stream of row changes (admin only).
+
+    Each event is `event: change` with JSON data {seq, table, id, op, row};
+    op is 'I', 'U' or 'D' and row has the same fields as the table's read
+    endpoint (None for deletes). op 'R' (id and row None) follows a change
+    to a staff member or shift: the table's rows show its old name, reload it.
+    """
+    data = request.get_json() or {}
+    if not _verify_admin(data.get('password', '')):
+        return jsonify(success=False, message="Unauthorized"), 401
+
+    subscriber = event_broker.subscribe()
+    if subscriber is None:
+        return jsonify(success=False, message="Too many event subscribers"), 503
+
+    def stream():
+        try:
+            yield 'retry: 5000\n\n'
+            while True:
+                try:
+                    event = subscriber.get(timeout=EVENT_KEEPALIVE_SECONDS)
+                except queue.Empty:
+                    # Comment line; also lets the server notice closed connections
+                    yield ': keepalive\n\n'
+                    continue
+                if event is None:
+                    return
+                yield f"id: {event['seq']}\nevent: change\ndata: {json.dumps(event)}\n\n"
+        finally:
+            event_broker.unsubscribe(subscriber)
+
+    return app.response_class(stream(), mimetype='text/event-stream',
+                              headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+# ==================== DELTA SYNC ====================
+
+# Tables a client replica can follow through /api/sync
+SYNC_TABLES = ('staff', 'shifts', 'holidays', 'leave_requests', 'crm_leads')
+# Row ids per "WHERE id IN (...)" query
+SYNC_BATCH_SIZE = 500
+
+@app.route('/api/sync', methods=['POST'])
+def sync():
+    """Rows inserted, updated or deleted since a change sequence number (admin only).
+
+    `since` comes from the query string (/api/sync?since=N) or the JSON body.
+    The reply carries the current `seq` for the next call. If the client is
+    new (since=0) or further behind than the journal goes back, the reply is a
+    full snapshot (mode 'snapshot') and the client replaces its replica.
+
+    A delta also carries the rows whose joined names changed with a staff
+    member or shift. A deleted staff member or shift leaves no way to find
+    them, so that answers with a snapshot too.
+    """
+    data = request.get_json() or {}
+    if not _verify_admin(data.get('password', '')):
+        return jsonify(success=False, message="Unauthorized"), 401
+
+    since = request.args.get('since', type=int)
+    if since is None:
+        try:
+            since = int(data.get('since') or 0)
+        except (TypeError, ValueError):
+            return jsonify(success=False, message="since must be an integer"), 400
+    tables = [t for t in (data.get('tables') or SYNC_TABLES) if t in SYNC_TABLES]
+
+    conn = get_db()
+    conn.isolation_level = None
     cursor = conn.cursor()
-    cursor.execute('INSERT INTO audit_log (admin_password, action_details) VALUES (?, ?)', 
-                  (hashed_password, f"{datetime.now()}: {details}"))
-    conn.commit()
-    conn.close()
+    # One read transaction, so the rows match the returned seq
+    cursor.execute('BEGIN')
+    try:
+        seq = current_change_seq(cursor)
+        # Entries below the oldest one left in the journal may have been pruned
+        cursor.execute('SELECT MIN(seq) FROM change_journal')
+        oldest = cursor.fetchone()[0] or seq + 1
+        snapshot = since <= 0 or since > seq or since < oldest - 1
+
+        changes = {}
+        if not snapshot and tables:
+            parents = [parent for parent, dependents in DEPENDENT_TABLES.items()
+                       if set(dependents) & set(tables)]
+            journal_tables = list(set(tables) | set(parents))
+            cursor.execute(f'''
+            SELECT table_name, row_id, op FROM change_journal
+            WHERE seq > ? AND table_name IN ({", ".join("?" * len(journal_tables))})
+            ORDER BY seq
+            ''', (since, *journal_tables))
+            latest = {}
+            for table_name, row_id, op in cursor.fetchall():
+                latest.setdefault(table_name, {})[row_id] = op
+
+            snapshot = any(op == 'D' for parent in parents for op in latest.get(parent, {}).values())
+            for parent in parents:
+                parent_ids = [row_id for row_id, op in latest.get(parent, {}).items() if op != 'I']
+                for dependent in DEPENDENT_TABLES[parent]:
+                    if snapshot or dependent not in tables:
+                        continue
+                    for i in range(0, len(parent_ids), SYNC_BATCH_SIZE):
+                        batch = parent_ids[i:i + SYNC_BATCH_SIZE]
+                        cursor.execute(DEPENDENT_ROW_IDS[(parent, dependent)].format(
+                            ids=", ".join("?" * len(batch))), batch)
+                        for (row_id,) in cursor.fetchall():
+                            latest.setdefault(dependent, {}).setdefault(row_id, 'U')
+
+            for table, ops in latest.items():
+                if snapshot or table not in tables:
+                    continue
+                query, id_column, _, formatter = TABLE_ROW_QUERIES[table]
+                live = [row_id for row_id, op in ops.items() if op != 'D']
+                upserts = []
+                for i in range(0, len(live), SYNC_BATCH_SIZE):
+                    batch = live[i:i + SYNC_BATCH_SIZE]
+                    cursor.execute(f'{query} WHERE {id_column} IN ({", ".join("?" * len(batch))})', batch)
+                    upserts.extend(formatter(row) for row in cursor.fetchall())
+                # Rows the read query no longer returns are deletes for the client
+                found = {row['id'] for row in upserts}
+                changes[table] = {'upserts': upserts, 'deletes': [row_id for row_id in ops if row_id not in found]}
+        if snapshot:
+            changes = {}
+            for table in tables:
+                query, _, order_by, formatter = TABLE_ROW_QUERIES[table]
+                cursor.execute(f'{query} ORDER BY {order_by}')
+                changes[table] = {'upserts': [formatter(row) for row in cursor.fetchall()], 'deletes': []}
+    finally:
+        cursor.execute('COMMIT')
+        conn.close()
+
+    return jsonify(success=True, mode='snapshot' if snapshot else 'delta', since=since, seq=seq, changes=changes)
+
+# ==================== CONDITIONAL REQUESTS ====================
+
+def table_versions(cursor, tables):
+    """Version of each table: the journal seq of its latest change.
+
+    A table with no entries left in the journal reports the point the journal
+    was pruned to, so its version still moves forward after a prune.
+    """
+    cursor.execute('SELECT MIN(seq) FROM change_journal')
+    oldest = cursor.fetchone()[0]
+    floor = oldest - 1 if oldest is not None else current_change_seq(cursor)
+    versions = []
+    for table in tables:
+        cursor.execute('SELECT MAX(seq) FROM change_journal WHERE table_name = ?', (table,))
+        version = cursor.fetchone()[0]
+        versions.append(version if version is not None else floor)
+    return versions
+
+def conditional(*tables):
+    """Tag a read endpoint's response with an ETag built from the versions of
+    `tables` and answer 304 Not Modified when the client's copy is current.
+
+    The versions are read before the view runs, so a change committed in
+    between can only make the tag older than the body, never newer.
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            data = request.get_json(silent=True) or {}
+            if not _verify_admin(data.get('password', '')):
+                # Let the view produce its usual error
+                return view(*args, **kwargs)
+
+            conn = sqlite3.connect('attendance.db')
+            versions = table_versions(conn.cursor(), tables)
+            conn.close()
+            etag = f"{request.endpoint}-{'-'.join(str(v) for v in versions)}"
+
+            if request.if_none_match.contains(etag):
+                response = app.response_class(status=304)
+            else:
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+            response.set_etag(etag)
+            response.headers['Cache-Control'] = 'no-cache'
+            return response
+        return wrapper
+    return decorator
+
+# ==================== RESULT CACHE ====================
+
+RESULT_CACHE_ENTRIES = 32
+RESULT_CACHE_MAX_BYTES = 64 * 1024 * 1024
+# Reports without explicit dates default to "now", so entries also expire
+RESULT_CACHE_TTL = 300
+
+class ResultCache:
+    """In-memory LRU cache of endpoint responses with a TTL.
+
+    Keys include the versions of the tables a result was computed from, so a
+    write to any of them makes the old entry unreachable; it then ages out.
+    """
+
+    def __init__(self, max_entries=RESULT_CACHE_ENTRIES, max_bytes=RESULT_CACHE_MAX_BYTES, ttl=RESULT_CACHE_TTL):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._entries = collections.OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'evictions': 0, 'expirations': 0}
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._stats['misses'] += 1
+                return None
+            stored_at, value, size = entry
+            if time.monotonic() - stored_at > self.ttl:
+                self._remove(key)
+                self._stats['expirations'] += 1
+                self._stats['misses'] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._stats['hits'] += 1
+            return value
+
+    def put(self, key, value, size):
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (time.monotonic(), value, size)
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self._stats['evictions'] += 1
+
+    def _remove(self, key):
+        self._bytes -= self._entries.pop(key)[2]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats, entries=len(self._entries), bytes=self._bytes)
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = round(stats['hits'] / lookups, 3) if lookups else 0.0
+        return stats
+
+result_cache = ResultCache()
+
+def _normalize_params(data):
+    """Request parameters without the password, in a canonical form for cache keys"""
+    params = {}
+    for key, value in data.items():
+        if key == 'password':
+            continue
+        if isinstance(value, str):
+            value = value.strip() or None
+        elif isinstance(value, list):
+            value = sorted(value, key=str)
+        # Missing, empty and false parameters mean the same to the endpoints
+        if value in (None, [], False):
+            continue
+        params[key] = value
+    return json.dumps(params, sort_keys=True, default=str)
+
+def cached_result(*tables):
+    """Serve repeated requests for the same endpoint and parameters from
+    result_cache until one of `tables` is written to (or the entry expires)."""
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            data = request.get_json(silent=True) or {}
+            if not _verify_admin(data.get('password', '')):
+                return view(*args, **kwargs)
+
+            conn = sqlite3.connect('attendance.db')
+            versions = tuple(table_versions(conn.cursor(), tables))
+            conn.close()
+            key = (request.endpoint, _normalize_params(data), versions)
+
+            cached = result_cache.get(key)
+            if cached is not None:
+                body, mimetype = cached
+                return app.response_class(body, mimetype=mimetype)
+
+            response = make_response(view(*args, **kwargs))
+            if response.status_code == 200 and (response.get_json(silent=True) or {}).get('success'):
+                body = response.get_data()
+                result_cache.put(key, (body, response.mimetype), len(body))
+            return response
+        return wrapper
+    return decorator
+
+# ==================== RESPONSE COMPRESSION ====================
+
+# Bodies smaller than this are sent as-is; compressing them saves little
+COMPRESS_MIN_BYTES = 1024
+COMPRESS_MIMETYPES = ('application/json', 'text/plain', 'text/csv')
+# Server preference when the client accepts several encodings equally
+COMPRESS_PREFERENCE = ('zstd', 'br', 'gzip')
+
+_compressors = None
+
+def _get_compressors():
+    """gzip always; zstd and brotli when the optional packages are installed"""
+    global _compressors
+    if _compressors is None:
+        compressors = {'gzip': lambda data: gzip.compress(data, compresslevel=6)}
+        try:
+            import zstandard
+            compressors['zstd'] = lambda data: zstandard.ZstdCompressor(level=3).compress(data)
+        except ImportError:
+            pass
+        try:
+            import brotli
+            compressors['br'] = lambda data: brotli.compress(data, quality=5)
+        except ImportError:
+            pass
+        _compressors = compressors
+    return _compressors
+
+@app.after_request
+def compress_response(response):
+    if (response.status_code != 200 or response.direct_passthrough or response.is_streamed
+            or 'Content-Encoding' in response.headers or response.mimetype not in COMPRESS_MIMETYPES):
+        return response
+    data = response.get_data()
+    if len(data) < COMPRESS_MIN_BYTES:
+        return response
+    response.vary.add('Accept-Encoding')
+    compressors = _get_compressors()
+    encoding = request.accept_encodings.best_match([e for e in COMPRESS_PREFERENCE if e in compressors])
+    if encoding:
+        response.set_data(compressors[encoding](data))
+        response.headers['Content-Encoding'] = encoding
+    return response
+
+def _wants_columnar(data):
+    """Clients ask for the compact row format with format=columnar (query string or JSON body)"""
+    return request.args.get('format', (data or {}).get('format')) == 'columnar'
+
+def _rows_payload(rows, columnar):
+    """A list of row dicts, or {'columns': [...], 'rows': [[...], ...]} in the columnar format"""
+    if not columnar:
+        return rows
+    columns = list(rows[0]) if rows else []
+    return {'columns': columns, 'rows': [[row[column] for column in columns] for row in rows]}
 
 # ================================
 # CRM ADMIN ENDPOINTS
 # ================================
 
+# Leads per crm_get_leads page, unless the request asks for fewer
+CRM_LEADS_PAGE_SIZE = 200
+CRM_LEADS_MAX_PAGE_SIZE = 1000
+# Sort keys crm_get_leads accepts; each has an index ending in id
+CRM_LEAD_SORTS = ('created_at', 'name', 'id')
+
+def _encode_cursor(values):
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+def _decode_cursor(cursor_token):
+    values = json.loads(base64.urlsafe_b64decode(str(cursor_token).encode()))
+    if not isinstance(values, list) or len(values) != 2:
+        raise ValueError("Invalid cursor")
+    return values
+
+def _utc_text(day):
+    """created_at text (UTC, as CURRENT_TIMESTAMP writes it) of a site-local midnight"""
+    return datetime.fromtimestamp(timeutil.to_epoch(day), timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+
 @app.route('/api/crm_get_leads', methods=['POST'])
 def crm_get_leads():
+    """One page of leads, filtered and sorted on the server.
+
+    Filters: status, target, assigned_to (exact), phone_prefix, created_from
+    and created_to (inclusive YYYY-MM-DD). sort is one of CRM_LEAD_SORTS,
+    order 'desc' (default) or 'asc'. Pass the returned next_cursor back to
+    get the following page; it is null on the last one. The first page also
+    carries the total number of matching leads.
+    """
     data = request.get_json() or {}
     if not _verify_admin(data.get('password', '')):
         return jsonify(success=False, message="Unauthorized"), 401
 
+    sort = data.get('sort') or 'created_at'
+    descending = str(data.get('order') or 'desc').lower() != 'asc'
+    if sort not in CRM_LEAD_SORTS:
+        return jsonify(success=False, message=f"sort must be one of {', '.join(CRM_LEAD_SORTS)}"), 400
+    try:
+        limit = min(max(int(data.get('limit') or CRM_LEADS_PAGE_SIZE), 1), CRM_LEADS_MAX_PAGE_SIZE)
+    except (TypeError, ValueError):
+        return jsonify(success=False, message="limit must be a number"), 400
+
+    where, params = [], []
+    for field in ('status', 'target', 'assigned_to'):
+        if data.get(field):
+            where.append(f"l.{field} = ?")
+            params.append(data[field])
+    phone_prefix = str(data.get('phone_prefix') or '').strip()
+    if phone_prefix:
+        # A range rather than LIKE, so the phone index is used
+        where.append("l.phone >= ? AND l.phone < ?")
+        params.extend([phone_prefix, phone_prefix[:-1] + chr(ord(phone_prefix[-1]) + 1)])
+    try:
+        if data.get('created_from'):
+            where.append("l.created_at >= ?")
+            params.append(_utc_text(timeutil.parse_date(data['created_from'])))
+        if data.get('created_to'):
+            where.append("l.created_at < ?")
+            params.append(_utc_text(timeutil.parse_date(data['created_to']) + timedelta(days=1)))
+    except ValueError:
+        return jsonify(success=False, message="Invalid date format, expected YYYY-MM-DD"), 400
+
     conn = get_db()
     c = conn.cursor()
-    c.execute("""
+    total = None
+    if not data.get('cursor'):
+        c.execute(f"SELECT COUNT(*) FROM crm_leads l WHERE {' AND '.join(where) or '1'}", params)
+        total = c.fetchone()[0]
+    else:
+        try:
+            after = _decode_cursor(data['cursor'])
+        except ValueError:
+            conn.close()
+            return jsonify(success=False, message="Invalid cursor"), 400
+        # Keyset: continue after the last row of the previous page
+        if sort == 'id':
+            where.append(f"l.id {'<' if descending else '>'} ?")
+            params.append(after[-1])
+        else:
+            where.append(f"(l.{sort}, l.id) {'<' if descending else '>'} (?, ?)")
+            params.extend(after)
+
+    direction = 'DESC' if descending else 'ASC'
+    order_by = f"l.id {direction}" if sort == 'id' else f"l.{sort} {direction}, l.id {direction}"
+    c.execute(f"""
         SELECT l.*, s.name as staff_name 
         FROM crm_leads l 
         LEFT JOIN staff s ON l.assigned_to = s.staff_code 
-        ORDER BY l.created_at DESC
-    """)
+        WHERE {' AND '.join(where) or '1'}
+        ORDER BY {order_by}
+        LIMIT ?
+    """, params + [limit + 1])
     leads = [dict(row) for row in c.fetchall()]
     conn.close()
-    return jsonify(success=True, leads=leads)
+
+    next_cursor = None
+    if len(leads) > limit:
+        leads = leads[:limit]
+        next_cursor = _encode_cursor([leads[-1][sort], leads[-1]['id']])
+    return jsonify(success=True, leads=_rows_payload(leads, _wants_columnar(data)),
+                   next_cursor=next_cursor, total=total)
 
 
 @app.route('/api/crm_get_lead', methods=['POST'])
@@ -354,7 +1371,116 @@ def crm_update_target():
     return jsonify(success=True, message="Target updated")
 
 
+# Leads or lead ids accepted by one batch request
+MAX_BULK_LEADS = 10000
+# Fields crm_bulk_update can set on many leads at once
+BULK_LEAD_FIELDS = ('status', 'assigned_to', 'target')
+
+def _bulk_lead_ids(data):
+    """Deduplicated int lead ids from data['lead_ids'], or None if invalid"""
+    lead_ids = data.get('lead_ids')
+    if not isinstance(lead_ids, list) or not lead_ids or len(lead_ids) > MAX_BULK_LEADS:
+        return None
+    try:
+        return sorted({int(lead_id) for lead_id in lead_ids})
+    except (TypeError, ValueError):
+        return None
+
+
+@app.route('/api/crm_add_leads', methods=['POST'])
+def crm_add_leads():
+    """Add many leads in one transaction; rows without a name are skipped
+    and listed in "errors" by index"""
+    data = request.get_json() or {}
+    if not _verify_admin(data.get('password', '')):
+        return jsonify(success=False, message="Unauthorized"), 401
+
+    leads = data.get('leads')
+    if not isinstance(leads, list) or not leads:
+        return jsonify(success=False, message="leads required"), 400
+    if len(leads) > MAX_BULK_LEADS:
+        return jsonify(success=False, message=f"At most {MAX_BULK_LEADS} leads per request"), 400
+
+    rows, errors = [], []
+    for index, lead in enumerate(leads):
+        if not isinstance(lead, dict) or not str(lead.get('name') or '').strip():
+            errors.append({"row": index, "message": "Missing name"})
+            continue
+        rows.append((str(lead['name']).strip(), lead.get('phone') or None, lead.get('status') or 'New',
+                     lead.get('target') or None, lead.get('assigned_to') or None, lead.get('notes') or None))
+
+    conn = get_db()
+    c = conn.cursor()
+    # New targets join the master list, as with crm_update_target
+    c.executemany("INSERT OR IGNORE INTO crm_targets (name) VALUES (?)",
+                  [(target,) for target in sorted({row[3] for row in rows if row[3]})])
+    c.executemany("""
+        INSERT INTO crm_leads 
+        (name, phone, status, target, assigned_to, notes)
+        VALUES (?, ?, ?, ?, ?, ?)
+    """, rows)
+    conn.commit()
+    conn.close()
+    return jsonify(success=True, added=len(rows), errors=errors,
+                   message=f"{len(rows)} leads added, {len(errors)} rows rejected")
+
+
+@app.route('/api/crm_bulk_update', methods=['POST'])
+def crm_bulk_update():
+    """Set status, assigned_to and/or target on every lead in lead_ids.
+
+    Takes {"password", "lead_ids": [...], "changes": {"status": ...}}; an
+    empty assigned_to or target clears it.
+    """
+    data = request.get_json() or {}
+    if not _verify_admin(data.get('password', '')):
+        return jsonify(success=False, message="Unauthorized"), 401
+
+    lead_ids = _bulk_lead_ids(data)
+    changes = data.get('changes')
+    if lead_ids is None or not isinstance(changes, dict):
+        return jsonify(success=False, message="lead_ids and changes required"), 400
+    fields = [field for field in BULK_LEAD_FIELDS if field in changes]
+    unknown = set(changes) - set(BULK_LEAD_FIELDS)
+    if not fields or unknown:
+        return jsonify(success=False, message=f"changes may only set {', '.join(BULK_LEAD_FIELDS)}"), 400
+    values = [changes[field] or None for field in fields]
+    if 'status' in fields and not changes['status']:
+        return jsonify(success=False, message="status cannot be empty"), 400
+
+    conn = get_db()
+    c = conn.cursor()
+    if changes.get('target'):
+        c.execute("INSERT OR IGNORE INTO crm_targets (name) VALUES (?)", (changes['target'],))
+    c.executemany(f"UPDATE crm_leads SET {', '.join(f'{field} = ?' for field in fields)} WHERE id = ?",
+                  [values + [lead_id] for lead_id in lead_ids])
+    updated = c.rowcount
+    conn.commit()
+    conn.close()
+    return jsonify(success=True, updated=updated, message=f"{updated} leads updated")
+
+
+@app.route('/api/crm_delete_leads', methods=['POST'])
+def crm_delete_leads():
+    data = request.get_json() or {}
+    if not _verify_admin(data.get('password', '')):
+        return jsonify(success=False, message="Unauthorized"), 401
+
+    lead_ids = _bulk_lead_ids(data)
+    if lead_ids is None:
+        return jsonify(success=False, message="lead_ids required"), 400
+
+    conn = get_db()
+    c = conn.cursor()
+    c.executemany("DELETE FROM crm_leads WHERE id = ?", [(lead_id,) for lead_id in lead_ids])
+    deleted = c.rowcount
+    conn.commit()
+    conn.close()
+    return jsonify(success=True, deleted=deleted, message=f"{deleted} leads deleted")
+
+
 @app.route('/api/crm_get_targets', methods=['POST'])
+@conditional('crm_targets')
 def crm_get_targets():
     data = request.get_json() or {}
     if not _verify_admin(data.get('password', '')):
@@ -379,7 +1505,7 @@ def get_active_session():
     cursor.execute('''
     SELECT * FROM attendance 
     WHERE staff_code = ? AND clock_out IS NULL
-    ORDER BY clock_in DESC LIMIT 1
+    ORDER BY clock_in_ts DESC LIMIT 1
     ''', (staff_code,))
     active_session = cursor.fetchone()
     
@@ -416,7 +1542,7 @@ def clock_in():
     cursor.execute('''
     SELECT * FROM attendance 
     WHERE staff_code = ? AND clock_out IS NULL
-    ORDER BY clock_in DESC LIMIT 1
+    ORDER BY clock_in_ts DESC LIMIT 1
     ''', (staff_code,))
     active_session = cursor.fetchone()
     
@@ -428,7 +1554,7 @@ def clock_in():
     cursor.execute('''
     INSERT INTO attendance (staff_code, clock_in, session_type)
     VALUES (?, ?, ?)
-    ''', (staff_code, datetime.now(), 'work'))
+    ''', (staff_code, timeutil.now_storage(), 'work'))
     
     conn.commit()
     conn.close()
@@ -449,7 +1575,7 @@ def clock_out():
     cursor.execute('''
     SELECT * FROM attendance 
     WHERE staff_code = ? AND clock_out IS NULL
-    ORDER BY clock_in DESC LIMIT 1
+    ORDER BY clock_in_ts DESC LIMIT 1
     ''', (staff_code,))
     active_session = cursor.fetchone()
     
@@ -462,7 +1588,7 @@ def clock_out():
     UPDATE attendance 
     SET clock_out = ?, notes = ?
     WHERE id = ?
-    ''', (datetime.now(), notes, active_session[0]))
+    ''', (timeutil.now_storage(), notes, active_session[0]))
     
     conn.commit()
     conn.close()
@@ -483,13 +1609,13 @@ def clock_break():
     UPDATE attendance 
     SET clock_out = ?
     WHERE staff_code = ? AND clock_out IS NULL AND session_type = 'work'
-    ''', (datetime.now(), staff_code))
+    ''', (timeutil.now_storage(), staff_code))
     
     # Start a new 'break' session
     cursor.execute('''
     INSERT INTO attendance (staff_code, clock_in, session_type)
     VALUES (?, ?, ?)
-    ''', (staff_code, datetime.now(), 'break'))
+    ''', (staff_code, timeutil.now_storage(), 'break'))
     
     conn.commit()
     conn.close()
@@ -510,13 +1636,13 @@ def clock_return_from_break():
     UPDATE attendance 
     SET clock_out = ?
     WHERE staff_code = ? AND clock_out IS NULL AND session_type = 'break'
-    ''', (datetime.now(), staff_code))
+    ''', (timeutil.now_storage(), staff_code))
     
     # Start a new 'work' session
     cursor.execute('''
     INSERT INTO attendance (staff_code, clock_in, session_type)
     VALUES (?, ?, ?)
-    ''', (staff_code, datetime.now(), 'work'))
+    ''', (staff_code, timeutil.now_storage(), 'work'))
     
     conn.commit()
     conn.close()
@@ -546,6 +1672,24 @@ def admin_login():
     else:
         return jsonify({"success": False, "message": "Invalid password"})
 
+def _format_attendance_record(record):
+    """(id, staff_code, name, clock_in, clock_out, notes, hourly_rate, session_type,
+    clock_in_ts, clock_out_ts) -> response dict, times in the site timezone"""
+    hours = (record[9] - record[8]) / 3600 if record[4] else 0
+    
+    return {
+        'id': record[0],
+        'staff_code': record[1],
+        'name': record[2],
+        'clock_in': timeutil.format_local(record[8]),
+        'clock_out': timeutil.format_local(record[9]) if record[4] else 'Active',
+        'notes': record[5],
+        'hours': round(hours, 2),
+        'hourly_rate': record[6] if record[6] else 0,
+        'earnings': round(hours * (record[6] if record[6] else 0), 2) if record[7] == 'work' else 0,
+        'session_type': record[7]
+    }
+
 # Get attendance data with date range
 @app.route('/api/get_attendance', methods=['POST'])
 def get_attendance():
@@ -569,88 +1713,66 @@ def get_attendance():
         return jsonify({"success": False, "message": "Invalid password"})
     
     # Parse dates
-    if start_date:
-        start_date = parser.parse(start_date)
-    else:
-        start_date = datetime(1970, 1, 1)
-    
-    if end_date:
-        end_date = parser.parse(end_date)
+    try:
+        start_date = timeutil.parse_date(start_date) if start_date else datetime(1970, 1, 1)
         # Add one day to include the end date
-        end_date = end_date + timedelta(days=1)
-    else:
-        end_date = datetime.now()
+        end_date = timeutil.parse_date(end_date) + timedelta(days=1) if end_date else timeutil.now()
+    except ValueError:
+        conn.close()
+        return jsonify({"success": False, "message": "Invalid date format, expected YYYY-MM-DD"})
+    
+    # Archived history is only read when explicitly requested
+    attendance_table = 'attendance'
+    if data.get('include_archived'):
+        conn.close()
+        try:
+            conn = get_db_with_archives(start_date, end_date)
+        except ValueError as e:
+            return jsonify({"success": False, "message": str(e)})
+        cursor = conn.cursor()
+        attendance_table = 'attendance_all'
     
     # Get attendance data
-    cursor.execute('''
-    SELECT a.id, a.staff_code, s.name, a.clock_in, a.clock_out, a.notes, s.hourly_rate, a.session_type
-    FROM attendance a
+    cursor.execute(f'''
+    SELECT a.id, a.staff_code, s.name, a.clock_in, a.clock_out, a.notes, s.hourly_rate, a.session_type,
+           a.clock_in_ts, a.clock_out_ts
+    FROM {attendance_table} a
     JOIN staff s ON a.staff_code = s.staff_code
-    WHERE a.clock_in >= ? AND a.clock_in < ?
-    ORDER BY a.clock_in DESC
-    ''', (start_date, end_date))
+    WHERE a.clock_in_ts >= ? AND a.clock_in_ts < ?
+    ORDER BY a.clock_in_ts DESC
+    ''', (timeutil.to_epoch(start_date), timeutil.to_epoch(end_date)))
     
     attendance_data = cursor.fetchall()
     
-    # Calculate total hours and earnings for each staff member
-    staff_summary = {}
-    for record in attendance_data:
-        staff_code = record[1]
-        name = record[2]
-        clock_in = datetime.fromisoformat(record[3])
-        clock_out = datetime.fromisoformat(record[4]) if record[4] else datetime.now()
-        hourly_rate = record[6] if record[6] else 0
-        session_type = record[7]
-
-        hours = (clock_out - clock_in).total_seconds() / 3600
-        
-        # Only calculate earnings for 'work' sessions
-        if session_type == 'work':
-            earnings = hours * hourly_rate
-        else:
-            earnings = 0
-        
-        if staff_code not in staff_summary:
-            staff_summary[staff_code] = {
-                'name': name,
-                'total_hours': 0,
-                'total_earnings': 0,
-                'hourly_rate': hourly_rate
-            }
-        
-        staff_summary[staff_code]['total_hours'] += hours
-        staff_summary[staff_code]['total_earnings'] += earnings
+    # Pay per session and per staff member, with overtime, holidays and leave
+    import payroll
+    session_pay, _, payroll_summary = payroll.run(conn, start_date, end_date, attendance_table=attendance_table)
     
     conn.close()
     
+    staff_summary = {}
+    for row in payroll_summary.to_dict('records'):
+        staff_code = row.pop('staff_code')
+        row['total_earnings'] = row.pop('total_pay')
+        staff_summary[staff_code] = row
+    
     # Format data for response
+    pay_by_id = dict(zip(session_pay['id'], session_pay['pay'].round(2)))
     formatted_data = []
     for record in attendance_data:
-        clock_in = datetime.fromisoformat(record[3])
-        clock_out = datetime.fromisoformat(record[4]) if record[4] else None
-        hours = (clock_out - clock_in).total_seconds() / 3600 if clock_out else 0
-        
-        formatted_data.append({
-            'id': record[0],
-            'staff_code': record[1],
-            'name': record[2],
-            'clock_in': record[3],
-            'clock_out': record[4] if record[4] else 'Active',
-            'notes': record[5],
-            'hours': round(hours, 2),
-            'hourly_rate': record[6] if record[6] else 0,
-            'earnings': round(hours * (record[6] if record[6] else 0), 2) if record[7] == 'work' else 0,
-            'session_type': record[7]
-        })
+        formatted = _format_attendance_record(record)
+        formatted['earnings'] = float(pay_by_id.get(record[0], formatted['earnings']))
+        formatted_data.append(formatted)
     
     return jsonify({
         "success": True,
-        "data": formatted_data,
+        "data": _rows_payload(formatted_data, _wants_columnar(data)),
         "summary": staff_summary
     })
 
 # Get analytics data
 @app.route('/api/get_analytics', methods=['POST'])
+@cached_result('attendance', 'staff', 'shifts', 'holidays', 'leave_requests', 'admin_settings')
 def get_analytics():
     data = request.json
     password = data.get('password')
@@ -672,54 +1794,77 @@ def get_analytics():
         return jsonify({"success": False, "message": "Invalid password"})
     
     # Parse dates
-    if start_date:
-        start_date = parser.parse(start_date)
-    else:
-        start_date = datetime.now() - timedelta(days=30)
-    
-    if end_date:
-        end_date = parser.parse(end_date)
+    try:
+        start_date = timeutil.parse_date(start_date) if start_date else timeutil.now() - timedelta(days=30)
         # Add one day to include the end date
-        end_date = end_date + timedelta(days=1)
-    else:
-        end_date = datetime.now()
+        end_date = timeutil.parse_date(end_date) + timedelta(days=1) if end_date else timeutil.now()
+    except ValueError:
+        conn.close()
+        return jsonify({"success": False, "message": "Invalid date format, expected YYYY-MM-DD"})
     
-    # Get daily attendance data
+    # Get daily attendance data. Site-local days are not all 86400 seconds
+    # long, but every UTC offset is a whole number of quarter hours, so
+    # quarter-hour counts add up exactly into local days.
     cursor.execute('''
-    SELECT DATE(clock_in) as date, COUNT(*) as count
+    SELECT clock_in_ts / 900 * 900 as quarter, COUNT(*) as count
     FROM attendance
-    WHERE clock_in >= ? AND clock_in < ?
-    GROUP BY DATE(clock_in)
-    ORDER BY date
-    ''', (start_date, end_date))
-    
-    daily_data = cursor.fetchall()
+    WHERE clock_in_ts >= ? AND clock_in_ts < ?
+    GROUP BY quarter
+    ORDER BY quarter
+    ''', (timeutil.to_epoch(start_date), timeutil.to_epoch(end_date)))
+    quarters = cursor.fetchall()
+    
+    daily_data = []
+    if quarters:
+        days = timeutil.day_starts(timeutil.from_epoch(quarters[0][0]).date(),
+                                   timeutil.from_epoch(quarters[-1][0]).date())
+        starts = [quarter for quarter, _ in quarters]
+        totals = [0]
+        for _, count in quarters:
+            totals.append(totals[-1] + count)
+        for (day, day_start), (_, next_start) in zip(days, days[1:]):
+            count = totals[bisect.bisect_left(starts, next_start)] - totals[bisect.bisect_left(starts, day_start)]
+            if count:
+                daily_data.append((day.isoformat(), count))
     
     # Get staff attendance summary
     cursor.execute('''
     SELECT s.staff_code, s.name, COUNT(a.id) as days, 
            SUM(CASE WHEN a.session_type = 'work' THEN 
-               (julianday(a.clock_out) - julianday(a.clock_in)) * 24 
+               (a.clock_out_ts - a.clock_in_ts) / 3600.0 
                ELSE 0 END) as total_hours
     FROM staff s
     LEFT JOIN attendance a ON s.staff_code = a.staff_code
-    WHERE a.clock_in >= ? AND a.clock_in < ?
+    WHERE a.clock_in_ts >= ? AND a.clock_in_ts < ?
     GROUP BY s.staff_code, s.name
     ORDER BY total_hours DESC
-    ''', (start_date, end_date))
+    ''', (timeutil.to_epoch(start_date), timeutil.to_epoch(end_date)))
     
     staff_data = cursor.fetchall()
     
+    import payroll
+    _, _, payroll_summary = payroll.run(conn, start_date, end_date)
+    
     conn.close()
     
     return jsonify({
         "success": True,
         "daily_data": daily_data,
-        "staff_data": staff_data
+        "staff_data": staff_data,
+        "payroll": payroll_summary.to_dict('records')
     })
 
+def _format_shift_record(record):
+    return {
+        'id': record[0],
+        'name': record[1],
+        'start_time': record[2],
+        'end_time': record[3]
+    }
+
 # Get shifts
 @app.route('/api/get_shifts', methods=['POST'])
+@conditional('shifts')
 def get_shifts():
     data = request.json
     password = data.get('password')
@@ -745,14 +1890,7 @@ def get_shifts():
     conn.close()
     
     # Format data for response
-    formatted_data = []
-    for record in shifts_data:
-        formatted_data.append({
-            'id': record[0],
-            'name': record[1],
-            'start_time': record[2],
-            'end_time': record[3]
-        })
+    formatted_data = [_format_shift_record(record) for record in shifts_data]
     
     return jsonify({
         "success": True,
@@ -788,14 +1926,23 @@ def add_shift():
     VALUES (?, ?, ?)
     ''', (name, start_time, end_time))
     
+    log_admin_action(password, f"Added new shift: {name}", conn=conn)
     conn.commit()
     conn.close()
     
-    log_admin_action(password, f"Added new shift: {name}")
     return jsonify({"success": True, "message": "Shift added successfully"})
 
+def _format_holiday_record(record):
+    return {
+        'id': record[0],
+        'date': record[1],
+        'name': record[2],
+        'paid': bool(record[3])
+    }
+
 # Get holidays
 @app.route('/api/get_holidays', methods=['POST'])
+@conditional('holidays')
 def get_holidays():
     data = request.json
     password = data.get('password')
@@ -821,14 +1968,7 @@ def get_holidays():
     conn.close()
     
     # Format data for response
-    formatted_data = []
-    for record in holidays_data:
-        formatted_data.append({
-            'id': record[0],
-            'date': record[1],
-            'name': record[2],
-            'paid': bool(record[3])
-        })
+    formatted_data = [_format_holiday_record(record) for record in holidays_data]
     
     return jsonify({
         "success": True,
@@ -864,14 +2004,28 @@ def add_holiday():
     VALUES (?, ?, ?)
     ''', (date, name, paid))
     
+    log_admin_action(password, f"Added new holiday: {name} on {date}", conn=conn)
     conn.commit()
     conn.close()
     
-    log_admin_action(password, f"Added new holiday: {name} on {date}")
     return jsonify({"success": True, "message": "Holiday added successfully"})
 
+def _format_leave_record(record):
+    return {
+        'id': record[0],
+        'staff_code': record[1],
+        'name': record[2],
+        'start_date': record[3],
+        'end_date': record[4],
+        'reason': record[5],
+        'status': record[6],
+        'approved_by': record[7],
+        'approval_date': record[8]
+    }
+
 # Get leave requests
 @app.route('/api/get_leave_requests', methods=['POST'])
+@conditional('leave_requests', 'staff')
 def get_leave_requests():
     data = request.json
     password = data.get('password')
@@ -902,19 +2056,7 @@ def get_leave_requests():
     conn.close()
     
     # Format data for response
-    formatted_data = []
-    for record in leave_data:
-        formatted_data.append({
-            'id': record[0],
-            'staff_code': record[1],
-            'name': record[2],
-            'start_date': record[3],
-            'end_date': record[4],
-            'reason': record[5],
-            'status': record[6],
-            'approved_by': record[7],
-            'approval_date': record[8]
-        })
+    formatted_data = [_format_leave_record(record) for record in leave_data]
     
     return jsonify({
         "success": True,
@@ -995,15 +2137,15 @@ def update_leave_request():
     UPDATE leave_requests 
     SET status = ?, approved_by = ?, approval_date = ?
     WHERE id = ?
-    ''', (status, "admin", datetime.now().strftime('%Y-%m-%d %H:%M:%S'), request_id))
-    
-    conn.commit()
-    conn.close()
+    ''', (status, "admin", timeutil.now_storage(), request_id))
     
     # Log the action
     log_details = f"Leave request {status} for {request_data[1]} ({request_data[0]}) "
     log_details += f"from {request_data[2]} to {request_data[3]}"
-    log_admin_action(password, log_details)
+    log_admin_action(password, log_details, conn=conn)
+    
+    conn.commit()
+    conn.close()
     
     return jsonify({"success": True, "message": f"Leave request {status} successfully"})
 
@@ -1025,7 +2167,14 @@ def edit_attendance():
     if not all([password, record_id]):
         return jsonify({"success": False, "message": "Missing required fields"})
 
-    # Verify admin password
+    # Times typed in by the admin are site-local unless they carry an offset
+    try:
+        new_clock_in = timeutil.to_storage(new_clock_in) if new_clock_in else new_clock_in
+        new_clock_out = timeutil.to_storage(new_clock_out) if new_clock_out else new_clock_out
+    except ValueError:
+        return jsonify({"success": False, "message": "Invalid date format, expected YYYY-MM-DD HH:MM:SS"})
+
+    # Verify admin password
     hashed_password = hashlib.sha256(password.encode()).hexdigest()
     conn = sqlite3.connect('attendance.db')
     cursor = conn.cursor()
@@ -1050,14 +2199,14 @@ def edit_attendance():
     WHERE id = ?
     ''', (new_clock_in, new_clock_out, record_id))
     
-    conn.commit()
-    conn.close()
-
     # Log the action
     log_details = f"Edited attendance record ID {record_id} for {original_data[0]}. "
     log_details += f"Clock-in changed from {original_data[1]} to {new_clock_in}. "
     log_details += f"Clock-out changed from {original_data[2]} to {new_clock_out}."
-    log_admin_action(password, log_details)
+    log_admin_action(password, log_details, conn=conn)
+
+    conn.commit()
+    conn.close()
 
     return jsonify({"success": True, "message": "Attendance record updated successfully"})
 
@@ -1072,6 +2221,11 @@ def close_open_session():
     if not all([password, staff_code, clock_out_time]):
         return jsonify({"success": False, "message": "Missing required fields"})
 
+    try:
+        clock_out_time = timeutil.to_storage(clock_out_time)
+    except ValueError:
+        return jsonify({"success": False, "message": "Invalid date format, expected YYYY-MM-DD HH:MM:SS"})
+
     # Verify admin password
     hashed_password = hashlib.sha256(password.encode()).hexdigest()
     conn = sqlite3.connect('attendance.db')
@@ -1087,7 +2241,7 @@ def close_open_session():
     cursor.execute('''
     SELECT id, clock_in FROM attendance 
     WHERE staff_code = ? AND clock_out IS NULL
-    ORDER BY clock_in DESC LIMIT 1
+    ORDER BY clock_in_ts DESC LIMIT 1
     ''', (staff_code,))
     open_session = cursor.fetchone()
 
@@ -1102,18 +2256,31 @@ def close_open_session():
     WHERE id = ?
     ''', (clock_out_time, open_session[0]))
     
-    conn.commit()
-    conn.close()
-
     # Log the action
     log_details = f"Manually closed open session for {staff_code}. "
     log_details += f"Session ID {open_session[0]} clocked out at {clock_out_time}."
-    log_admin_action(password, log_details)
+    log_admin_action(password, log_details, conn=conn)
+
+    conn.commit()
+    conn.close()
 
     return jsonify({"success": True, "message": "Open session closed successfully"})
 
+# Shift name get_staff reports for staff without one
+NO_SHIFT = "No Shift"
+
+def _format_staff_record(record):
+    return {
+        'id': record[0],
+        'staff_code': record[1],
+        'name': record[2],
+        'hourly_rate': record[3],
+        'shift_name': record[4] if record[4] else NO_SHIFT
+    }
+
 # Get staff list
 @app.route('/api/get_staff', methods=['POST'])
+@conditional('staff', 'shifts')
 def get_staff():
     data = request.json
     password = data.get('password')
@@ -1143,15 +2310,7 @@ def get_staff():
     conn.close()
     
     # Format data for response
-    formatted_data = []
-    for record in staff_data:
-        formatted_data.append({
-            'id': record[0],
-            'staff_code': record[1],
-            'name': record[2],
-            'hourly_rate': record[3],
-            'shift_name': record[4] if record[4] else "No Shift"
-        })
+    formatted_data = [_format_staff_record(record) for record in staff_data]
     
     return jsonify({
         "success": True,
@@ -1166,7 +2325,6 @@ def add_staff():
     staff_code = data.get('staff_code')
     name = data.get('name')
     hourly_rate = data.get('hourly_rate', 0)
-    shift_id = data.get('shift_id')
     
     if not password or not staff_code or not name:
         return jsonify({"success": False, "message": "Missing required fields"})
@@ -1188,16 +2346,22 @@ def add_staff():
         conn.close()
         return jsonify({"success": False, "message": "Staff code already exists"})
     
+    # The staff dialog sends the shift's name
+    shift_id, error = _resolve_shift(data, _shift_ids_by_name(cursor))
+    if error:
+        conn.close()
+        return jsonify({"success": False, "message": error})
+    
     # Add staff
     cursor.execute('''
     INSERT INTO staff (staff_code, name, hourly_rate, shift_id)
     VALUES (?, ?, ?, ?)
     ''', (staff_code, name, hourly_rate, shift_id))
     
+    log_admin_action(password, f"Added new staff member: {name} ({staff_code})", conn=conn)
     conn.commit()
     conn.close()
     
-    log_admin_action(password, f"Added new staff member: {name} ({staff_code})")
     return jsonify({"success": True, "message": "Staff added successfully"})
 
 # Update staff
@@ -1208,7 +2372,6 @@ def update_staff():
     staff_code = data.get('staff_code')
     name = data.get('name')
     hourly_rate = data.get('hourly_rate', 0)
-    shift_id = data.get('shift_id')
     
     if not password or not staff_code:
         return jsonify({"success": False, "message": "Missing required fields"})
@@ -1224,6 +2387,12 @@ def update_staff():
         conn.close()
         return jsonify({"success": False, "message": "Invalid password"})
     
+    # The staff dialog sends the shift's name
+    shift_id, error = _resolve_shift(data, _shift_ids_by_name(cursor))
+    if error:
+        conn.close()
+        return jsonify({"success": False, "message": error})
+    
     # Update staff
     if name:
         cursor.execute('''
@@ -1236,12 +2405,116 @@ def update_staff():
         WHERE staff_code = ?
         ''', (hourly_rate, shift_id, staff_code))
     
+    log_admin_action(password, f"Updated staff member: {staff_code}", conn=conn)
     conn.commit()
     conn.close()
     
-    log_admin_action(password, f"Updated staff member: {staff_code}")
     return jsonify({"success": True, "message": "Staff updated successfully"})
 
+def _shift_ids_by_name(cursor):
+    """{lower-cased shift name: id}, to resolve the shift names clients send"""
+    cursor.execute('SELECT id, name FROM shifts')
+    return {name.strip().lower(): shift_id for shift_id, name in cursor.fetchall() if name}
+
+def _resolve_shift(data, shift_ids):
+    """(shift_id, error) for a staff row carrying shift_id or shift_name; a
+    blank shift_name, or the "No Shift" get_staff reports, clears the shift"""
+    if data.get('shift_id') not in (None, ''):
+        try:
+            return int(data['shift_id']), None
+        except (TypeError, ValueError):
+            return None, f"Invalid shift_id {data['shift_id']!r}"
+    shift_name = str(data.get('shift_name') or '').strip()
+    if shift_name.lower() not in shift_ids and shift_name.lower() in ('', NO_SHIFT.lower()):
+        return None, None
+    if shift_name.lower() not in shift_ids:
+        return None, f"Unknown shift '{shift_name}'"
+    return shift_ids[shift_name.lower()], None
+
+# Rows accepted by one bulk_upsert_staff request
+MAX_BULK_STAFF_ROWS = 20000
+
+# Bulk add/update staff
+@app.route('/api/bulk_upsert_staff', methods=['POST'])
+def bulk_upsert_staff():
+    """Add or update many staff members in one transaction.
+
+    Takes {"password", "staff": [{staff_code, name, hourly_rate, shift_name
+    or shift_id}, ...]}. Existing staff keep any field a row leaves out.
+    Invalid rows are skipped and listed in "errors" with their index; with
+    "dry_run" nothing is written.
+    """
+    data = request.get_json() or {}
+    password = data.get('password')
+    rows = data.get('staff')
+    if not password or not isinstance(rows, list):
+        return jsonify({"success": False, "message": "Missing required fields"})
+    if len(rows) > MAX_BULK_STAFF_ROWS:
+        return jsonify({"success": False, "message": f"At most {MAX_BULK_STAFF_ROWS} staff per request"})
+    if not _verify_admin(password):
+        return jsonify({"success": False, "message": "Invalid password"})
+
+    conn = sqlite3.connect('attendance.db', timeout=30)
+    cursor = conn.cursor()
+    shift_ids = _shift_ids_by_name(cursor)
+    cursor.execute('SELECT staff_code, name, hourly_rate, shift_id FROM staff')
+    existing = {row[0]: row for row in cursor.fetchall()}
+
+    errors, upserts, seen = [], {}, set()
+    for index, row in enumerate(rows):
+        if not isinstance(row, dict):
+            errors.append({"row": index, "message": "Not an object"})
+            continue
+        staff_code = str(row.get('staff_code') or '').strip()
+        if not staff_code:
+            errors.append({"row": index, "message": "Missing staff_code"})
+            continue
+        if staff_code in seen:
+            errors.append({"row": index, "staff_code": staff_code, "message": "Duplicate staff_code in this import"})
+            continue
+        seen.add(staff_code)
+        current = existing.get(staff_code)
+
+        name = str(row.get('name') or '').strip() or (current[1] if current else '')
+        if not name:
+            errors.append({"row": index, "staff_code": staff_code, "message": "Missing name"})
+            continue
+        hourly_rate = row.get('hourly_rate')
+        if hourly_rate in (None, ''):
+            hourly_rate = current[2] if current else 0
+        try:
+            hourly_rate = float(hourly_rate)
+        except (TypeError, ValueError):
+            errors.append({"row": index, "staff_code": staff_code, "message": f"Invalid hourly_rate {hourly_rate!r}"})
+            continue
+        if hourly_rate < 0:
+            errors.append({"row": index, "staff_code": staff_code, "message": "hourly_rate cannot be negative"})
+            continue
+        if 'shift_id' in row or 'shift_name' in row:
+            shift_id, error = _resolve_shift(row, shift_ids)
+            if error:
+                errors.append({"row": index, "staff_code": staff_code, "message": error})
+                continue
+        else:
+            shift_id = current[3] if current else None
+        upserts[staff_code] = (staff_code, name, hourly_rate, shift_id)
+
+    added = sum(1 for staff_code in upserts if staff_code not in existing)
+    updated = len(upserts) - added
+    if upserts and not data.get('dry_run'):
+        cursor.executemany('''
+        INSERT INTO staff (staff_code, name, hourly_rate, shift_id) VALUES (?, ?, ?, ?)
+        ON CONFLICT (staff_code) DO UPDATE
+        SET name = excluded.name, hourly_rate = excluded.hourly_rate, shift_id = excluded.shift_id
+        ''', list(upserts.values()))
+        log_admin_action(password, f"Bulk imported staff: {added} added, {updated} updated, "
+                                   f"{len(errors)} rows rejected", conn=conn)
+        conn.commit()
+    conn.close()
+
+    return jsonify({"success": True, "added": added, "updated": updated, "errors": errors,
+                    "message": f"{added} staff added, {updated} updated, {len(errors)} rows rejected"})
+
 # Delete staff
 @app.route('/api/delete_staff', methods=['POST'])
 def delete_staff():
@@ -1266,10 +2539,10 @@ def delete_staff():
     # Delete staff
     cursor.execute('DELETE FROM staff WHERE staff_code = ?', (staff_code,))
     
+    log_admin_action(password, f"Deleted staff member: {staff_code}", conn=conn)
     conn.commit()
     conn.close()
     
-    log_admin_action(password, f"Deleted staff member: {staff_code}")
     return jsonify({"success": True, "message": "Staff deleted successfully"})
 
 # Change admin password
@@ -1300,10 +2573,10 @@ def change_admin_password():
     WHERE setting_key = "admin_password"
     ''', (hashed_new_password,))
     
+    log_admin_action(current_password, "Admin password changed", conn=conn)
     conn.commit()
     conn.close()
     
-    log_admin_action(current_password, "Admin password changed")
     return jsonify({"success": True, "message": "Password changed successfully"})
 
 # Get audit log
@@ -1326,22 +2599,80 @@ def get_audit_log():
         conn.close()
         return jsonify({"success": False, "message": "Invalid password"})
 
-    cursor.execute('SELECT action_timestamp, action_details FROM audit_log ORDER BY action_timestamp DESC')
+    audit_table = 'audit_log'
+    if data.get('include_archived'):
+        conn.close()
+        try:
+            conn = get_db_with_archives()
+        except ValueError as e:
+            return jsonify({"success": False, "message": str(e)})
+        cursor = conn.cursor()
+        audit_table = 'audit_log_all'
+
+    cursor.execute(f'SELECT action_timestamp, action_details FROM {audit_table} ORDER BY action_timestamp DESC')
     log_data = cursor.fetchall()
     conn.close()
 
     formatted_data = [{'timestamp': row[0], 'details': row[1]} for row in log_data]
 
-    return jsonify({"success": True, "data": formatted_data})
+    return jsonify({"success": True, "data": _rows_payload(formatted_data, _wants_columnar(data))})
 
 # Generate Excel file
+def _report_range(params):
+    """(start, end, archive paths) for a report request; end is exclusive"""
+    start_date = params.get('start_date')
+    end_date = params.get('end_date')
+
+    # Parse dates
+    if start_date:
+        start_date = timeutil.parse_date(start_date)
+    else:
+        start_date = datetime(1970, 1, 1)
+    
+    if end_date:
+        end_date = timeutil.parse_date(end_date)
+        # Add one day to include the end date
+        end_date = end_date + timedelta(days=1)
+    else:
+        end_date = timeutil.now()
+
+    archive_paths = []
+    if params.get('include_archived'):
+        archive_paths = [_archive_path(year) for year in archive_years_between(start_date, end_date)]
+    return start_date.isoformat(), end_date.isoformat(), archive_paths
+
+def build_excel_report(params, progress=None):
+    """Build the attendance workbook for `params` (start_date, end_date,
+    selected_ids, staff_code, include_archived); returns (xlsx bytes, filename).
+
+    `progress(fraction, message)` is called between stages when given.
+    """
+    start, end, archive_paths = _report_range(params)
+    staff_code = params.get('staff_code')
+    content = reports.build_workbook('attendance.db', archive_paths, start, end,
+                                     staff_codes=[staff_code] if staff_code else None,
+                                     selected_ids=params.get('selected_ids') or None,
+                                     progress=progress)
+    return content, _excel_report_filename()
+
+def _excel_report_filename():
+    return f"attendance_report_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
+
+def build_staff_workbooks(params, progress=None):
+    """Zip of one workbook per employee (optionally only `staff_codes`)"""
+    start, end, archive_paths = _report_range(params)
+    content = reports.build_staff_zip('attendance.db', archive_paths, start, end,
+                                      staff_codes=params.get('staff_codes') or None,
+                                      progress=progress)
+    return content, f"staff_reports_{datetime.now().strftime('%Y%m%d_%H%M%S')}.zip"
+
+# Tables the workbook is built from; it is cached until one of them changes
+EXCEL_REPORT_TABLES = ('attendance', 'staff', 'shifts', 'holidays', 'leave_requests', 'admin_settings')
+
 @app.route('/api/generate_excel', methods=['POST'])
 def generate_excel():
     data = request.json
     password = data.get('password')
-    start_date = data.get('start_date')
-    end_date = data.get('end_date')
-    selected_ids = data.get('selected_ids', [])
     
     if not password:
         return jsonify({"success": False, "message": "Password required"})
@@ -1356,112 +2687,204 @@ def generate_excel():
     if not result or result[2] != hashed_password:
         conn.close()
         return jsonify({"success": False, "message": "Invalid password"})
-    
-    # Parse dates
-    if start_date:
-        start_date = parser.parse(start_date)
-    else:
-        start_date = datetime(1970, 1, 1)
-    
-    if end_date:
-        end_date = parser.parse(end_date)
-        # Add one day to include the end date
-        end_date = end_date + timedelta(days=1)
-    else:
-        end_date = datetime.now()
-    
-    # Build query
-    query = '''
-    SELECT a.id, a.staff_code, s.name, a.clock_in, a.clock_out, a.notes, s.hourly_rate, a.session_type
-    FROM attendance a
-    JOIN staff s ON a.staff_code = s.staff_code
-    WHERE a.clock_in >= ? AND a.clock_in < ?
-    '''
-    params = [start_date, end_date]
-    
-    if selected_ids:
-        placeholders = ','.join(['?' for _ in selected_ids])
-        query += f' AND a.id IN ({placeholders})'
-        params.extend(selected_ids)
-    
-    query += ' ORDER BY a.clock_in DESC'
-    
-    # Get attendance data
-    cursor.execute(query, params)
-    attendance_data = cursor.fetchall()
-    
+    versions = tuple(table_versions(cursor, EXCEL_REPORT_TABLES))
     conn.close()
-    
-    # Create DataFrame
-    df = pd.DataFrame(attendance_data, columns=[
-        'ID', 'Staff Code', 'Name', 'Clock In', 'Clock Out', 'Notes', 'Hourly Rate', 'Session Type'
-    ])
-    
-    # Calculate hours and earnings
-    df['Hours'] = df.apply(lambda row: 
-        round((datetime.fromisoformat(row['Clock Out']) - datetime.fromisoformat(row['Clock In'])).total_seconds() / 3600, 2) 
-        if row['Clock Out'] else 0, axis=1)
-    df['Earnings'] = df.apply(lambda row: row['Hours'] * row['Hourly Rate'] if row['Session Type'] == 'work' else 0, axis=1)
-    
-    # Create Excel file in memory
-    output = io.BytesIO()
-    with pd.ExcelWriter(output, engine='xlsxwriter') as writer:
-        df.to_excel(writer, sheet_name='Attendance', index=False)
-        
-        # Get the workbook and worksheet objects
-        workbook = writer.book
-        worksheet = writer.sheets['Attendance']
-        
-        # Add some formatting
-        header_format = workbook.add_format({
-            'bold': True,
-            'text_wrap': True,
-            'valign': 'top',
-            'fg_color': '#D7E4BC',
-            'border': 1
-        })
-        
-        # Apply the header format
-        for col_num, value in enumerate(df.columns.values):
-            worksheet.write(0, col_num, value, header_format)
-        
-        # Adjust column widths
-        for i, col in enumerate(df.columns):
-            max_len = max(
-                df[col].astype(str).map(len).max(),  # len of largest item
-                len(str(col))                         # len of column name/header
-            )
-            worksheet.set_column(i, i, min(max_len + 2, 50))  # Add a little extra space
-        
-        # Add a summary sheet
-        summary_data = df.groupby(['Staff Code', 'Name']).agg({
-            'Hours': 'sum',
-            'Earnings': 'sum'
-        }).reset_index()
-        
-        summary_data.to_excel(writer, sheet_name='Summary', index=False)
-        
-        # Format summary sheet
-        summary_worksheet = writer.sheets['Summary']
-        for col_num, value in enumerate(summary_data.columns.values):
-            summary_worksheet.write(0, col_num, value, header_format)
-        
-        for i, col in enumerate(summary_data.columns):
-            max_len = max(
-                summary_data[col].astype(str).map(len).max(),
-                len(str(col))
-            )
-            summary_worksheet.set_column(i, i, min(max_len + 2, 50))
-    
-    output.seek(0)
-    
-    # Convert to base64 for sending
-    excel_data = base64.b64encode(output.read()).decode('utf-8')
-    
+
+    # Only the workbook is cached; the filename is stamped for this request
+    key = (request.endpoint, _normalize_params(data), versions)
+    content = result_cache.get(key)
+    if content is None:
+        try:
+            content, _ = build_excel_report(data)
+        except ValueError as e:
+            return jsonify({"success": False, "message": str(e)})
+        result_cache.put(key, content, len(content))
+    filename = _excel_report_filename()
     return jsonify({
         "success": True,
-        "excel_data": excel_data,
-        "filename": f"attendance_report_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
+        "excel_data": base64.b64encode(content).decode('utf-8'),
+        "filename": filename
+    })
+
+# ==================== REPORT JOBS ====================
+
+REPORT_WORKERS = 2
+MAX_PENDING_REPORT_JOBS = 16
+# Finished jobs (and their files) are kept this long for download
+REPORT_JOB_RETENTION = 3600
+# Longest a status request may wait for progress before answering
+REPORT_JOB_MAX_WAIT = 10
+
+REPORT_BUILDERS = {
+    'excel': build_excel_report,
+    'staff_workbooks': build_staff_workbooks,
+}
+
+class ReportJobs:
+    """Runs report builders on a small worker pool so requests return at once.
+
+    Each job moves queued -> running -> done/failed; `version` increases on
+    every progress update so pollers can wait for the next one.
+    """
+
+    def __init__(self, workers=REPORT_WORKERS, max_pending=MAX_PENDING_REPORT_JOBS,
+                 retention=REPORT_JOB_RETENTION):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.retention = retention
+        self._executor = None
+        self._jobs = {}
+        self._changed = threading.Condition()
+        self._stats = {'submitted': 0, 'completed': 0, 'failed': 0, 'rejected': 0}
+
+    def submit(self, kind, params):
+        """Queue a job and return its status, or None if too many are pending"""
+        import secrets
+        from concurrent.futures import ThreadPoolExecutor
+
+        with self._changed:
+            self._prune()
+            pending = sum(1 for job in self._jobs.values() if job['status'] in ('queued', 'running'))
+            if pending >= self.max_pending:
+                self._stats['rejected'] += 1
+                return None
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='report')
+            job_id = secrets.token_hex(8)
+            job = {'id': job_id, 'kind': kind, 'status': 'queued', 'progress': 0.0,
+                   'message': 'Waiting for a worker', 'version': 0,
+                   'created_at': datetime.now().isoformat(), 'finished_at': None,
+                   'filename': None, 'size': None, 'error': None, 'finished': None, 'result': None}
+            self._jobs[job_id] = job
+            self._stats['submitted'] += 1
+            self._executor.submit(self._run, job, params)
+            return self._public(job)
+
+    def _update(self, job, counter=None, **changes):
+        """Apply `changes` to the job (and count it under `counter`) and wake pollers"""
+        with self._changed:
+            if counter:
+                self._stats[counter] += 1
+            job.update(changes)
+            job['version'] += 1
+            self._changed.notify_all()
+
+    def _run(self, job, params):
+        self._update(job, status='running', message='Starting')
+        try:
+            result, filename = REPORT_BUILDERS[job['kind']](
+                params, lambda fraction, message: self._update(job, progress=round(fraction, 2), message=message))
+        except Exception as e:
+            print(f"Report job {job['id']} failed: {e}")
+            self._update(job, 'failed', status='failed', message='Failed', error=str(e),
+                         finished_at=datetime.now().isoformat(), finished=time.monotonic())
+            return
+        self._update(job, 'completed', status='done', progress=1.0, message='Ready', result=result,
+                     filename=filename, size=len(result),
+                     finished_at=datetime.now().isoformat(), finished=time.monotonic())
+
+    def _prune(self):
+        cutoff = time.monotonic() - self.retention
+        for job_id in [job_id for job_id, job in self._jobs.items()
+                       if job['finished'] is not None and job['finished'] < cutoff]:
+            del self._jobs[job_id]
+
+    @staticmethod
+    def _public(job):
+        return {key: value for key, value in job.items() if key not in ('result', 'finished')}
+
+    def status(self, job_id, wait=0, after_version=None):
+        """Job status; with `wait`, block until its version passes `after_version`"""
+        deadline = time.monotonic() + min(max(wait, 0), REPORT_JOB_MAX_WAIT)
+        with self._changed:
+            self._prune()
+            job = self._jobs.get(job_id)
+            while (job is not None and after_version is not None and job['version'] <= after_version
+                   and job['status'] in ('queued', 'running')):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._changed.wait(remaining)
+            return None if job is None else self._public(job)
+
+    def result(self, job_id):
+        """(bytes, filename) of a finished job, or None"""
+        with self._changed:
+            job = self._jobs.get(job_id)
+            if job is None or job['status'] != 'done':
+                return None
+            return job['result'], job['filename']
+
+    def shutdown(self):
+        """Drop queued jobs; running ones finish in the background"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def stats(self):
+        with self._changed:
+            stats = dict(self._stats)
+            for status in ('queued', 'running', 'done', 'failed'):
+                stats[status] = sum(1 for job in self._jobs.values() if job['status'] == status)
+            stats['stored_bytes'] = sum(job['size'] or 0 for job in self._jobs.values())
+        return stats
+
+report_jobs = ReportJobs()
+
+# Submit a report; the response carries the job id to poll
+@app.route('/api/report_jobs', methods=['POST'])
+def submit_report_job():
+    data = request.json or {}
+    if not _verify_admin(data.get('password', '')):
+        return jsonify({"success": False, "message": "Invalid password"})
+
+    kind = data.get('kind', 'excel')
+    if kind not in REPORT_BUILDERS:
+        return jsonify({"success": False, "message": f"Unknown report type: {kind}"})
+
+    params = {key: value for key, value in data.items() if key not in ('password', 'kind')}
+    job = report_jobs.submit(kind, params)
+    if job is None:
+        return jsonify({"success": False, "message": "Too many reports are being generated, try again shortly"}), 503
+    return jsonify({"success": True, "job": job}), 202
+
+# Job status; pass "wait" (seconds) and the last seen "version" to long-poll
+@app.route('/api/report_jobs/<job_id>', methods=['POST'])
+def get_report_job(job_id):
+    data = request.json or {}
+    if not _verify_admin(data.get('password', '')):
+        return jsonify({"success": False, "message": "Invalid password"})
+
+    try:
+        wait = float(data.get('wait', 0))
+    except (TypeError, ValueError):
+        wait = 0
+    after_version = data.get('version')
+    if after_version is not None:
+        try:
+            after_version = int(after_version)
+        except (TypeError, ValueError):
+            return jsonify({"success": False, "message": "version must be an integer"}), 400
+    job = report_jobs.status(job_id, wait=wait, after_version=after_version)
+    if job is None:
+        return jsonify({"success": False, "message": "Report job not found"}), 404
+    return jsonify({"success": True, "job": job})
+
+# Finished report, in the same shape generate_excel returns
+@app.route('/api/report_jobs/<job_id>/download', methods=['POST'])
+def download_report_job(job_id):
+    data = request.json or {}
+    if not _verify_admin(data.get('password', '')):
+        return jsonify({"success": False, "message": "Invalid password"})
+
+    result = report_jobs.result(job_id)
+    if result is None:
+        return jsonify({"success": False, "message": "Report is not ready"}), 404
+    content, filename = result
+    return jsonify({
+        "success": True,
+        "excel_data": base64.b64encode(content).decode('utf-8'),
+        "filename": filename
     })
 
 # Get server info
@@ -1473,19 +2896,43 @@ def server_info():
         "version": "2.0.0"
     })
 
+# Server-side performance metrics (admin only)
+@app.route('/api/server_metrics', methods=['POST'])
+def server_metrics():
+    data = request.get_json() or {}
+    if not _verify_admin(data.get('password', '')):
+        return jsonify(success=False, message="Unauthorized"), 401
+    return jsonify(success=True, audit=audit_writer.stats(), backup=backup_metrics,
+                   events=event_broker.stats(), result_cache=result_cache.stats(),
+                   report_jobs=report_jobs.stats(), open_sessions=sweep_metrics, odoo_mirror=odoo_sync_metrics)
+
 @app.route('/api/save_crm_credentials', methods=['POST'])
 def save_crm_credentials():
-    data = request.json
+    """Save the Odoo login the mirror syncs with (admin password in `admin_password`)"""
+    data = request.get_json() or {}
+    if not _verify_admin(data.get('admin_password', '')):
+        return jsonify(success=False, message="Unauthorized"), 401
     url, db, username, password = data.get("url"), data.get("db"), data.get("username"), data.get("password")
     conn = sqlite3.connect('attendance.db')
     cursor = conn.cursor()
+    previous = _odoo_credentials(cursor)
     cursor.execute("DELETE FROM crm_credentials")  # only one entry
     cursor.execute("INSERT INTO crm_credentials (url, db, username, password) VALUES (?, ?, ?, ?)", (url, db, username, password))
+    # Another Odoo database or user: the mirror holds someone else's leads
+    if previous and previous[:3] != (url, db, username):
+        _reset_odoo_mirror(cursor)
     conn.commit(); conn.close()
+    # Bring the mirror up to date for the frame that just signed in
+    request_odoo_sync()
     return jsonify({"success": True})
 
-@app.route('/api/get_crm_credentials', methods=['GET'])
+@app.route('/api/get_crm_credentials', methods=['POST'])
 def get_crm_credentials():
+    """The saved Odoo login (admin password in `admin_password`); it also
+    signs in to the /api/odoo mirror endpoints, so it is never handed out openly"""
+    data = request.get_json() or {}
+    if not _verify_admin(data.get('admin_password', '')):
+        return jsonify(success=False, message="Unauthorized"), 401
     conn = sqlite3.connect('attendance.db')
     cursor = conn.cursor()
     cursor.execute("SELECT url, db, username, password FROM crm_credentials LIMIT 1")
@@ -1495,37 +2942,1053 @@ def get_crm_credentials():
         return jsonify({"success": False, "message": "No credentials found"})
     return jsonify({"success": True, "credentials": {"url": row[0], "db": row[1], "username": row[2], "password": row[3]}})
 
-def backup_database():
-    """Create a backup of the database"""
+# ==================== ODOO MIRROR ====================
+
+# How often the schedule thread pulls Odoo CRM changes into the mirror
+ODOO_SYNC_MINUTES = 5
+# How often every lead id is listed to drop leads deleted in Odoo, which
+# write_date cannot show
+ODOO_RECONCILE_HOURS = 24
+# Records per search_read call while syncing
+ODOO_SYNC_PAGE_SIZE = 500
+ODOO_LEADS_PAGE_SIZE = 200
+MAX_ODOO_LEADS_PAGE = 1000
+ODOO_LEAD_FIELDS = ['id', 'name', 'partner_name', 'email_from', 'phone', 'stage_id', 'active', 'write_date']
+
+odoo_sync_metrics = {}
+# One sync at a time, whether from the schedule thread or /api/odoo/sync
+_odoo_sync_lock = threading.RLock()
+# Held by the one background sync waiting to start (see request_odoo_sync)
+_odoo_sync_waiting = threading.Lock()
+
+def _odoo_credentials(cursor):
+    cursor.execute("SELECT url, db, username, password FROM crm_credentials LIMIT 1")
+    row = cursor.fetchone()
+    return tuple(row) if row and all(row) else None
+
+def _verify_odoo_login(data):
+    """True for the saved Odoo login (what CrmFrame signs in with) or the admin password"""
+    conn = sqlite3.connect('attendance.db')
+    credentials = _odoo_credentials(conn.cursor())
+    conn.close()
+    if credentials and data.get('username') == credentials[2] and data.get('password') == credentials[3]:
+        return True
+    return _verify_admin(data.get('password', ''))
+
+def _reset_odoo_mirror(cursor):
+    for table in ('odoo_leads', 'odoo_stages', 'odoo_sync_state'):
+        cursor.execute(f'DELETE FROM {table}')
+
+def _upsert_odoo_leads(cursor, leads):
+    """Write search_read results into odoo_leads; archived leads are removed"""
+    cursor.executemany('DELETE FROM odoo_leads WHERE id = ?',
+                       [(lead['id'],) for lead in leads if not lead.get('active', True)])
+    # Odoo sends False for empty fields
+    cursor.executemany('''
+    INSERT INTO odoo_leads (id, name, partner_name, email_from, phone, stage_id, write_date)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT(id) DO UPDATE SET
+        name = excluded.name, partner_name = excluded.partner_name, email_from = excluded.email_from,
+        phone = excluded.phone, stage_id = excluded.stage_id, write_date = excluded.write_date
+    ''', [(lead['id'], lead['name'] or None, lead['partner_name'] or None, lead['email_from'] or None,
+           lead['phone'] or None, lead['stage_id'][0] if lead['stage_id'] else None, lead['write_date'])
+          for lead in leads if lead.get('active', True)])
+
+def _sync_odoo_stages(client, conn):
+    # A few dozen rows: replaced whole, which also catches deleted stages
+    stages = client.search_read('crm.stage', [], ['id', 'name', 'sequence', 'write_date'], limit=None)
+    cursor = conn.cursor()
+    cursor.execute('BEGIN IMMEDIATE')
+    cursor.execute('DELETE FROM odoo_stages')
+    cursor.executemany('INSERT INTO odoo_stages (id, name, sequence, write_date) VALUES (?, ?, ?, ?)',
+                       [(s['id'], s['name'], s['sequence'], s['write_date']) for s in stages])
+    cursor.execute('COMMIT')
+    return len(stages)
+
+def _sync_odoo_leads(client, conn):
+    """Pull leads written since the last sync, a page per transaction.
+
+    Pages are keyset on (write_date, id), not offsets, so a lead edited in
+    Odoo while the sync runs cannot shift the pages and be skipped; it is
+    read again at the end. write_date only has whole seconds, so each run
+    starts at the watermark second itself, not after it: a lead saved in
+    that second after the last run is not missed. The watermark is saved
+    with each page, so an interrupted sync resumes where it stopped.
+    """
+    cursor = conn.cursor()
+    cursor.execute("SELECT last_write_date FROM odoo_sync_state WHERE model = 'crm.lead'")
+    last_write_date, = cursor.fetchone() or (None,)
+    last_id = 0
+    synced = 0
+    while True:
+        domain = [('active', 'in', [True, False])]
+        if last_write_date:
+            domain += ['|', ('write_date', '>', last_write_date),
+                       '&', ('write_date', '=', last_write_date), ('id', '>', last_id)]
+        page = client.search_read('crm.lead', domain, ODOO_LEAD_FIELDS, limit=ODOO_SYNC_PAGE_SIZE,
+                                  order='write_date, id')
+        if not page:
+            break
+        last_write_date, last_id = page[-1]['write_date'], page[-1]['id']
+        cursor.execute('BEGIN IMMEDIATE')
+        _upsert_odoo_leads(cursor, page)
+        cursor.execute('''
+        INSERT INTO odoo_sync_state (model, last_write_date, synced_at) VALUES ('crm.lead', ?, ?)
+        ON CONFLICT(model) DO UPDATE SET last_write_date = excluded.last_write_date, synced_at = excluded.synced_at
+        ''', (last_write_date, timeutil.now_storage()))
+        cursor.execute('COMMIT')
+        synced += len(page)
+        if len(page) < ODOO_SYNC_PAGE_SIZE:
+            break
+    cursor.execute('''
+    INSERT INTO odoo_sync_state (model, synced_at) VALUES ('crm.lead', ?)
+    ON CONFLICT(model) DO UPDATE SET synced_at = excluded.synced_at
+    ''', (timeutil.now_storage(),))
+    return synced
+
+def _reconcile_odoo_leads(client, conn):
+    """Drop mirrored leads that no longer exist in Odoo, once per ODOO_RECONCILE_HOURS"""
+    cursor = conn.cursor()
+    cursor.execute("SELECT reconciled_at FROM odoo_sync_state WHERE model = 'crm.lead'")
+    row = cursor.fetchone()
+    if row and row[0] and timeutil.to_epoch(row[0]) > time.time() - ODOO_RECONCILE_HOURS * 3600:
+        return 0
+    ids = client.search('crm.lead', [], order='id')
+    cursor.execute('BEGIN IMMEDIATE')
+    cursor.execute('CREATE TEMP TABLE IF NOT EXISTS odoo_live_ids (id INTEGER PRIMARY KEY)')
+    cursor.execute('DELETE FROM odoo_live_ids')
+    cursor.executemany('INSERT INTO odoo_live_ids (id) VALUES (?)', [(i,) for i in ids])
+    # Leads created after the listing have higher ids and are kept
+    cursor.execute('DELETE FROM odoo_leads WHERE id <= ? AND id NOT IN (SELECT id FROM odoo_live_ids)',
+                   (ids[-1] if ids else 0,))
+    dropped = cursor.rowcount
+    cursor.execute("UPDATE odoo_sync_state SET reconciled_at = ? WHERE model = 'crm.lead'", (timeutil.now_storage(),))
+    cursor.execute('COMMIT')
+    return dropped
+
+def sync_odoo_mirror():
+    """Bring odoo_stages and odoo_leads up to date with the saved Odoo login.
+
+    Returns the metrics of the run, or None when no login is saved.
+    """
+    started = time.perf_counter()
+    with _odoo_sync_lock:
+        conn = sqlite3.connect('attendance.db', timeout=30, isolation_level=None)
+        try:
+            credentials = _odoo_credentials(conn.cursor())
+            if not credentials:
+                return None
+            client = odoo_client.OdooClient(*credentials)
+            try:
+                stages = _sync_odoo_stages(client, conn)
+                leads = _sync_odoo_leads(client, conn)
+                dropped = _reconcile_odoo_leads(client, conn)
+            finally:
+                client.close()
+        except Exception as e:
+            if conn.in_transaction:
+                conn.execute('ROLLBACK')
+            odoo_sync_metrics['last_error'] = str(e)
+            print(f"Error syncing the Odoo mirror: {e}")
+            return dict(odoo_sync_metrics)
+        finally:
+            conn.close()
+
+        odoo_sync_metrics.clear()
+        odoo_sync_metrics.update({
+            'finished_at': timeutil.now().strftime('%Y-%m-%d %H:%M:%S'),
+            'stages': stages,
+            'leads_synced': leads,
+            'leads_dropped': dropped,
+            'total_seconds': round(time.perf_counter() - started, 3),
+        })
+        return dict(odoo_sync_metrics)
+
+def _odoo_synced_at(cursor):
+    cursor.execute("SELECT synced_at FROM odoo_sync_state WHERE model = 'crm.lead'")
+    row = cursor.fetchone()
+    return row[0] if row else None
+
+def _format_odoo_lead(row):
+    # Same shape as Odoo's search_read, so CrmFrame shows either the same way
+    return {'id': row['id'], 'name': row['name'] or '', 'partner_name': row['partner_name'] or False,
+            'email_from': row['email_from'] or False, 'phone': row['phone'] or False,
+            'stage_id': [row['stage_id'], row['stage_name']] if row['stage_id'] else False}
+
+@app.route('/api/odoo/leads', methods=['POST'])
+def odoo_leads():
+    """A page of mirrored Odoo leads, newest first.
+
+    search matches name, customer or phone; pass the last id of a page as
+    before_id for the next one. The first page carries the total. synced_at
+    is null until the first sync finished.
+    """
+    data = request.get_json() or {}
+    if not _verify_odoo_login(data):
+        return jsonify(success=False, message="Unauthorized"), 401
+    try:
+        limit = min(max(int(data.get('limit') or ODOO_LEADS_PAGE_SIZE), 1), MAX_ODOO_LEADS_PAGE)
+        before_id = int(data['before_id']) if data.get('before_id') else None
+    except (TypeError, ValueError):
+        return jsonify(success=False, message="Invalid limit or before_id"), 400
+
+    where, params = [], []
+    search = (data.get('search') or '').strip()
+    if search:
+        where.append("(l.name LIKE ? OR l.partner_name LIKE ? OR l.phone LIKE ?)")
+        params += [f"%{search}%"] * 3
+    if data.get('stage_id'):
+        where.append("l.stage_id = ?")
+        params.append(data['stage_id'])
+    conn = get_db()
+    cursor = conn.cursor()
+    total = None
+    if before_id is None:
+        cursor.execute(f"SELECT COUNT(*) FROM odoo_leads l {'WHERE ' + ' AND '.join(where) if where else ''}", params)
+        total = cursor.fetchone()[0]
+    else:
+        where.append("l.id < ?")
+        params.append(before_id)
+    cursor.execute(f'''
+    SELECT l.id, l.name, l.partner_name, l.email_from, l.phone, l.stage_id, s.name AS stage_name
+    FROM odoo_leads l LEFT JOIN odoo_stages s ON l.stage_id = s.id
+    {'WHERE ' + ' AND '.join(where) if where else ''}
+    ORDER BY l.id DESC LIMIT ?
+    ''', params + [limit])
+    leads = [_format_odoo_lead(row) for row in cursor.fetchall()]
+    synced_at = _odoo_synced_at(cursor)
+    conn.close()
+    return jsonify(success=True, leads=leads, total=total, synced_at=synced_at)
+
+@app.route('/api/odoo/stages', methods=['POST'])
+def odoo_stages():
+    """Mirrored Odoo stages with their lead counts"""
+    data = request.get_json() or {}
+    if not _verify_odoo_login(data):
+        return jsonify(success=False, message="Unauthorized"), 401
+    conn = get_db()
+    cursor = conn.cursor()
+    cursor.execute('SELECT stage_id, COUNT(*) FROM odoo_leads GROUP BY stage_id')
+    counts = {stage_id: n for stage_id, n in cursor.fetchall()}
+    cursor.execute('SELECT id, name, sequence FROM odoo_stages ORDER BY sequence, id')
+    stages = [{'id': row['id'], 'name': row['name'], 'sequence': row['sequence'], 'leads': counts.get(row['id'], 0)}
+              for row in cursor.fetchall()]
+    synced_at = _odoo_synced_at(cursor)
+    conn.close()
+    return jsonify(success=True, stages=stages, no_stage=counts.get(None, 0), synced_at=synced_at)
+
+@app.route('/api/odoo/create_leads', methods=['POST'])
+def odoo_create_leads():
+    """Create leads in Odoo and in the mirror (write-through).
+
+    Each lead is a dict of Odoo crm.lead values (name, email_from, phone, ...).
+    """
+    data = request.get_json() or {}
+    if not _verify_odoo_login(data):
+        return jsonify(success=False, message="Unauthorized"), 401
+    leads = data.get('leads')
+    if not isinstance(leads, list) or not leads or len(leads) > MAX_BULK_LEADS \
+            or not all(isinstance(lead, dict) and lead.get('name') for lead in leads):
+        return jsonify(success=False, message=f"leads must be 1 to {MAX_BULK_LEADS} leads, each with a name"), 400
+
+    conn = sqlite3.connect('attendance.db', timeout=30, isolation_level=None)
+    credentials = _odoo_credentials(conn.cursor())
+    if not credentials:
+        conn.close()
+        return jsonify(success=False, message="No Odoo credentials saved"), 400
+    client = odoo_client.OdooClient(*credentials)
+    try:
+        ids = client.create_many('crm.lead', leads)
+        created = client.search_read('crm.lead', [('id', 'in', ids)], ODOO_LEAD_FIELDS, limit=None)
+    except Exception as e:
+        conn.close()
+        return jsonify(success=False, message=f"Odoo error: {e}"), 502
+    finally:
+        client.close()
+
+    # Not a sync: the watermark stays put, and the next sync reads these again
+    cursor = conn.cursor()
+    cursor.execute('BEGIN IMMEDIATE')
+    _upsert_odoo_leads(cursor, created)
+    cursor.execute('COMMIT')
+    conn.close()
+    return jsonify(success=True, ids=ids, message=f"Created {len(ids)} leads")
+
+def request_odoo_sync():
+    """Sync the mirror on a background thread; returns False if one is already waiting.
+
+    A waiting run reads the saved login only once the running one is done,
+    so requests made meanwhile are covered by it instead of queueing more
+    threads.
+    """
+    if not _odoo_sync_waiting.acquire(blocking=False):
+        return False
+
+    def run():
+        with _odoo_sync_lock:
+            _odoo_sync_waiting.release()
+            sync_odoo_mirror()
+
+    threading.Thread(target=run, name="odoo-sync", daemon=True).start()
+    return True
+
+@app.route('/api/odoo/sync', methods=['POST'])
+def odoo_sync():
+    """Sync the Odoo mirror now, waiting for a sync already running"""
+    data = request.get_json() or {}
+    if not _verify_odoo_login(data):
+        return jsonify(success=False, message="Unauthorized"), 401
+    result = sync_odoo_mirror()
+    if result is None:
+        return jsonify(success=False, message="No Odoo credentials saved"), 400
+    if 'last_error' in result:
+        return jsonify(success=False, message=result['last_error'], metrics=result), 502
+    return jsonify(success=True, metrics=result)
+
+# ==================== OPEN SESSION SWEEPER ====================
+
+# How often the schedule thread looks for forgotten clock-outs
+OPEN_SESSION_SWEEP_MINUTES = 15
+# Open sessions are left alone this long after their shift ended (override
+# with the 'open_session_grace_minutes' admin setting)
+OPEN_SESSION_GRACE_MINUTES = 60
+# Longest a session may run when it started long before the next shift end
+MAX_OPEN_SESSION_HOURS = 16
+# Staff without a shift are clocked out this long after clocking in (override
+# with the 'default_shift_hours' admin setting, which the payroll also uses)
+DEFAULT_SHIFT_HOURS = 8.0
+AUTO_CLOSE_NOTE = "[closed automatically after shift end]"
+
+sweep_metrics = {}
+
+def _open_session_grace(cursor):
+    cursor.execute("SELECT setting_value FROM admin_settings WHERE setting_key = 'open_session_grace_minutes'")
+    row = cursor.fetchone()
+    try:
+        return int(row[0]) if row else OPEN_SESSION_GRACE_MINUTES
+    except (TypeError, ValueError):
+        return OPEN_SESSION_GRACE_MINUTES
+
+def _default_shift_hours(cursor):
+    cursor.execute("SELECT setting_value FROM admin_settings WHERE setting_key = 'default_shift_hours'")
+    row = cursor.fetchone()
+    try:
+        return float(row[0]) if row else DEFAULT_SHIFT_HOURS
+    except (TypeError, ValueError):
+        return DEFAULT_SHIFT_HOURS
+
+def _session_close_time(clock_in_ts, end_time, default_shift_hours=DEFAULT_SHIFT_HOURS):
+    """UTC seconds at which a session started at `clock_in_ts` is over: the
+    first shift end after it started, at most MAX_OPEN_SESSION_HOURS later.
+    Without a shift it is a default day's length after clock-in, so no more
+    than a normal day is paid for a forgotten clock-out."""
+    try:
+        end = datetime.strptime((end_time or '')[:5], '%H:%M').time()
+    except ValueError:
+        return clock_in_ts + int(default_shift_hours * 3600)
+    limit = clock_in_ts + MAX_OPEN_SESSION_HOURS * 3600
+    day = timeutil.from_epoch(clock_in_ts).date()
+    shift_end = timeutil.to_epoch(datetime.combine(day, end))
+    if shift_end <= clock_in_ts:
+        shift_end = timeutil.to_epoch(datetime.combine(day + timedelta(days=1), end))
+    return min(shift_end, limit)
+
+def close_stale_sessions():
+    """Clock out open sessions whose shift ended more than the grace period ago.
+
+    Each session is closed at its shift end, not at the time of the sweep.
+    All of them, and an audit entry for each, are written in one transaction.
+    Returns the number of sessions closed.
+    """
+    started = time.perf_counter()
+    now_ts = int(time.time())
+    try:
+        conn = sqlite3.connect('attendance.db', timeout=30, isolation_level=None)
+        cursor = conn.cursor()
+        grace = _open_session_grace(cursor) * 60
+        default_shift_hours = _default_shift_hours(cursor)
+        cursor.execute('BEGIN IMMEDIATE')
+        try:
+            # Read through idx_attendance_open, which holds only open sessions;
+            # the + keeps SQLite from range-scanning the whole history instead
+            cursor.execute('''
+            SELECT a.id, a.staff_code, a.session_type, a.clock_in_ts, sh.end_time
+            FROM attendance a
+            LEFT JOIN staff s ON a.staff_code = s.staff_code
+            LEFT JOIN shifts sh ON s.shift_id = sh.id
+            WHERE a.clock_out IS NULL AND +a.clock_in_ts < ?
+            ''', (now_ts - grace,))
+            stale = []
+            for session_id, staff_code, session_type, clock_in_ts, end_time in cursor.fetchall():
+                close_ts = _session_close_time(clock_in_ts, end_time, default_shift_hours)
+                if close_ts + grace <= now_ts:
+                    stale.append((session_id, staff_code, session_type,
+                                  timeutil.to_storage(timeutil.from_epoch(close_ts))))
+
+            cursor.executemany('''
+            UPDATE attendance
+            SET clock_out = ?, notes = COALESCE(NULLIF(notes, '') || ' ', '') || ?
+            WHERE id = ?
+            ''', [(clock_out, AUTO_CLOSE_NOTE, session_id) for session_id, _, _, clock_out in stale])
+            for session_id, staff_code, session_type, clock_out in stale:
+                audit_writer.write_in_transaction(
+                    conn, None, f"Automatically closed open {session_type} session ID {session_id} "
+                                f"for {staff_code} at {clock_out} (shift ended).")
+            cursor.execute('COMMIT')
+        except Exception:
+            if conn.in_transaction:
+                cursor.execute('ROLLBACK')
+            raise
+
+        cursor.execute('SELECT COUNT(*) FROM attendance WHERE clock_out IS NULL')
+        still_open = cursor.fetchone()[0]
+        conn.close()
+    except Exception as e:
+        sweep_metrics['last_error'] = str(e)
+        print(f"Error closing open sessions: {e}")
+        return 0
+
+    sweep_metrics.clear()
+    sweep_metrics.update({
+        'finished_at': timeutil.now().strftime('%Y-%m-%d %H:%M:%S'),
+        'closed': len(stale),
+        'still_open': still_open,
+        'total_seconds': round(time.perf_counter() - started, 3),
+    })
+    if stale:
+        print(f"Closed {len(stale)} forgotten sessions, {still_open} still open")
+    return len(stale)
+
+# ==================== ARCHIVAL ====================
+
+ARCHIVE_DIR = 'archives'
+# Closed attendance and audit entries older than this move to the yearly
+# archive files (override with the 'archive_horizon_days' admin setting)
+ARCHIVE_HORIZON_DAYS = 365
+# Pages released per run by PRAGMA incremental_vacuum
+ARCHIVE_VACUUM_PAGES = 2000
+# SQLite allows 10 attached databases by default
+MAX_ATTACHED_ARCHIVES = 9
+
+def _archive_path(year):
+    return os.path.join(ARCHIVE_DIR, f"attendance_archive_{year}.db")
+
+def _archive_horizon_days(cursor):
+    cursor.execute("SELECT setting_value FROM admin_settings WHERE setting_key = 'archive_horizon_days'")
+    row = cursor.fetchone()
+    try:
+        return int(row[0]) if row else ARCHIVE_HORIZON_DAYS
+    except (TypeError, ValueError):
+        return ARCHIVE_HORIZON_DAYS
+
+def _stored_columns(cursor, table, schema='main'):
+    """Columns that hold data (generated/hidden columns are skipped)"""
+    cursor.execute(f'PRAGMA {schema}.table_xinfo({table})')
+    return [row[1] for row in cursor.fetchall() if row[6] == 0]
+
+def _ensure_archive_schema(cursor, schema, tables):
+    """Create the archived tables in an attached archive with the live schema"""
+    for table in tables:
+        cursor.execute(f"SELECT 1 FROM {schema}.sqlite_master WHERE type = 'table' AND name = ?", (table,))
+        if cursor.fetchone():
+            continue
+        cursor.execute("SELECT sql FROM main.sqlite_master WHERE type = 'table' AND name = ?", (table,))
+        create_sql = cursor.fetchone()[0]
+        cursor.execute(create_sql.replace(f'CREATE TABLE {table}', f'CREATE TABLE {schema}.{table}', 1))
+
+def list_archive_years():
+    if not os.path.exists(ARCHIVE_DIR):
+        return []
+    years = []
+    for f in os.listdir(ARCHIVE_DIR):
+        if f.startswith('attendance_archive_') and f.endswith('.db'):
+            years.append(f[len('attendance_archive_'):-len('.db')])
+    return sorted(years)
+
+def archive_years_between(start=None, end=None):
+    """Archive years that can hold records from [start, end); every year without a range.
+
+    Attendance is archived by site-local year and audit entries by UTC year,
+    so the years either side of the range count when it reaches them within
+    a day. Raises ValueError when more than MAX_ATTACHED_ARCHIVES are needed
+    rather than reading a history with years missing.
+    """
+    years = list_archive_years()
+    if start is not None:
+        years = [year for year in years if int(year) >= (start - timedelta(days=1)).year]
+    if end is not None:
+        years = [year for year in years if int(year) <= (end + timedelta(days=1)).year]
+    if len(years) > MAX_ATTACHED_ARCHIVES:
+        raise ValueError(f"The range covers {len(years)} archived years but at most {MAX_ATTACHED_ARCHIVES} "
+                         f"can be read at once - narrow the date range")
+    return years
+
+def archive_old_records():
+    """Move closed attendance and old audit entries into per-year archive databases"""
+    started = time.perf_counter()
+    try:
+        conn = sqlite3.connect('attendance.db', timeout=30, isolation_level=None)
+        cursor = conn.cursor()
+        # audit_log stamps are UTC text (see AuditLogWriter), so the cutoff is too
+        cutoff_time = datetime.now(timezone.utc) - timedelta(days=_archive_horizon_days(cursor))
+        cutoff, cutoff_ts = cutoff_time.strftime('%Y-%m-%d %H:%M:%S'), timeutil.to_epoch(cutoff_time)
+
+        # Archives hold site-local years. Those can start a few hours either
+        # side of the UTC year, so check the neighbours of every UTC year too.
+        cursor.execute('''
+        SELECT DISTINCT strftime('%Y', clock_in_ts, 'unixepoch') FROM attendance
+        WHERE clock_out IS NOT NULL AND clock_in_ts < ?
+        ''', (cutoff_ts,))
+        years = set()
+        for year in {int(row[0]) + step for row in cursor.fetchall() if row[0] for step in (-1, 0, 1)}:
+            cursor.execute('''
+            SELECT 1 FROM attendance
+            WHERE clock_out IS NOT NULL AND clock_in_ts < ? AND clock_in_ts >= ? AND clock_in_ts < ? LIMIT 1
+            ''', (cutoff_ts, timeutil.to_epoch(f"{year}-01-01"), timeutil.to_epoch(f"{year + 1}-01-01")))
+            if cursor.fetchone():
+                years.add(str(year))
+        cursor.execute("SELECT DISTINCT strftime('%Y', action_timestamp) FROM audit_log WHERE action_timestamp < ?",
+                       (cutoff,))
+        years.update(row[0] for row in cursor.fetchall() if row[0])
+        years = sorted(years)
+
+        if years and not os.path.exists(ARCHIVE_DIR):
+            os.makedirs(ARCHIVE_DIR)
+
+        moved = {'attendance': 0, 'audit_log': 0}
+        for year in years:
+            year_start, next_year = f"{year}-01-01", f"{int(year) + 1}-01-01"
+            cursor.execute('ATTACH DATABASE ? AS archive', (_archive_path(year),))
+            try:
+                _ensure_archive_schema(cursor, 'archive', ('attendance', 'audit_log'))
+                add_epoch_columns(cursor, 'archive')
+                cursor.execute('BEGIN IMMEDIATE')
+
+                cols = ', '.join(_stored_columns(cursor, 'attendance'))
+                where = 'clock_out IS NOT NULL AND clock_in_ts < ? AND clock_in_ts >= ? AND clock_in_ts < ?'
+                bounds = (cutoff_ts, timeutil.to_epoch(year_start), timeutil.to_epoch(next_year))
+                cursor.execute(f'INSERT OR REPLACE INTO archive.attendance ({cols}) '
+                               f'SELECT {cols} FROM main.attendance WHERE {where}', bounds)
+                cursor.execute(f'DELETE FROM main.attendance WHERE {where}', bounds)
+                moved['attendance'] += cursor.rowcount
+
+                cols = ', '.join(_stored_columns(cursor, 'audit_log'))
+                where = 'action_timestamp < ? AND action_timestamp >= ? AND action_timestamp < ?'
+                cursor.execute(f'INSERT OR REPLACE INTO archive.audit_log ({cols}) '
+                               f'SELECT {cols} FROM main.audit_log WHERE {where}',
+                               (cutoff, year_start, next_year))
+                cursor.execute(f'DELETE FROM main.audit_log WHERE {where}', (cutoff, year_start, next_year))
+                moved['audit_log'] += cursor.rowcount
+
+                cursor.execute('COMMIT')
+            except Exception:
+                if conn.in_transaction:
+                    cursor.execute('ROLLBACK')
+                raise
+            finally:
+                cursor.execute('DETACH DATABASE archive')
+
+        # Release a bounded number of free pages instead of a full VACUUM
+        cursor.execute(f'PRAGMA incremental_vacuum({ARCHIVE_VACUUM_PAGES})')
+        cursor.fetchall()
+        conn.close()
+
+        elapsed = time.perf_counter() - started
+        print(f"Archived {moved['attendance']} attendance and {moved['audit_log']} audit rows "
+              f"older than {cutoff} UTC in {elapsed:.2f}s")
+        return moved
+    except Exception as e:
+        print(f"Error archiving old records: {e}")
+        return None
+
+def get_db_with_archives(start=None, end=None):
+    """Open attendance.db with the yearly archives for [start, end) attached.
+
+    The TEMP views attendance_all and audit_log_all combine the live tables
+    with the attached archives, so reports can read archived history with the
+    same queries they run against the live tables. Raises ValueError when the
+    range needs more archives than SQLite can attach (see archive_years_between).
+    """
+    years = archive_years_between(start, end)
+    conn = sqlite3.connect('attendance.db')
+    cursor = conn.cursor()
+    views = {'attendance': ['SELECT * FROM main.attendance'], 'audit_log': ['SELECT * FROM main.audit_log']}
+    for year in years:
+        schema = f"archive_{year}"
+        cursor.execute(f'ATTACH DATABASE ? AS {schema}', (_archive_path(year),))
+        for table in views:
+            cursor.execute(f"SELECT 1 FROM {schema}.sqlite_master WHERE type = 'table' AND name = ?", (table,))
+            if cursor.fetchone():
+                views[table].append(f'SELECT * FROM {schema}.{table}')
+    for table, selects in views.items():
+        cursor.execute(f'CREATE TEMP VIEW {table}_all AS ' + ' UNION ALL '.join(selects))
+    return conn
+
+BACKUP_DIR = 'backups'
+BACKUP_KEEP = 10
+# Pages copied per backup step; the source is only locked while a step runs
+BACKUP_PAGES_PER_STEP = 256
+# Pause between steps so clock-ins and other writers are not starved
+BACKUP_STEP_PAUSE = 0.01
+BACKUP_COMPRESS = True
+# The nightly job takes a full backup this often and increments in between
+BACKUP_FULL_INTERVAL_DAYS = 7
+
+# Timing/size figures for the most recent backup (see /api/server_metrics)
+backup_metrics = {}
+
+def _compress_file(path):
+    """gzip a file next to itself and remove the original"""
+    gz_path = path + '.gz'
+    with open(path, 'rb') as src, gzip.open(gz_path, 'wb', compresslevel=6) as dst:
+        shutil.copyfileobj(src, dst, 1024 * 1024)
+    os.remove(path)
+    return gz_path
+
+def _record_backup(kind, filename, from_seq, to_seq, audit_to_id):
+    conn = sqlite3.connect('attendance.db', timeout=30)
+    conn.execute('INSERT INTO backup_chain (kind, filename, from_seq, to_seq, audit_to_id) VALUES (?, ?, ?, ?, ?)',
+                 (kind, os.path.basename(filename), from_seq, to_seq, audit_to_id))
+    conn.commit()
+    conn.close()
+
+def _full_backup(compress):
+    # Create backup filename with timestamp
+    backup_filename = os.path.join(BACKUP_DIR, f"attendance_backup_{datetime.now().strftime('%Y%m%d_%H%M%S')}.db")
+    
+    started = time.perf_counter()
+    steps = [0]
+
+    def on_progress(status, remaining, total):
+        steps[0] += 1
+        time.sleep(BACKUP_STEP_PAUSE)
+
+    # Copy the live database page by page; writers can commit between steps
+    src = sqlite3.connect('attendance.db', timeout=30)
+    dst = sqlite3.connect(backup_filename)
+    try:
+        src.backup(dst, pages=BACKUP_PAGES_PER_STEP, progress=on_progress)
+    finally:
+        src.close()
+    copied = time.perf_counter()
+
+    # Verify the copy before it replaces any older backup
+    integrity = dst.execute('PRAGMA integrity_check').fetchone()[0]
+    # Increments taken later continue from the journal position and last
+    # audit entry in the copy
+    to_seq = current_change_seq(dst.cursor())
+    audit_to_id = current_audit_id(dst.cursor())
+    dst.close()
+    if integrity != 'ok':
+        os.remove(backup_filename)
+        raise RuntimeError(f"integrity check failed on backup: {integrity}")
+    verified = time.perf_counter()
+
+    size = os.path.getsize(backup_filename)
+    if compress:
+        backup_filename = _compress_file(backup_filename)
+    finished = time.perf_counter()
+
+    _record_backup('full', backup_filename, 0, to_seq, audit_to_id)
+    backup_metrics.clear()
+    backup_metrics.update({
+        'kind': 'full',
+        'file': backup_filename,
+        'finished_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        'steps': steps[0],
+        'to_seq': to_seq,
+        'copy_seconds': round(copied - started, 3),
+        'verify_seconds': round(verified - copied, 3),
+        'compress_seconds': round(finished - verified, 3),
+        'total_seconds': round(finished - started, 3),
+        'db_bytes': size,
+        'backup_bytes': os.path.getsize(backup_filename)
+    })
+    return backup_filename
+
+def _incremental_backup(compress):
+    """Write the journal entries and audit entries recorded since the previous backup in the chain.
+
+    Increments cover the JOURNALED_TABLES plus new audit_log rows;
+    crm_credentials is only restored from the full backup.
+    """
+    started = time.perf_counter()
+    conn = sqlite3.connect('attendance.db', timeout=30)
+    cursor = conn.cursor()
+    cursor.execute('SELECT MAX(to_seq), MAX(audit_to_id) FROM backup_chain')
+    from_seq, audit_from_id = cursor.fetchone()
+    if from_seq is None:
+        conn.close()
+        print("No full backup yet - taking a full backup instead")
+        return _full_backup(compress)
+
+    # One read transaction, so the journal and audit rows are from the same moment
+    cursor.execute('BEGIN')
+    cursor.execute('''
+    SELECT seq, table_name, row_id, op, row_data, changed_at FROM change_journal
+    WHERE seq > ? ORDER BY seq
+    ''', (from_seq,))
+    entries = cursor.fetchall()
+    cursor.execute('''
+    SELECT id, admin_password, action_timestamp, action_details FROM audit_log
+    WHERE id > ? ORDER BY id
+    ''', (audit_from_id or 0,))
+    audit_entries = cursor.fetchall()
+    conn.close()
+    if not entries and not audit_entries:
+        print("No changes since the last backup - incremental backup skipped")
+        return None
+    to_seq = entries[-1][0] if entries else from_seq
+    audit_to_id = audit_entries[-1][0] if audit_entries else audit_from_id
+
+    backup_filename = os.path.join(
+        BACKUP_DIR, f"attendance_incr_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{from_seq}-{to_seq}.jsonl")
+    opener = gzip.open if compress else open
+    if compress:
+        backup_filename += '.gz'
+    with opener(backup_filename, 'wt', encoding='utf-8') as f:
+        f.write(json.dumps({'from_seq': from_seq, 'to_seq': to_seq, 'audit_to_id': audit_to_id}) + '\n')
+        for seq, table_name, row_id, op, row_data, changed_at in entries:
+            f.write(json.dumps({'seq': seq, 'table': table_name, 'row_id': row_id, 'op': op,
+                                'row': json.loads(row_data) if row_data else None,
+                                'changed_at': changed_at}) + '\n')
+        # Audit entries carry no seq; restore_database inserts them by id
+        for audit_id, admin_password, action_timestamp, action_details in audit_entries:
+            f.write(json.dumps({'audit': {'id': audit_id, 'admin_password': admin_password,
+                                          'action_timestamp': action_timestamp,
+                                          'action_details': action_details}}) + '\n')
+
+    _record_backup('incremental', backup_filename, from_seq, to_seq, audit_to_id)
+    backup_metrics.clear()
+    backup_metrics.update({
+        'kind': 'incremental',
+        'file': backup_filename,
+        'finished_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        'from_seq': from_seq,
+        'to_seq': to_seq,
+        'changes': len(entries),
+        'audit_entries': len(audit_entries),
+        'total_seconds': round(time.perf_counter() - started, 3),
+        'backup_bytes': os.path.getsize(backup_filename)
+    })
+    return backup_filename
+
+def _backup_archives(compress):
+    """Refresh the backup copy of every archive changed since it was last copied.
+
+    Archives only change when archive_old_records moves rows into them, so
+    one current copy per year is kept in BACKUP_DIR/archives rather than one
+    per backup. Returns the years copied.
+    """
+    archive_backup_dir = os.path.join(BACKUP_DIR, ARCHIVE_DIR)
+    copied = []
+    for year in list_archive_years():
+        source = _archive_path(year)
+        backup_path = os.path.join(archive_backup_dir, os.path.basename(source))
+        previous = [path for path in (backup_path, backup_path + '.gz') if os.path.exists(path)]
+        if previous and os.path.getmtime(previous[0]) >= os.path.getmtime(source):
+            continue
+        os.makedirs(archive_backup_dir, exist_ok=True)
+
+        # Copied under a temporary name so a failed copy never replaces a good one
+        tmp_path = backup_path + '.tmp'
+        src = sqlite3.connect(source, timeout=30)
+        dst = sqlite3.connect(tmp_path)
+        try:
+            src.backup(dst, pages=BACKUP_PAGES_PER_STEP, progress=lambda *args: time.sleep(BACKUP_STEP_PAUSE))
+            integrity = dst.execute('PRAGMA integrity_check').fetchone()[0]
+        finally:
+            src.close()
+            dst.close()
+        if integrity != 'ok':
+            os.remove(tmp_path)
+            raise RuntimeError(f"integrity check failed on archive backup {year}: {integrity}")
+        if compress:
+            tmp_path = _compress_file(tmp_path)
+        final_path = backup_path + '.gz' if compress else backup_path
+        os.replace(tmp_path, final_path)
+        for path in previous:
+            if path != final_path:
+                os.remove(path)
+        copied.append(year)
+    return copied
+
+def _apply_backup_retention():
+    # Keep only the last BACKUP_KEEP full backups
+    backups = sorted([f for f in os.listdir(BACKUP_DIR) if f.startswith('attendance_backup_')])
+    if len(backups) > BACKUP_KEEP:
+        for old_backup in backups[:-BACKUP_KEEP]:
+            os.remove(os.path.join(BACKUP_DIR, old_backup))
+            print(f"Removed old backup: {old_backup}")
+        backups = backups[-BACKUP_KEEP:]
+    if not backups:
+        return
+
+    # Increments older than the oldest kept full backup can never be replayed,
+    # and neither can the journal entries they were built from
+    conn = sqlite3.connect('attendance.db', timeout=30)
+    cursor = conn.cursor()
+    cursor.execute("SELECT to_seq, audit_to_id FROM backup_chain WHERE kind = 'full' AND filename = ?",
+                   (backups[0],))
+    row = cursor.fetchone()
+    if row:
+        floor_seq, floor_audit_id = row[0], row[1] or 0
+        # An increment with only audit entries keeps the to_seq of the one before it
+        covered = 'to_seq <= ? AND IFNULL(audit_to_id, 0) <= ?'
+        cursor.execute(f"SELECT filename FROM backup_chain WHERE kind = 'incremental' AND {covered}",
+                       (floor_seq, floor_audit_id))
+        for (old_incr,) in cursor.fetchall():
+            path = os.path.join(BACKUP_DIR, old_incr)
+            if os.path.exists(path):
+                os.remove(path)
+                print(f"Removed old incremental backup: {old_incr}")
+        cursor.execute(f'DELETE FROM backup_chain WHERE {covered} AND filename != ?',
+                       (floor_seq, floor_audit_id, backups[0]))
+        cursor.execute('DELETE FROM change_journal WHERE seq <= ?', (floor_seq,))
+        conn.commit()
+    conn.close()
+
+def backup_database(compress=BACKUP_COMPRESS, incremental=False):
+    """Create a backup of the database.
+
+    A full backup is an online copy taken with the SQLite backup API. An
+    incremental backup only stores the change_journal entries recorded since
+    the previous backup; restore_database replays them on top of a full one.
+    """
     try:
         # Create backup directory if it doesn't exist
-        if not os.path.exists('backups'):
-            os.makedirs('backups')
-        
-        # Create backup filename with timestamp
-        backup_filename = f"backups/attendance_backup_{datetime.now().strftime('%Y%m%d_%H%M%S')}.db"
-        
-        # Copy the database file
-        import shutil
-        shutil.copy2('attendance.db', backup_filename)
-        
-        print(f"Database backed up to {backup_filename}")
-        
-        # Keep only the last 10 backups
-        backups = sorted([f for f in os.listdir('backups') if f.startswith('attendance_backup_')])
-        if len(backups) > 10:
-            for old_backup in backups[:-10]:
-                os.remove(f"backups/{old_backup}")
-                print(f"Removed old backup: {old_backup}")
+        if not os.path.exists(BACKUP_DIR):
+            os.makedirs(BACKUP_DIR)
+
+        if incremental:
+            backup_filename = _incremental_backup(compress)
+        else:
+            backup_filename = _full_backup(compress)
+        if backup_filename:
+            print(f"Database backed up to {backup_filename} in {backup_metrics['total_seconds']}s "
+                  f"({backup_metrics['backup_bytes']} bytes)")
+        # Rows the archival job moved out are only in the archives, so a
+        # restore needs them next to the backup chain
+        backup_metrics['archives_copied'] = _backup_archives(compress)
+
+        _apply_backup_retention()
+        return backup_filename
     except Exception as e:
+        backup_metrics['last_error'] = str(e)
         print(f"Error backing up database: {e}")
+        return None
+
+def run_nightly_backup():
+    """Full backup every BACKUP_FULL_INTERVAL_DAYS, incremental on the other nights"""
+    conn = sqlite3.connect('attendance.db', timeout=30)
+    cursor = conn.cursor()
+    cursor.execute("SELECT MAX(created_at) FROM backup_chain WHERE kind = 'full'")
+    last_full = cursor.fetchone()[0]
+    conn.close()
+    due = not last_full or (datetime.now(timezone.utc).replace(tzinfo=None) - datetime.fromisoformat(last_full)).days >= BACKUP_FULL_INTERVAL_DAYS
+    return backup_database(incremental=not due)
+
+def latest_backup_chain(backup_dir=BACKUP_DIR):
+    """Return the newest full backup in backup_dir and the increments that follow it"""
+    fulls = sorted(f for f in os.listdir(backup_dir) if f.startswith('attendance_backup_'))
+    if not fulls:
+        return None, []
+    full = fulls[-1]
+    full_stamp = full[len('attendance_backup_'):].split('.')[0]
+    increments = sorted(f for f in os.listdir(backup_dir)
+                        if f.startswith('attendance_incr_') and f[len('attendance_incr_'):] > full_stamp)
+    return os.path.join(backup_dir, full), [os.path.join(backup_dir, f) for f in increments]
+
+def restore_database(full_backup, increments=(), target='attendance_restored.db'):
+    """Rebuild a database from a full backup plus a chain of incremental backups.
+
+    The archive copies kept next to the backups are restored into the
+    directory `<target name>_archives`; move it to ARCHIVE_DIR together with
+    the database.
+    """
+    if os.path.exists(target):
+        raise FileExistsError(f"{target} already exists - choose another target")
+    archive_backup_dir = os.path.join(os.path.dirname(full_backup), ARCHIVE_DIR)
+    archive_target = f"{os.path.splitext(target)[0]}_{ARCHIVE_DIR}"
+    archive_backups = sorted(name for name in os.listdir(archive_backup_dir)
+                             if name.endswith(('.db', '.db.gz'))) if os.path.isdir(archive_backup_dir) else []
+    if archive_backups and os.path.exists(archive_target):
+        raise FileExistsError(f"{archive_target} already exists - choose another target")
+    if full_backup.endswith('.gz'):
+        with gzip.open(full_backup, 'rb') as src, open(target, 'wb') as dst:
+            shutil.copyfileobj(src, dst, 1024 * 1024)
+    else:
+        shutil.copyfile(full_backup, target)
+
+    conn = sqlite3.connect(target)
+    cursor = conn.cursor()
+    seq = current_change_seq(cursor)
+    # Increments from before audit_log and crm_credentials were left out still journal them
+    columns = {table: set(_stored_columns(cursor, table)) for table in JOURNALED_TABLES + UNJOURNALED_TABLES}
+    # Replayed rows are copied into the journal verbatim, not re-journaled
+    _drop_change_triggers(cursor)
+
+    applied = 0
+    for path in increments:
+        opener = gzip.open if path.endswith('.gz') else open
+        with opener(path, 'rt', encoding='utf-8') as f:
+            header = json.loads(f.readline())
+            if header['from_seq'] > seq:
+                raise ValueError(f"{path} starts at change {header['from_seq']} but the restore is at {seq}; "
+                                 f"an increment is missing")
+            for line in f:
+                entry = json.loads(line)
+                if 'audit' in entry:
+                    # Already restored entries keep their id, so these are skipped
+                    audit = entry['audit']
+                    cursor.execute('''
+                    INSERT OR IGNORE INTO audit_log (id, admin_password, action_timestamp, action_details)
+                    VALUES (?, ?, ?, ?)
+                    ''', (audit['id'], audit['admin_password'], audit['action_timestamp'], audit['action_details']))
+                    continue
+                if entry['seq'] <= seq:
+                    continue
+                table = entry['table']
+                if entry['op'] == 'D':
+                    cursor.execute(f'DELETE FROM {table} WHERE id = ?', (entry['row_id'],))
+                else:
+                    row = {k: v for k, v in entry['row'].items() if k in columns[table]}
+                    cols = ', '.join(row)
+                    cursor.execute(f'INSERT OR REPLACE INTO {table} ({cols}) VALUES ({", ".join("?" * len(row))})',
+                                   tuple(row.values()))
+                cursor.execute('''
+                INSERT INTO change_journal (seq, table_name, row_id, op, row_data, changed_at)
+                VALUES (?, ?, ?, ?, ?, ?)
+                ''', (entry['seq'], table, entry['row_id'], entry['op'],
+                      json.dumps(entry['row']) if entry['row'] is not None else None, entry['changed_at']))
+                applied += 1
+            seq = max(seq, header['to_seq'])
+
+    _install_change_triggers(cursor)
+    conn.commit()
+    integrity = cursor.execute('PRAGMA integrity_check').fetchone()[0]
+    conn.close()
+    if integrity != 'ok':
+        raise RuntimeError(f"integrity check failed on restored database: {integrity}")
+    print(f"Restored {full_backup} + {len(increments)} increment(s) ({applied} changes) into {target}")
+
+    for name in archive_backups:
+        os.makedirs(archive_target, exist_ok=True)
+        source = os.path.join(archive_backup_dir, name)
+        if name.endswith('.gz'):
+            with gzip.open(source, 'rb') as src, open(os.path.join(archive_target, name[:-len('.gz')]), 'wb') as dst:
+                shutil.copyfileobj(src, dst, 1024 * 1024)
+        else:
+            shutil.copyfile(source, os.path.join(archive_target, name))
+    if archive_backups:
+        print(f"Restored {len(archive_backups)} archive(s) into {archive_target}")
+    return target
 
-def run_server():
-    """Run the Flask server"""
-    app.run(host='0.0.0.0', port=5000, debug=False, use_reloader=False)
+# Serving settings; override with `python server.py serve --threads N --dev`
+SERVER_HOST = '0.0.0.0'
+SERVER_PORT = 5000
+SERVER_THREADS = 8
+SERVER_SHUTDOWN_TIMEOUT = 10
+
+# The WSGI server started by run_server(), kept so stop_server() can reach it
+_wsgi_server = None
+
+def run_server(production=True, threads=SERVER_THREADS, host=SERVER_HOST, port=SERVER_PORT):
+    """Run the Flask app.
+
+    Production mode serves it with waitress and a pool of worker threads;
+    otherwise (or when waitress is not installed) Werkzeug's development
+    server is used. Blocks until stop_server() is called.
+    """
+    global _wsgi_server
+    if production:
+        try:
+            from waitress import create_server
+        except ImportError:
+            print("waitress is not installed - falling back to the development server")
+            production = False
+    if production:
+        _wsgi_server = create_server(app, host=host, port=port, threads=threads,
+                                     ident='attendance-server')
+        print(f"Serving on http://{host}:{port} with waitress ({threads} threads)")
+    else:
+        from werkzeug.serving import make_server
+        _wsgi_server = make_server(host, port, app, threaded=True)
+        print(f"Serving on http://{host}:{port} with the development server")
+    try:
+        if production:
+            _wsgi_server.run()
+        else:
+            _wsgi_server.serve_forever()
+    finally:
+        _wsgi_server = None
+
+def stop_server(timeout=SERVER_SHUTDOWN_TIMEOUT):
+    """Stop accepting connections and let in-flight requests finish"""
+    report_jobs.shutdown()
+    reports.shutdown()
+    server = _wsgi_server
+    if server is None:
+        return
+    if hasattr(server, 'task_dispatcher'):
+        # waitress: close the listening socket, wait for the worker threads to
+        # finish their current requests, then drop the idle connections so
+        # the event loop in run_server() returns
+        server.close()
+        server.task_dispatcher.shutdown(cancel_pending=False, timeout=timeout)
+        for channel in list(server._map.values()):
+            channel.close()
+    else:
+        server.shutdown()
+
+def start_schedule():
+    """Register the recurring jobs and run them from a daemon thread while `running`"""
+    import schedule
+
+    # Nightly backup at 2 AM (weekly full, incremental in between)
+    schedule.every().day.at("02:00").do(run_nightly_backup)
+
+    # Move old closed attendance and audit entries into yearly archives
+    schedule.every().day.at("03:00").do(archive_old_records)
+
+    # Clock out sessions left open past the end of the shift
+    schedule.every(OPEN_SESSION_SWEEP_MINUTES).minutes.do(close_stale_sessions)
+
+    # Pull Odoo CRM changes into the local mirror
+    schedule.every(ODOO_SYNC_MINUTES).minutes.do(sync_odoo_mirror)
+
+    def run_schedule():
+        while running:
+            schedule.run_pending()
+            time.sleep(60)
+
+    schedule_thread = threading.Thread(target=run_schedule, daemon=True)
+    schedule_thread.start()
+    return schedule_thread
+
+def serve(production=True, threads=SERVER_THREADS):
+    """Headless entry point: database, scheduled jobs and the HTTP server, no tray"""
+    import signal
+
+    init_db()
+    start_schedule()
+
+    def on_signal(signum, frame):
+        global running
+        running = False
+        # stop_server() waits for requests, so it must not run on the serving thread
+        threading.Thread(target=stop_server, daemon=True).start()
+
+    signal.signal(signal.SIGINT, on_signal)
+    signal.signal(signal.SIGTERM, on_signal)
+    run_server(production=production, threads=threads)
+    audit_writer.flush()
+    print("Server stopped")
 
 def create_image_for_tray():
     """Create a simple image for the system tray icon"""
+    from PIL import Image, ImageDraw
+
     # Create an image with a transparent background
     width = 64
     height = 64
@@ -1550,10 +4013,14 @@ def on_quit(icon, item):
     """Function to handle quitting the application"""
     global running
     running = False
+    stop_server()
+    audit_writer.flush()
     icon.stop()
 
 def setup_system_tray():
     """Setup system tray icon"""
+    import pystray
+
     image = create_image_for_tray()
     menu = pystray.Menu(
         pystray.MenuItem("Quit", on_quit)
@@ -1561,11 +4028,11 @@ def setup_system_tray():
     icon = pystray.Icon("attendance", image, menu=menu)
     return icon
 
-from crmtest import CrmFrame
-import tkinter as tk
-from tkinter import ttk
-
 def launch_server_gui():
+    import tkinter as tk
+    from tkinter import ttk
+    from crmtest import CrmFrame
+
     root = tk.Tk()
     root.title("Server Control Panel")
     root.geometry("900x600")
@@ -1592,9 +4059,6 @@ def main():
     # Initialize database
     init_db()
     
-    # Schedule daily backup at 2 AM
-    schedule.every().day.at("02:00").do(backup_database)
-    
     # Start server in a separate thread
     server_thread = threading.Thread(target=run_server)
     server_thread.daemon = True
@@ -1603,15 +4067,8 @@ def main():
     # Setup system tray
     icon = setup_system_tray()
     
-    # Run the schedule checker in a separate thread
-    def run_schedule():
-        while running:
-            schedule.run_pending()
-            time.sleep(60)
-    
-    schedule_thread = threading.Thread(target=run_schedule)
-    schedule_thread.daemon = True
-    schedule_thread.start()
+    # Backups, archival, stale session sweep and Odoo sync
+    start_schedule()
     
     print("Server started on http://localhost:5000")
     print("Press Ctrl+C to stop the server")
@@ -1624,8 +4081,35 @@ def main():
 # ===================================================================
 
 if __name__ == "__main__":
+    # python server.py restore [full_backup [increment ...]]
+    # Without file arguments the newest full backup and its increments are used.
+    if len(sys.argv) > 1 and sys.argv[1] == 'restore':
+        if len(sys.argv) > 2:
+            full_backup, increments = sys.argv[2], sys.argv[3:]
+        else:
+            full_backup, increments = latest_backup_chain()
+        if not full_backup:
+            sys.exit("No full backup found")
+        restore_database(full_backup, increments)
+        sys.exit(0)
+
+    # python server.py serve [--threads N] [--dev]
+    if len(sys.argv) > 1 and sys.argv[1] == 'serve':
+        import argparse
+        arg_parser = argparse.ArgumentParser(prog='server.py serve')
+        arg_parser.add_argument('--threads', type=int, default=SERVER_THREADS)
+        arg_parser.add_argument('--dev', action='store_true', help="use Flask's development server")
+        args = arg_parser.parse_args(sys.argv[2:])
+        serve(production=not args.dev, threads=args.threads)
+        sys.exit(0)
+
+    import pystray
+
     # Initialize the database
     init_db()
+
+    # Backups, archival, stale session sweep and Odoo sync
+    start_schedule()
     
     # Create the system tray icon
     icon = pystray.Icon(
@@ -8,6 +8,7 @@ def install_requirements():
     packages = [
         "flask",
         "flask-cors",
+        "waitress",
         "pandas",
         "openpyxl",
         "xlsxwriter",
@@ -18,6 +19,7 @@ def install_requirements():
         "matplotlib",
         "schedule",
         "python-dateutil",
+        "tzdata",
         "arabic-reshaper",
         "python-bidi"
     ]
@@ -0,0 +1,119 @@
+"""Timestamps, site timezone and request date parsing.
+
+Attendance times are stored as ISO text with their UTC offset
+(2026-03-29T09:00:00+02:00), so the generated clock_in_ts/clock_out_ts columns
+SQLite derives from them are true UTC epochs: durations and ranges are right
+across DST changes, and sites in different zones compare directly. Local time
+is only rebuilt at presentation, in the site timezone.
+
+The site timezone is the IANA name in the ATTENDANCE_TIMEZONE environment
+variable or the 'site_timezone' admin setting; without either it is the
+zone of the machine the server runs on.
+
+Request dates are parsed strictly as ISO 8601 ('YYYY-MM-DD', optionally with
+a time and offset); anything else raises ValueError rather than being guessed
+at by dateutil.
+"""
+import math
+import os
+from datetime import date, datetime, time as dt_time, timedelta
+
+TIMEZONE_ENV = 'ATTENDANCE_TIMEZONE'
+
+_site_tz = None
+_site_tz_name = None
+
+def configure(name=None):
+    """Use the IANA zone `name` (or ATTENDANCE_TIMEZONE, or the system zone)"""
+    global _site_tz, _site_tz_name
+    name = name or os.environ.get(TIMEZONE_ENV) or None
+    if name:
+        from zoneinfo import ZoneInfo
+        _site_tz = ZoneInfo(name)
+        # Report worker processes are spawned with this environment
+        os.environ[TIMEZONE_ENV] = name
+    else:
+        from dateutil.tz import tzlocal
+        _site_tz = tzlocal()
+    _site_tz_name = name
+    return _site_tz
+
+def site_tz():
+    return _site_tz if _site_tz is not None else configure()
+
+def site_tz_name():
+    """IANA name of the site zone, or None when it is the system zone"""
+    site_tz()
+    return _site_tz_name
+
+def parse_date(value):
+    """Datetime for an ISO date or datetime string; no offset means site-local.
+
+    'YYYY-MM-DD' is midnight of that day. Raises ValueError on anything that
+    is not ISO 8601.
+    """
+    if isinstance(value, datetime):
+        return value
+    value = value.strip()
+    if len(value) == 10:
+        return datetime.combine(date.fromisoformat(value), dt_time())
+    if value.endswith(('Z', 'z')):
+        value = value[:-1] + '+00:00'
+    return datetime.fromisoformat(value)
+
+def localize(value):
+    """Aware datetime for a naive site-local one; aware ones pass through.
+
+    A time that happens twice when clocks go back is the first occurrence; a
+    time skipped when they go forward lands the gap's length later.
+    """
+    if value.tzinfo is not None:
+        return value
+    return value.replace(tzinfo=site_tz())
+
+def to_epoch(value):
+    """UTC seconds of a datetime or ISO string (naive means site-local), to
+    compare with clock_in_ts/clock_out_ts.
+
+    Fractions round up: the columns truncate, so `clock_in_ts < to_epoch(now)`
+    still includes rows stamped earlier in the current second.
+    """
+    if isinstance(value, str):
+        value = parse_date(value)
+    return math.ceil(localize(value).timestamp())
+
+def to_storage(value):
+    """ISO text with UTC offset, as stored in attendance, for a datetime or
+    ISO string (naive means site-local)"""
+    if isinstance(value, str):
+        value = parse_date(value)
+    return localize(value).isoformat(sep=' ')
+
+def now():
+    """Current site-local time, aware"""
+    return datetime.now(site_tz())
+
+def now_storage():
+    """Current time as stored in attendance"""
+    return now().isoformat(sep=' ')
+
+def from_epoch(ts):
+    """Aware site-local datetime for UTC seconds"""
+    return datetime.fromtimestamp(ts, site_tz())
+
+def format_local(ts, fmt='%Y-%m-%d %H:%M:%S'):
+    """Site-local wall-clock text for UTC seconds; None stays None"""
+    if ts is None:
+        return None
+    return from_epoch(ts).strftime(fmt)
+
+def day_starts(first, last):
+    """[(date, epoch of its local midnight)] for every day from `first` to
+    `last` inclusive, plus the midnight after `last`; days are 23 or 25 hours
+    long across DST changes, so they cannot be found by dividing by 86400"""
+    days = []
+    day = first
+    while day <= last + timedelta(days=1):
+        days.append((day, to_epoch(datetime.combine(day, dt_time()))))
+        day += timedelta(days=1)
+    return days